@@ -5,26 +5,85 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+
 from flask import Flask
-from database import init_database, add_sample_data
+from database import (
+    add_sample_data, configure_storage, init_database, is_read_only_database, migrate_database
+)
 from routes import register_blueprints
+from services.fragment_cache import init_fragment_cache
+from services.http_cache import init_http_cache
+from services.metrics import init_metrics
 
 
-def create_app():
+def prepare_database():
+    """Create tables, apply migrations and seed sample data (idempotent)."""
+    # Initialize the database
+    init_database()
+    
+    # Bring existing database files up to the current schema version
+    migrate_database()
+    
+    # Add sample data for testing and demonstration
+    add_sample_data()
+
+
+def storage_settings(config=None):
+    """
+    The (DATABASE, DATABASE_READ_ONLY) create_app() will use: config
+    overrides first, then LIBRARY_DATABASE / LIBRARY_DATABASE_READ_ONLY.
+    """
+    config = config or {}
+    storage = config.get('DATABASE', os.environ.get('LIBRARY_DATABASE'))
+    read_only = config.get('DATABASE_READ_ONLY', os.environ.get('LIBRARY_DATABASE_READ_ONLY', '0') == '1')
+    return storage, read_only
+
+
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Optional mapping of Flask config overrides, e.g.
+            {'METRICS_ENABLED': False, 'RESPONSE_CACHE_SIZE': 0}.
+            Set 'INIT_DATABASE': False when the database was already
+            prepared (e.g. once before forking server workers).
+            Storage: 'DATABASE' is a file path or ':memory:' (a private
+            in-memory database), 'DATABASE_READ_ONLY' opens the file
+            read-only. Defaults come from LIBRARY_DATABASE and
+            LIBRARY_DATABASE_READ_ONLY; without either, the current
+            database.DATABASE is kept.
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.config['METRICS_ENABLED'] = os.environ.get('LIBRARY_METRICS', '1') != '0'
+    app.config['INIT_DATABASE'] = True
+    app.config['DATABASE'], app.config['DATABASE_READ_ONLY'] = storage_settings()
+    if config:
+        app.config.update(config)
     
-    # Initialize the database
-    init_database()
+    storage = app.config['DATABASE']
+    if storage == ':memory:':
+        configure_storage(memory=True)
+    elif storage or app.config['DATABASE_READ_ONLY']:
+        configure_storage(path=storage, read_only=app.config['DATABASE_READ_ONLY'])
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # A read-only database must already be prepared
+    if app.config['INIT_DATABASE'] and not is_read_only_database():
+        prepare_database()
+    
+    # Request latency/status/query metrics, exposed at /metrics
+    init_metrics(app)
+    
+    # ETag/304 handling and rendered-response cache for catalog pages
+    init_http_cache(app)
+    
+    # Rendered catalog rows, reused until the book's row changes
+    init_fragment_cache(app)
     
     # Register all route blueprints
     register_blueprints(app)
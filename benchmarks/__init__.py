@@ -0,0 +1 @@
+"""Benchmark harness and synthetic data tools for the Library Management System."""
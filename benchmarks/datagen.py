@@ -0,0 +1,169 @@
+"""
+Deterministic synthetic library generator for benchmarks.
+
+The same seed and anchor date always produce the same books, patrons and
+loans. Generated data respects the circulation invariants: no book has more
+open loans than copies and no patron has more than 5 open loans.
+
+Usage:
+    python -m benchmarks.datagen library_bench.db --books 100000 --patrons 20000 --loans 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import database
+
+MAX_ACTIVE_LOANS = 5
+LOAN_DAYS = 14
+CHUNK_SIZE = 10000
+
+_ADJECTIVES = [
+    'Silent', 'Hidden', 'Broken', 'Golden', 'Last', 'Lost', 'Crimson', 'Distant',
+    'Quiet', 'Burning', 'Frozen', 'Secret', 'Endless', 'Wild', 'Hollow', 'Bright',
+]
+_NOUNS = [
+    'River', 'Garden', 'Empire', 'Kingdom', 'Library', 'Ocean', 'Mountain', 'City',
+    'Forest', 'Machine', 'Letter', 'Winter', 'Harbor', 'Signal', 'Orchard', 'Bridge',
+    'Archive', 'Lantern', 'Voyage', 'Theory',
+]
+_FIRST_NAMES = [
+    'Ada', 'Alan', 'Grace', 'Edsger', 'Barbara', 'Donald', 'Margaret', 'Ken',
+    'Frances', 'Dennis', 'Radia', 'Tony', 'Hedy', 'John', 'Katherine', 'Niklaus',
+]
+_LAST_NAMES = [
+    'Lovelace', 'Turing', 'Hopper', 'Dijkstra', 'Liskov', 'Knuth', 'Hamilton', 'Thompson',
+    'Allen', 'Ritchie', 'Perlman', 'Hoare', 'Lamarr', 'Backus', 'Johnson', 'Wirth',
+]
+
+
+def patron_id_for(index: int) -> str:
+    """Map a patron index to a valid 6-digit patron ID."""
+    return str(100000 + index)
+
+
+def isbn_for(index: int) -> str:
+    """Map a book index to a unique 13-digit ISBN."""
+    return '978' + str(index).zfill(10)
+
+
+def iter_books(rng: random.Random, count: int) -> Iterator[Tuple[str, str, str, int, int]]:
+    author_count = max(1, count // 20)
+    authors = [
+        f'{_FIRST_NAMES[i % 16]} {_LAST_NAMES[i // 16 % 16]}' + (f' {i // 256}' if i >= 256 else '')
+        for i in range(author_count)
+    ]
+    for i in range(count):
+        title = f'The {rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}'
+        if rng.random() < 0.5:
+            title += f' of the {rng.choice(_NOUNS)}'
+        title += f' (Vol. {i % 7 + 1})' if rng.random() < 0.2 else ''
+        copies = rng.randint(1, 5)
+        yield title, authors[rng.randrange(author_count)], isbn_for(i), copies, copies
+
+
+def generate_library(path: str, books: int = 10000, patrons: int = 1000, loans: int = 50000,
+                     active_ratio: float = 0.1, seed: int = 327,
+                     anchor: Optional[datetime] = None) -> Dict:
+    """
+    Create a fresh SQLite library at `path` and fill it with synthetic data.
+
+    Returns a summary with the counts actually generated. The file must not
+    exist yet; loans that would break an invariant are stored as returned.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    if not 1 <= patrons <= 900000:
+        raise ValueError('patrons must be between 1 and 900000')
+
+    rng = random.Random(seed)
+    anchor = (anchor or datetime.now()).replace(hour=12, minute=0, second=0, microsecond=0)
+    started = time.perf_counter()
+
+    with database.temporary_storage(path=path):
+        database.init_database()
+        database.migrate_database()
+
+        copies = bytearray()
+        chunk: List[Tuple[str, str, str, int, int]] = []
+        for book in iter_books(rng, books):
+            copies.append(book[3])
+            chunk.append(book)
+            if len(chunk) >= CHUNK_SIZE:
+                database.insert_books_bulk(chunk)
+                chunk = []
+        if chunk:
+            database.insert_books_bulk(chunk)
+
+        available = bytearray(copies)
+        active_by_patron = bytearray(patrons)
+        active_loans = 0
+        records = []
+        for _ in range(loans):
+            patron = rng.randrange(patrons)
+            book = rng.randrange(books)
+            if (rng.random() < active_ratio and available[book] > 0
+                    and active_by_patron[patron] < MAX_ACTIVE_LOANS):
+                borrow_date = anchor - timedelta(days=rng.randint(0, 2 * LOAN_DAYS), minutes=rng.randint(0, 600))
+                return_date = None
+                available[book] -= 1
+                active_by_patron[patron] += 1
+                active_loans += 1
+            else:
+                borrow_date = anchor - timedelta(days=rng.randint(LOAN_DAYS, 730), minutes=rng.randint(0, 600))
+                return_date = min(borrow_date + timedelta(days=rng.randint(1, 30)), anchor)
+            records.append((patron_id_for(patron), book + 1, borrow_date,
+                            borrow_date + timedelta(days=LOAN_DAYS), return_date))
+            if len(records) >= CHUNK_SIZE:
+                database.insert_borrow_records_bulk(records)
+                records = []
+        if records:
+            database.insert_borrow_records_bulk(records)
+
+        conn = database.get_db_connection()
+        try:
+            with conn:
+                conn.executemany(
+                    'UPDATE books SET available_copies = ? WHERE id = ?',
+                    ((available[i], i + 1) for i in range(books) if available[i] != copies[i])
+                )
+            conn.execute('ANALYZE')
+        finally:
+            conn.close()
+
+    return {
+        'database': path,
+        'seed': seed,
+        'anchor': anchor.isoformat(),
+        'books': books,
+        'patrons': patrons,
+        'loans': loans,
+        'active_loans': active_loans,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database.")
+    parser.add_argument('database', help="path of the SQLite file to create")
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--patrons', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--active-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=327)
+    args = parser.parse_args(argv)
+
+    summary = generate_library(args.database, args.books, args.patrons, args.loans,
+                               args.active_ratio, args.seed)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
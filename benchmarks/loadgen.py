@@ -0,0 +1,354 @@
+"""
+Load generator for the library app.
+
+Each thread issues a weighted mix of catalog, search, borrow and return
+requests for a fixed duration, either over a keep-alive connection to a
+running server (e.g. `python serve.py`) or through the Flask test client
+in-process; threads can be spread over several processes. The summary
+reports throughput and latency percentiles as JSON.
+
+When the database is reachable (always with --local, via --database for a
+server on this machine) the circulation invariants are sampled during the
+run and checked once more at the end: available_copies stays within
+0..total_copies and matches the open loans, and no patron holds more than
+five books. Any violation makes the command exit non-zero.
+
+Usage:
+    python -m benchmarks.loadgen --url http://127.0.0.1:5000 --threads 32 --duration 30
+    python -m benchmarks.loadgen --url http://127.0.0.1:5000 --mix circulation --database library.db
+    python -m benchmarks.loadgen --local --mix circulation --threads 16
+    python -m benchmarks.loadgen --local --database /tmp/load.db --processes 4 --threads 8 --mix circulation
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import database
+from benchmarks.datagen import patron_id_for
+
+SEARCH_WORDS = ['river', 'garden', 'empire', 'lost', 'golden', 'hopper', 'knuth', 'gatsby']
+
+# (name, weight) - requests are built per call by _request()
+DEFAULT_MIX = [('catalog', 4), ('search', 3), ('api_search', 3)]
+CIRCULATION_MIX = [('borrow', 4), ('return', 3), ('catalog', 1), ('search', 1), ('api_search', 1)]
+MIXES = {'read': DEFAULT_MIX, 'circulation': CIRCULATION_MIX}
+OPERATIONS = ('catalog', 'search', 'api_search', 'borrow', 'return')
+
+MAX_ACTIVE_LOANS = 5
+_REMEMBERED_BORROWS = 64
+
+
+def parse_mix(text: str) -> List[Tuple[str, int]]:
+    """A named mix ('read', 'circulation') or 'op=weight,...' pairs."""
+    if text in MIXES:
+        return MIXES[text]
+    mix = []
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise ValueError(f'unknown operation {op!r} (expected one of {", ".join(OPERATIONS)})')
+        mix.append((op, int(weight or 1)))
+    return mix
+
+
+def _request(op: str, rng: random.Random, patrons: List[str], books: List[int],
+             borrowed: List[Tuple[str, int]]) -> Tuple[str, str, Optional[Dict]]:
+    """(method, path, form) for one operation."""
+    if op == 'catalog':
+        return 'GET', '/catalog', None
+    if op in ('search', 'api_search'):
+        query = urlencode({'q': rng.choice(SEARCH_WORDS), 'type': 'title'})
+        return 'GET', f'/search?{query}' if op == 'search' else f'/api/search?{query}', None
+    if op == 'borrow':
+        patron_id, book_id = rng.choice(patrons), rng.choice(books)
+        borrowed.append((patron_id, book_id))
+        if len(borrowed) > _REMEMBERED_BORROWS:
+            del borrowed[0]
+        return 'POST', '/borrow', {'patron_id': patron_id, 'book_id': book_id}
+    # Returns mostly target books this thread tried to borrow, so most hit an open loan
+    if borrowed:
+        patron_id, book_id = borrowed.pop(rng.randrange(len(borrowed)))
+    else:
+        patron_id, book_id = rng.choice(patrons), rng.choice(books)
+    return 'POST', '/return', {'patron_id': patron_id, 'book_id': book_id}
+
+
+class HttpSession:
+    """One keep-alive connection to a running server."""
+
+    def __init__(self, url: str):
+        target = urlsplit(url)
+        self._address = (target.hostname, target.port or 80)
+        self._conn = http.client.HTTPConnection(*self._address, timeout=30)
+
+    def send(self, method: str, path: str, form: Optional[Dict] = None) -> int:
+        body = urlencode(form) if form else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        try:
+            self._conn.request(method, path, body, headers)
+            response = self._conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self._conn.close()
+            self._conn = http.client.HTTPConnection(*self._address, timeout=30)
+            raise
+
+    def close(self):
+        self._conn.close()
+
+
+class ClientSession:
+    """Flask test client without cookies, so flashed messages don't pile up."""
+
+    def __init__(self, app):
+        self._client = app.test_client(use_cookies=False)
+
+    def send(self, method: str, path: str, form: Optional[Dict] = None) -> int:
+        response = self._client.open(path, method=method, data=form)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict:
+    """Throughput and latency percentiles (ms), overall and per operation."""
+    def stats(samples: List[float]) -> Dict:
+        samples = sorted(samples)
+        return {
+            'requests': len(samples),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0,
+        }
+
+    everything = [value for samples in latencies.values() for value in samples]
+    return {
+        'seconds': round(elapsed, 3),
+        'requests': len(everything),
+        'errors': sum(errors.values()),
+        'requests_per_second': round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        'latency': stats(everything),
+        'operations': {op: dict(stats(samples), errors=errors.get(op, 0)) for op, samples in latencies.items()},
+    }
+
+
+def _drive(open_session: Callable, threads: int, first_worker: int, duration: float, mix,
+           seed: int, patrons: List[str], books: List[int]) -> Tuple[Dict[str, List[float]], Dict[str, int]]:
+    """Run `threads` workers for `duration` seconds; return latencies and error counts per op."""
+    ops = [op for op, _ in mix]
+    weights = [weight for _, weight in mix]
+    latencies: Dict[str, List[float]] = {op: [] for op in ops}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(n: int):
+        rng = random.Random(seed + n)
+        session = open_session()
+        borrowed: List[Tuple[str, int]] = []
+        local: List[Tuple[str, float, bool]] = []
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            method, path, form = _request(op, rng, patrons, books, borrowed)
+            start = time.perf_counter()
+            try:
+                ok = session.send(method, path, form) < 500
+            except (OSError, http.client.HTTPException):
+                ok = False
+            local.append((op, time.perf_counter() - start, ok))
+        session.close()
+        with lock:
+            for op, seconds, ok in local:
+                latencies[op].append(seconds)
+                if not ok:
+                    errors[op] = errors.get(op, 0) + 1
+
+    pool = [threading.Thread(target=worker, args=(first_worker + n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies, errors
+
+
+def _local_app():
+    from app import create_app
+    return create_app({'INIT_DATABASE': False, 'METRICS_ENABLED': False})
+
+
+def _process_main(spec: Dict):
+    """Entry point of one load process (spawned, so it imports the app afresh)."""
+    if spec['url']:
+        open_session = lambda: HttpSession(spec['url'])
+    else:
+        database.configure_storage(path=spec['database'])
+        app = _local_app()
+        open_session = lambda: ClientSession(app)
+    return _drive(open_session, spec['threads'], spec['first_worker'], spec['duration'], spec['mix'],
+                  spec['seed'], spec['patrons'], spec['books'])
+
+
+class InvariantMonitor:
+    """Samples database.get_circulation_violations() in the background."""
+
+    def __init__(self, interval: float, max_active_loans: int = MAX_ACTIVE_LOANS):
+        self.interval = interval
+        self.max_active_loans = max_active_loans
+        self.checks = 0
+        self.violations: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        found = database.get_circulation_violations(self.max_active_loans)
+        self.checks += 1
+        if any(found.values()) and len(self.violations) < 10:
+            self.violations.append(dict(found, check=self.checks))
+
+    def stop(self) -> Dict:
+        """Stop sampling, run the final check and report."""
+        self._stop.set()
+        self._thread.join()
+        self.check()
+        return {'ok': not self.violations, 'checks': self.checks, 'violations': self.violations}
+
+
+def _book_ids(count: int, from_database: bool) -> List[int]:
+    if not from_database:
+        return list(range(1, count + 1))
+    conn = database.get_db_connection()
+    try:
+        rows = conn.execute('SELECT id FROM books ORDER BY id LIMIT ?', (count,)).fetchall()
+    finally:
+        conn.close()
+    return [row['id'] for row in rows]
+
+
+def run_load(threads: int, duration: float, mix=DEFAULT_MIX, seed: int = 327, url: Optional[str] = None,
+             processes: int = 1, patrons: int = 50, books: int = 20,
+             check_interval: Optional[float] = 0.5, inspect_database: Optional[bool] = None) -> Dict:
+    """
+    Drive the server at `url`, or the app in-process through the test client
+    when `url` is None, from `threads` threads in each of `processes`
+    processes. Borrows and returns pick from `patrons` patrons and the first
+    `books` books, so a small pool means heavy contention.
+
+    The circulation invariants are checked every `check_interval` seconds
+    (None: only at the end) when `inspect_database` is set - by default only
+    for in-process runs, since a server's database may not be reachable.
+    """
+    if inspect_database is None:
+        inspect_database = url is None
+    if url is None and processes > 1 and database.is_memory_database():
+        raise ValueError('multi-process runs need a database file, not an in-memory database')
+
+    patron_ids = [patron_id_for(n) for n in range(patrons)]
+    book_ids = _book_ids(books, inspect_database)
+    monitor = None
+    if inspect_database:
+        monitor = InvariantMonitor(check_interval or duration + 1)
+        monitor.start()
+
+    started = time.perf_counter()
+    if processes <= 1:
+        if url:
+            open_session = lambda: HttpSession(url)
+        else:
+            app = _local_app()
+            open_session = lambda: ClientSession(app)
+        latencies, errors = _drive(open_session, threads, 0, duration, mix, seed, patron_ids, book_ids)
+    else:
+        specs = [{
+            'url': url, 'database': database.DATABASE, 'threads': threads, 'first_worker': n * threads,
+            'duration': duration, 'mix': mix, 'seed': seed, 'patrons': patron_ids, 'books': book_ids,
+        } for n in range(processes)]
+        latencies, errors = {op: [] for op, _ in mix}, {}
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for process_latencies, process_errors in executor.map(_process_main, specs):
+                for op, samples in process_latencies.items():
+                    latencies[op].extend(samples)
+                for op, count in process_errors.items():
+                    errors[op] = errors.get(op, 0) + count
+    summary = summarize(latencies, errors, time.perf_counter() - started)
+
+    summary.update({'target': url or 'test-client', 'processes': processes, 'threads': threads,
+                    'mix': dict(mix)})
+    if monitor is not None:
+        summary['invariants'] = monitor.stop()
+    return summary
+
+
+def run_http(url: str, threads: int, duration: float, mix=DEFAULT_MIX, seed: int = 327) -> Dict:
+    """Drive the server at `url` from `threads` threads for `duration` seconds."""
+    return run_load(threads, duration, mix, seed, url=url)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate load against the library app and check circulation invariants.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--local', action='store_true', help="drive the app in-process through the Flask test client")
+    parser.add_argument('--database', help="SQLite file the app uses; enables invariant checks against a server")
+    parser.add_argument('--threads', type=int, default=16, help="threads per process")
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--mix', default='read', help="'read', 'circulation' or op=weight,... "
+                        "(ops: %s)" % ', '.join(OPERATIONS))
+    parser.add_argument('--patrons', type=int, default=50, help="patrons borrowing and returning")
+    parser.add_argument('--books', type=int, default=20, help="books borrowed and returned (lowest ids)")
+    parser.add_argument('--check-interval', type=float, default=0.5, help="seconds between invariant checks")
+    parser.add_argument('--seed', type=int, default=327)
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.local:
+        if args.database:
+            database.configure_storage(path=args.database)
+        else:
+            if args.processes > 1:
+                parser.error('--processes with --local needs --database')
+            database.configure_storage(memory=True)
+        from app import prepare_database
+        prepare_database()
+    elif args.database:
+        database.configure_storage(path=args.database, read_only=True)
+
+    summary = run_load(args.threads, args.duration, mix, args.seed, url=None if args.local else args.url,
+                       processes=args.processes, patrons=args.patrons, books=args.books,
+                       check_interval=args.check_interval, inspect_database=args.local or bool(args.database))
+    print(json.dumps(summary, indent=2))
+    return 0 if summary.get('invariants', {}).get('ok', True) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
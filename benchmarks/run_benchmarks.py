@@ -0,0 +1,218 @@
+"""
+Benchmark harness for service functions, DB helpers and routes.
+
+Generates (or reuses) a synthetic library, times each scenario and writes
+machine-readable JSON so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.run_benchmarks --books 100000 --loans 1000000 --output bench.json
+    python -m benchmarks.run_benchmarks --database bench.db --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import database
+from benchmarks.datagen import generate_library, isbn_for, patron_id_for
+
+DEFAULT_ITERATIONS = 200
+
+
+def time_calls(fn: Callable[[int], object], iterations: int) -> Dict:
+    """Call fn(i) `iterations` times and summarize per-call latency in ms."""
+    samples: List[float] = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'iterations': iterations,
+        'mean_ms': round(total / iterations, 4),
+        'p50_ms': round(samples[len(samples) // 2], 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'max_ms': round(samples[-1], 4),
+        'stdev_ms': round(statistics.pstdev(samples), 4),
+        'ops_per_sec': round(iterations / (total / 1000), 1) if total else 0.0,
+    }
+
+
+def build_scenarios(books: int, patrons: int, seed: int) -> Dict[str, Callable[[int], object]]:
+    """Benchmark scenarios keyed by name; each takes the iteration number."""
+    import library_service
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(seed)
+    words = ['river', 'garden', 'empire', 'lost', 'golden', 'hopper', 'knuth', 'of the']
+    book_ids = [rng.randrange(books) + 1 for _ in range(1024)]
+    patron_ids = [patron_id_for(rng.randrange(patrons)) for _ in range(1024)]
+    # Fresh patrons for borrow/return so the 5-book limit never interferes
+    desk_patrons = [str(999999 - i) for i in range(64)]
+
+    def borrow_return(i):
+        patron = desk_patrons[i % len(desk_patrons)]
+        book_id = book_ids[i % len(book_ids)]
+        ok, _ = library_service.borrow_book_by_patron(patron, book_id)
+        if ok:
+            library_service.return_book_by_patron(patron, book_id)
+
+    def route_borrow_return(i):
+        patron = desk_patrons[i % len(desk_patrons)]
+        book_id = book_ids[(i * 7) % len(book_ids)]
+        client.post('/borrow', data={'patron_id': patron, 'book_id': book_id})
+        client.post('/return', data={'patron_id': patron, 'book_id': book_id})
+
+    return {
+        'service.search_title': lambda i: library_service.search_books_in_catalog(words[i % len(words)], 'title'),
+        'service.search_author': lambda i: library_service.search_books_in_catalog(words[(i + 5) % len(words)], 'author'),
+        'service.search_isbn': lambda i: library_service.search_books_in_catalog(isbn_for(book_ids[i % 1024] - 1), 'isbn'),
+        'service.borrow_and_return': borrow_return,
+        'service.patron_status_report': lambda i: library_service.get_patron_status_report(patron_ids[i % 1024]),
+        'db.get_book_by_id': lambda i: database.get_book_by_id(book_ids[i % 1024]),
+        'route.catalog': lambda i: client.get('/catalog'),
+        'route.api_catalog': lambda i: client.get('/api/catalog?limit=50'),
+        'route.search': lambda i: client.get('/search', query_string={'q': words[i % len(words)], 'type': 'title'}),
+        'route.api_search': lambda i: client.get('/api/search', query_string={'q': words[i % len(words)], 'type': 'title'}),
+        'route.borrow_and_return': route_borrow_return,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Return scenarios whose mean latency grew by more than max_regression x."""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous and previous['mean_ms'] > 0:
+            ratio = current['mean_ms'] / previous['mean_ms']
+            current['vs_baseline'] = round(ratio, 3)
+            if ratio > max_regression:
+                regressions.append(f'{name}: {previous["mean_ms"]}ms -> {current["mean_ms"]}ms ({ratio:.2f}x)')
+    return regressions
+
+
+def run(books: int, patrons: int, loans: int, iterations: int, seed: int = 327,
+        db_path: Optional[str] = None, only: Optional[List[str]] = None,
+        in_memory: bool = False) -> Dict:
+    """
+    Generate/reuse a dataset, run all scenarios and return the results document.
+
+    With `in_memory` the scenarios run against an in-memory copy of the
+    dataset, so timings exclude disk I/O and the file is left untouched.
+    """
+    workdir = None
+    if db_path is None:
+        workdir = tempfile.TemporaryDirectory(prefix='library-bench-')
+        db_path = os.path.join(workdir.name, 'bench.db')
+    try:
+        dataset = None
+        if not os.path.exists(db_path):
+            dataset = generate_library(db_path, books=books, patrons=patrons, loans=loans, seed=seed)
+
+        with database.temporary_storage(path=db_path, memory=in_memory, copy_from=db_path if in_memory else None):
+            conn = database.get_db_connection()
+            try:
+                books = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+                loans = conn.execute('SELECT COUNT(*) FROM borrow_records').fetchone()[0]
+                # A reused dataset has its own patron range (patron_id_for(0..n-1));
+                # the desk patrons used by borrow/return scenarios sit above 900000
+                highest = conn.execute('''
+                    SELECT MAX(CAST(patron_id AS INTEGER)) FROM borrow_records
+                    WHERE CAST(patron_id AS INTEGER) < 900000
+                ''').fetchone()[0]
+            finally:
+                conn.close()
+            if highest is not None:
+                patrons = highest - int(patron_id_for(0)) + 1
+            scenarios = build_scenarios(books, patrons, seed)
+            results = {}
+            for name, fn in scenarios.items():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                fn(0)  # warm-up
+                results[name] = time_calls(fn, iterations)
+    finally:
+        if workdir is not None:
+            workdir.cleanup()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'database': db_path if workdir is None else None,  # a temporary dataset is deleted
+            'in_memory': in_memory,
+            'books': books,
+            'patrons': patrons,
+            'loans': loans,
+            'iterations': iterations,
+            'seed': seed,
+            'generated': dataset,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark library service functions and routes.")
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--patrons', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--database', help="reuse (or create) this dataset file instead of a temp one")
+    parser.add_argument('--in-memory', action='store_true',
+                        help="run against an in-memory copy of the dataset")
+    parser.add_argument('--only', action='append', help="run only scenarios with this name prefix")
+    parser.add_argument('--output', help="write JSON results here (default: stdout)")
+    parser.add_argument('--compare', help="baseline JSON results to compare against")
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help="fail if a scenario's mean latency grows by more than this factor")
+    args = parser.parse_args(argv)
+
+    results = run(args.books, args.patrons, args.loans, args.iterations, args.seed,
+                  args.database, args.only, args.in_memory)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        results['regressions'] = regressions
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    for line in regressions:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
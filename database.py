@@ -3,18 +3,455 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import base64
+import json
+import os
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
-# Database configuration
+# Database configuration: a file path, or an SQLite URI ("file:...") for a
+# read-only file or a shared in-memory database - see configure_storage()
 DATABASE = 'library.db'
 
+# Connection pool configuration
+POOL_SIZE = int(os.environ.get('LIBRARY_DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('LIBRARY_DB_POOL_TIMEOUT', '30'))
+BUSY_TIMEOUT_MS = 5000
+
+# Catalog pagination
+CATALOG_PAGE_SIZE = 50
+MAX_CATALOG_PAGE_SIZE = 200
+
+# Streaming export: rows per batch, and the columns each export writes
+EXPORT_BATCH_SIZE = 1000
+BOOK_EXPORT_FIELDS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+LOAN_EXPORT_FIELDS = ('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date')
+
+# Overdue scanner: open loans read per batch
+OVERDUE_SCAN_BATCH_SIZE = 5000
+
+# Patron counter reconcile: drifted patrons listed in its report
+MAX_REPORTED_DRIFT = 100
+
+# Compact loan storage: borrow_records keeps dates as INTEGER wall-clock
+# seconds since 1970-01-01 and patron_id as INTEGER. New databases use it
+# when enabled, and migrate_database() converts existing ones.
+COMPACT_STORAGE = os.environ.get('LIBRARY_COMPACT_STORAGE', '0') == '1'
+
+
+# Per-thread count of statements run through pooled connections (used for
+# per-request query metrics)
+_query_counter = threading.local()
+
+
+def _count_query():
+    _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+
+
+def get_query_count() -> int:
+    """Number of statements this thread has run since reset_query_count()."""
+    return getattr(_query_counter, 'count', 0)
+
+
+def reset_query_count():
+    _query_counter.count = 0
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    SQLite connection owned by a ConnectionPool.
+
+    close() hands the connection back to its pool instead of closing it, so
+    the existing "open, query, close" helpers keep working unchanged.
+    """
+
+    _pool = None
+
+    def execute(self, *args, **kwargs):
+        _count_query()
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        _count_query()
+        return super().executemany(*args, **kwargs)
+
+    def executescript(self, *args, **kwargs):
+        _count_query()
+        return super().executescript(*args, **kwargs)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def dispose(self):
+        """Really close the underlying SQLite connection."""
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Connections are opened lazily up to `size`, configured once (WAL
+    journaling, busy_timeout, synchronous=NORMAL) and then reused. When all
+    connections are checked out, acquire() waits up to `timeout` seconds.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.database = database
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._idle: List[PooledConnection] = []
+        self._in_use = set()
+        self._opened = 0
+        self._closed = False
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        # An in-memory database lives only while a connection is open
+        self._anchor = sqlite3.connect(database, uri=True) if is_memory_database(database) else None
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.database,
+            factory=PooledConnection,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            uri=self.database.startswith('file:'),
+        )
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        if not is_read_only_database(self.database):
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn._pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Check a connection out of the pool, opening one if allowed."""
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.OperationalError('connection pool is closed')
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        self._opened -= 1
+                        raise
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise sqlite3.OperationalError('timed out waiting for a database connection')
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use.add(conn)
+            self._checkouts += 1
+            if waited:
+                elapsed = time.perf_counter() - start
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a connection to the pool, rolling back any open transaction."""
+        with self._cond:
+            if conn not in self._in_use:
+                return  # already released
+            self._in_use.discard(conn)
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._opened -= 1
+                conn.dispose()
+            else:
+                if self._closed:
+                    self._opened -= 1
+                    conn.dispose()
+                else:
+                    self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed when released."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._opened -= 1
+                self._idle.pop().dispose()
+            if self._anchor is not None:
+                self._anchor.close()
+                self._anchor = None
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Snapshot of pool size and checkout/wait counters."""
+        with self._cond:
+            return {
+                'database': self.database,
+                'size': self.size,
+                'open': self._opened,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get the connection pool for the current DATABASE, creating it on first use."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database == DATABASE:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE)
+        return _pool
+
+
+def close_pool():
+    """Close the connection pool (e.g. on shutdown or between tests)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def memory_database(name: Optional[str] = None) -> str:
+    """
+    URI of a named in-memory database shared by every connection in this
+    process (a fresh, unique one when no name is given).
+
+    Uses SQLite's memdb VFS rather than cache=shared, so connections keep
+    ordinary file locking and busy_timeout instead of table-lock errors.
+    """
+    return f'file:/{name or "library-" + uuid.uuid4().hex}?vfs=memdb'
+
+def read_only_database(path: str) -> str:
+    """URI opening an existing database file read-only."""
+    return f'file:{quote(os.path.abspath(path))}?mode=ro'
+
+def is_memory_database(database: Optional[str] = None) -> bool:
+    return 'vfs=memdb' in (database or DATABASE)
+
+def is_read_only_database(database: Optional[str] = None) -> bool:
+    return 'mode=ro' in (database or DATABASE)
+
+def configure_storage(path: Optional[str] = None, read_only: bool = False,
+                      memory: bool = False, memory_name: Optional[str] = None,
+                      copy_from: Optional[str] = None) -> str:
+    """
+    Point every helper in this module at a new database and return its name.
+
+    `path` selects a database file (opened read-only with `read_only`);
+    `memory` selects a shared in-memory database, optionally seeded with a
+    copy of the `copy_from` file. The pool for the previous database is
+    closed, which discards it if it was in memory. Storage is process-wide,
+    like the pool.
+    """
+    global DATABASE
+    if memory:
+        target = memory_database(memory_name)
+    elif read_only:
+        target = read_only_database(path or DATABASE)
+    else:
+        target = path or DATABASE
+    close_pool()
+    DATABASE = target
+    if copy_from:
+        # VACUUM INTO rather than the backup API: a copied WAL header would
+        # make the memdb copy unreadable
+        get_pool()  # holds the target open
+        source = sqlite3.connect(read_only_database(copy_from), uri=True)
+        try:
+            source.execute('VACUUM INTO ?', (DATABASE,))
+        finally:
+            source.close()
+    return DATABASE
+
+@contextmanager
+def temporary_storage(**storage):
+    """
+    Switch to another database for the block (configure_storage arguments),
+    then restore the previous database with its pool still open, so an
+    in-memory previous database survives.
+    """
+    global DATABASE, _pool
+    with _pool_lock:
+        previous = DATABASE, _pool
+        _pool = None
+    try:
+        yield configure_storage(**storage)
+    finally:
+        close_pool()
+        with _pool_lock:
+            DATABASE, _pool = previous
+
+def get_pool_stats() -> Dict:
+    """Get connection pool size and wait-time statistics."""
+    return get_pool().stats()
+
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Get a pooled database connection. Call close() to return it to the pool."""
+    return get_pool().acquire()
+
+
+# Loan storage formats
+#
+# Both formats expose the same API: dates go in and come out as datetimes
+# (or ISO strings where a helper returns them as stored) and patron ids as
+# 6-digit strings. In the compact format patron_id has INTEGER affinity, so
+# SQLite converts '123456' parameters itself; dates must be converted here.
+
+_EPOCH = datetime(1970, 1, 1)
+_storage_formats: Dict[str, bool] = {}
+
+
+def _borrow_records_ddl(table: str, compact: bool) -> str:
+    column_type = 'INTEGER' if compact else 'TEXT'
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id {column_type} NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date {column_type} NOT NULL,
+            due_date {column_type} NOT NULL,
+            return_date {column_type},
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    '''
+
+
+def _read_storage_format(conn) -> Optional[bool]:
+    columns = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(borrow_records)')}
+    if not columns:
+        return None
+    return columns['patron_id'] == 'INTEGER'
+
+
+def is_compact_storage(conn=None) -> bool:
+    """Whether the current database stores loans in the compact format."""
+    if DATABASE not in _storage_formats:
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            compact = _read_storage_format(conn)
+        finally:
+            if own_conn:
+                conn.close()
+        if compact is None:
+            return COMPACT_STORAGE
+        _storage_formats[DATABASE] = compact
+    return _storage_formats[DATABASE]
+
+
+def _to_db_time(value: Optional[datetime], compact: bool):
+    if value is None:
+        return None
+    if compact:
+        return (value.replace(microsecond=0) - _EPOCH) // timedelta(seconds=1)
+    return value.isoformat()
+
+
+def _from_db_time(value) -> datetime:
+    if isinstance(value, int):
+        return _EPOCH + timedelta(seconds=value)
+    return datetime.fromisoformat(value)
+
+
+def _from_db_patron(value) -> str:
+    return f'{value:06d}' if isinstance(value, int) else value
+
+
+def _day_sql(column: str, compact: bool) -> str:
+    """SQL for the calendar day of a stored loan date."""
+    return f"date({column}, 'unixepoch')" if compact else f'date({column})'
+
+
+def _iso_sql(column: str, compact: bool) -> str:
+    """SQL returning a stored loan date as an ISO string."""
+    return f"strftime('%Y-%m-%dT%H:%M:%S', {column}, 'unixepoch')" if compact else column
+
+
+def convert_to_compact_storage() -> bool:
+    """
+    Rebuild borrow_records in the compact format, keeping ids and indexes.
+
+    Runs in one BEGIN IMMEDIATE transaction. Returns False if the database
+    already uses the compact format.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if _read_storage_format(conn):
+            conn.rollback()
+            return False
+        schema = [row[0] for row in conn.execute('''
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = 'borrow_records' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        ''')]
+        conn.execute(_borrow_records_ddl('borrow_records_compact', compact=True))
+        conn.execute('''
+            INSERT INTO borrow_records_compact (id, patron_id, book_id, borrow_date, due_date, return_date)
+            SELECT id, CAST(patron_id AS INTEGER), book_id,
+                   CAST(strftime('%s', borrow_date) AS INTEGER),
+                   CAST(strftime('%s', due_date) AS INTEGER),
+                   CAST(strftime('%s', return_date) AS INTEGER)
+            FROM borrow_records
+        ''')
+        conn.execute('DROP TABLE borrow_records')
+        conn.execute('ALTER TABLE borrow_records_compact RENAME TO borrow_records')
+        for statement in schema:
+            conn.execute(statement)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'patrons'").fetchone():
+            conn.execute('''
+                UPDATE patrons SET overdue_as_of = CAST(strftime('%s', overdue_as_of) AS INTEGER)
+                WHERE typeof(overdue_as_of) = 'text'
+            ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    _storage_formats[DATABASE] = True
+    return True
 
 def init_database():
     """Initialize the database with required tables."""
@@ -33,20 +470,365 @@ def init_database():
     ''')
     
     # Create borrow_records table
+    conn.execute(_borrow_records_ddl('borrow_records', compact=COMPACT_STORAGE))
+    
+    init_search_index(conn)
+    
+    conn.commit()
+    conn.close()
+
+def init_search_index(conn) -> bool:
+    """
+    Create the trigram FTS5 index over book titles/authors if it is missing.
+
+    The index is an external-content table over `books`, kept in sync by
+    triggers, and is back-filled from existing rows when first created.
+    Returns False if this SQLite build lacks FTS5 or the trigram tokenizer,
+    in which case search falls back to LIKE scans.
+    """
+    if _has_search_index(conn):
+        return True
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE books_fts USING fts5(
+                title, author,
+                content='books', content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END;
+    ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+    return True
+
+def _has_search_index(conn) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    return row is not None
+
+def _rebuild_patron_counters(conn, as_of: datetime) -> List[Dict]:
+    """
+    Recompute every patron's counters from borrow_records inside the caller's
+    transaction; returns the patrons whose stored counters were wrong.
+    """
+    compact = is_compact_storage(conn)
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patron_id TEXT NOT NULL,
-            book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
+        CREATE TEMP TABLE IF NOT EXISTS patron_counts (
+            patron_id TEXT PRIMARY KEY, active_loans INTEGER, overdue_loans INTEGER
         )
     ''')
+    conn.execute('DELETE FROM temp.patron_counts')
+    conn.execute('''
+        INSERT INTO temp.patron_counts (patron_id, active_loans, overdue_loans)
+        SELECT printf('%06d', patron_id), COUNT(*), SUM(due_date < ?)
+        FROM borrow_records WHERE return_date IS NULL
+        GROUP BY patron_id
+    ''', (_to_db_time(as_of, compact),))
+    drift = conn.execute('''
+        SELECT p.patron_id, p.active_loans, p.overdue_loans,
+               COALESCE(c.active_loans, 0) AS actual_active_loans,
+               COALESCE(c.overdue_loans, 0) AS actual_overdue_loans
+        FROM patrons p LEFT JOIN temp.patron_counts c ON c.patron_id = p.patron_id
+        WHERE p.active_loans != COALESCE(c.active_loans, 0)
+        UNION ALL
+        SELECT c.patron_id, NULL, NULL, c.active_loans, c.overdue_loans
+        FROM temp.patron_counts c
+        WHERE c.patron_id NOT IN (SELECT patron_id FROM patrons)
+        ORDER BY 1
+    ''').fetchall()
+    conn.execute('UPDATE patrons SET active_loans = 0, overdue_loans = 0, overdue_as_of = ?',
+                 (_to_db_time(as_of, compact),))
+    conn.execute('''
+        INSERT INTO patrons (patron_id, active_loans, overdue_loans, overdue_as_of)
+        SELECT patron_id, active_loans, overdue_loans, ? FROM temp.patron_counts WHERE true
+        ON CONFLICT (patron_id) DO UPDATE
+        SET active_loans = excluded.active_loans, overdue_loans = excluded.overdue_loans
+    ''', (_to_db_time(as_of, compact),))
+    conn.execute('DELETE FROM temp.patron_counts')
+    return [dict(row) for row in drift]
+
+
+# Schema migrations, applied in order by migrate_database(). Each step is
+# (version, description, [SQL statement or callable(conn), ...]). Append new
+# steps at the end; never edit or renumber a step that has shipped.
+MIGRATIONS = [
+    (1, 'Partial index on open loans by patron/book', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open
+           ON borrow_records (patron_id, book_id) WHERE return_date IS NULL''',
+    ]),
+    (2, 'Index loan history by patron', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_history
+           ON borrow_records (patron_id, borrow_date)''',
+    ]),
+    (3, 'Index loans by book', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_book
+           ON borrow_records (book_id)''',
+    ]),
+    (4, 'Index books by (title, id) for keyset pagination', [
+        '''CREATE INDEX IF NOT EXISTS idx_books_title_id
+           ON books (title, id)''',
+    ]),
+    (5, 'Partial index on open loans by due date', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+           ON borrow_records (due_date) WHERE return_date IS NULL''',
+    ]),
+    (6, 'Catalog change log (catalog version for caching)', [
+        '''CREATE TABLE IF NOT EXISTS catalog_changes (
+               version INTEGER PRIMARY KEY AUTOINCREMENT,
+               book_id INTEGER,
+               changed_at INTEGER NOT NULL
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS catalog_changes_ai AFTER INSERT ON books BEGIN
+               INSERT INTO catalog_changes (book_id, changed_at) VALUES (new.id, strftime('%s', 'now'));
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS catalog_changes_au AFTER UPDATE ON books BEGIN
+               INSERT INTO catalog_changes (book_id, changed_at) VALUES (new.id, strftime('%s', 'now'));
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS catalog_changes_ad AFTER DELETE ON books BEGIN
+               INSERT INTO catalog_changes (book_id, changed_at) VALUES (old.id, strftime('%s', 'now'));
+           END''',
+        # A NULL book_id means "anything may have changed"
+        "INSERT INTO catalog_changes (book_id, changed_at) VALUES (NULL, strftime('%s', 'now'))",
+    ]),
+    (7, 'Overdue scanner: open loans by patron/due date, scans and notices', [
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron_due
+           ON borrow_records (patron_id, due_date) WHERE return_date IS NULL''',
+        # last_patron_id is the checkpoint: notices up to it are written
+        '''CREATE TABLE IF NOT EXISTS overdue_scans (
+               run_date TEXT PRIMARY KEY,
+               as_of TEXT NOT NULL,
+               last_patron_id TEXT,
+               patrons INTEGER NOT NULL DEFAULT 0,
+               loans INTEGER NOT NULL DEFAULT 0,
+               total_fees REAL NOT NULL DEFAULT 0,
+               status TEXT NOT NULL DEFAULT 'running',
+               started_at TEXT NOT NULL,
+               finished_at TEXT
+           )''',
+        '''CREATE TABLE IF NOT EXISTS overdue_notices (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               run_date TEXT NOT NULL,
+               patron_id TEXT NOT NULL,
+               loan_count INTEGER NOT NULL,
+               total_fee REAL NOT NULL,
+               loans TEXT NOT NULL,
+               created_at TEXT NOT NULL,
+               UNIQUE (run_date, patron_id)
+           )''',
+    ]),
+    (8, 'Patrons with active/overdue loan counters kept by triggers', [
+        # overdue_loans counts open loans due before overdue_as_of, which is
+        # stored in the same format as borrow_records dates
+        '''CREATE TABLE IF NOT EXISTS patrons (
+               patron_id TEXT PRIMARY KEY,
+               active_loans INTEGER NOT NULL DEFAULT 0,
+               overdue_loans INTEGER NOT NULL DEFAULT 0,
+               overdue_as_of
+           ) WITHOUT ROWID''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_opened
+           AFTER INSERT ON borrow_records WHEN new.return_date IS NULL BEGIN
+               INSERT INTO patrons (patron_id, active_loans) VALUES (printf('%06d', new.patron_id), 1)
+               ON CONFLICT (patron_id) DO UPDATE SET active_loans = active_loans + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_closed
+           AFTER UPDATE OF return_date ON borrow_records
+           WHEN old.return_date IS NULL AND new.return_date IS NOT NULL BEGIN
+               UPDATE patrons
+               SET active_loans = active_loans - 1,
+                   overdue_loans = overdue_loans - COALESCE(old.due_date < overdue_as_of, 0)
+               WHERE patron_id = printf('%06d', old.patron_id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_reopened
+           AFTER UPDATE OF return_date ON borrow_records
+           WHEN old.return_date IS NOT NULL AND new.return_date IS NULL BEGIN
+               INSERT INTO patrons (patron_id, active_loans) VALUES (printf('%06d', new.patron_id), 1)
+               ON CONFLICT (patron_id) DO UPDATE
+               SET active_loans = active_loans + 1,
+                   overdue_loans = overdue_loans + COALESCE(new.due_date < overdue_as_of, 0);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_deleted
+           AFTER DELETE ON borrow_records WHEN old.return_date IS NULL BEGIN
+               UPDATE patrons
+               SET active_loans = active_loans - 1,
+                   overdue_loans = overdue_loans - COALESCE(old.due_date < overdue_as_of, 0)
+               WHERE patron_id = printf('%06d', old.patron_id);
+           END''',
+        # Backfill active_loans; overdue_loans stays 0 until a scan or
+        # reconcile sets overdue_as_of
+        '''INSERT INTO patrons (patron_id, active_loans)
+           SELECT printf('%06d', patron_id), COUNT(*) FROM borrow_records
+           WHERE return_date IS NULL
+           GROUP BY printf('%06d', patron_id)
+           ON CONFLICT (patron_id) DO UPDATE SET active_loans = excluded.active_loans''',
+    ]),
+    (9, 'Prune the catalog change log as it is written', [
+        # Every 1000th entry drops those more than 10000 (CATALOG_CHANGES_KEPT) behind it
+        '''CREATE TRIGGER IF NOT EXISTS catalog_changes_prune
+           AFTER INSERT ON catalog_changes WHEN new.version % 1000 = 0 BEGIN
+               DELETE FROM catalog_changes WHERE version <= new.version - 10000;
+           END''',
+    ]),
+    (10, 'Late-fee settlements, one per loan', [
+        '''CREATE TABLE IF NOT EXISTS fee_settlements (
+               loan_id INTEGER PRIMARY KEY,
+               patron_id TEXT NOT NULL,
+               amount REAL NOT NULL,
+               transaction_id TEXT,
+               settled_at TEXT NOT NULL
+           )''',
+    ]),
+]
+
+# Change-log rows kept by prune_catalog_changes() and, on write, the
+# catalog_changes_prune trigger; readers further behind reload
+CATALOG_CHANGES_KEPT = 10000
+
+def get_schema_version(conn=None) -> int:
+    """Get the highest applied migration version (0 for an unmigrated database)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if not exists:
+            return 0
+        row = conn.execute('SELECT MAX(version) AS version FROM schema_version').fetchone()
+        return row['version'] or 0
+    finally:
+        if own_conn:
+            conn.close()
+
+def migrate_database() -> int:
+    """
+    Apply pending schema migrations and return the resulting schema version.
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction together with
+    its schema_version row, so concurrent starters apply it exactly once and
+    a failed step leaves the database at the previous version.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        
+        for version, description, steps in MIGRATIONS:
+            if version <= get_schema_version(conn):
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-check under the write lock in case another process won the race
+                if version <= get_schema_version(conn):
+                    conn.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                    (version, description, datetime.now().isoformat())
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        version = get_schema_version(conn)
+    finally:
+        conn.close()
     
-    conn.commit()
-    conn.close()
+    if COMPACT_STORAGE:
+        convert_to_compact_storage()
+    if version >= 6:
+        prune_catalog_changes()
+    return version
+
+def get_catalog_version(conn=None) -> Tuple[int, int]:
+    """
+    Get (version, changed_at) of the catalog.
+
+    The version grows with every write to the books table, from any process
+    (triggers append to catalog_changes); changed_at is the Unix time of the
+    latest write. Returns (0, 0) before the change log exists.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        row = conn.execute(
+            'SELECT version, changed_at FROM catalog_changes ORDER BY version DESC LIMIT 1'
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        if own_conn:
+            conn.close()
+    return (row['version'], row['changed_at']) if row else (0, 0)
+
+def get_catalog_changes(since: int) -> Tuple[int, Optional[List[int]]]:
+    """
+    Get the current catalog version and the ids of books written after `since`.
+
+    The id list is None when a full reload is needed: the log has been
+    pruned past `since`, it holds an "anything changed" entry, or it does
+    not exist yet (version 0, as in get_catalog_version).
+    """
+    conn = get_db_connection()
+    try:
+        oldest = conn.execute('SELECT MIN(version) FROM catalog_changes').fetchone()[0]
+        rows = conn.execute(
+            'SELECT version, book_id FROM catalog_changes WHERE version > ? ORDER BY version', (since,)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return 0, None
+    finally:
+        conn.close()
+    if not rows:
+        return since, []
+    version = rows[-1]['version']
+    if oldest is None or oldest > since + 1 or any(row['book_id'] is None for row in rows):
+        return version, None
+    return version, list({row['book_id'] for row in rows})
+
+def prune_catalog_changes(keep: int = CATALOG_CHANGES_KEPT) -> int:
+    """Drop all but the newest `keep` change-log rows; returns rows deleted."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            cur = conn.execute('''
+                DELETE FROM catalog_changes
+                WHERE version <= (SELECT MAX(version) FROM catalog_changes) - ?
+            ''', (keep,))
+        return cur.rowcount
+    finally:
+        conn.close()
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
@@ -68,12 +850,13 @@ def add_sample_data():
             ''', (title, author, isbn, copies, copies))
         
         # Make 1984 unavailable by adding a borrow record
+        compact = is_compact_storage(conn)
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
         ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+              _to_db_time(datetime.now() - timedelta(days=5), compact),
+              _to_db_time(datetime.now() + timedelta(days=9), compact)))
         
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
@@ -91,6 +874,108 @@ def get_all_books() -> List[Dict]:
     conn.close()
     return [dict(book) for book in books]
 
+def _iter_batches(query: str, params: Tuple, batch_size: int) -> Iterator[List[sqlite3.Row]]:
+    """
+    Run a keyset query (`... WHERE id > ? ... ORDER BY id LIMIT ?`) batch by
+    batch. Each batch checks a connection out only while it is read, so a
+    slow consumer (e.g. a download) never pins a pooled connection.
+    """
+    last_id = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(query, params + (last_id, batch_size)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+def iter_books(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[sqlite3.Row]]:
+    """Yield every book, ordered by id, in batches of up to `batch_size` rows."""
+    return _iter_batches(f'''
+        SELECT {", ".join(BOOK_EXPORT_FIELDS)} FROM books
+        WHERE id > ? ORDER BY id LIMIT ?
+    ''', (), batch_size)
+
+def iter_borrow_records(batch_size: int = EXPORT_BATCH_SIZE,
+                        patron_id: Optional[str] = None) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield every loan (optionally one patron's), ordered by id, in batches.
+
+    Columns are LOAN_EXPORT_FIELDS with dates as ISO strings and patron IDs
+    as 6-digit strings, whatever the storage format.
+    """
+    conn = get_db_connection()
+    try:
+        compact = is_compact_storage(conn)
+    finally:
+        conn.close()
+    where, params = '', ()
+    if patron_id is not None:
+        where, params = 'patron_id = ? AND', (patron_id,)
+    return _iter_batches(f'''
+        SELECT id, printf('%06d', patron_id) AS patron_id, book_id,
+               {_iso_sql('borrow_date', compact)} AS borrow_date,
+               {_iso_sql('due_date', compact)} AS due_date,
+               {_iso_sql('return_date', compact)} AS return_date
+        FROM borrow_records
+        WHERE {where} id > ? ORDER BY id LIMIT ?
+    ''', params, batch_size)
+
+def encode_catalog_cursor(book: Dict) -> str:
+    """Encode the (title, id) position of a book as an opaque page cursor."""
+    raw = json.dumps([book['title'], book['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_catalog_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a page cursor back to (title, id); raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid catalog cursor.')
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError('Invalid catalog cursor.')
+    return title, book_id
+
+def get_books_page(limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Get one page of books ordered by (title, id) using keyset pagination.
+
+    `limit` defaults to CATALOG_PAGE_SIZE and is capped at
+    MAX_CATALOG_PAGE_SIZE. `after` is the cursor returned with the previous
+    page. Returns the books and the cursor for the next page (None on the
+    last page). Each page is an index range scan, so its cost does not grow
+    with the catalog size. Raises ValueError for a malformed cursor.
+    """
+    if limit is None:
+        limit = CATALOG_PAGE_SIZE
+    limit = max(1, min(limit, MAX_CATALOG_PAGE_SIZE))
+    conn = get_db_connection()
+    try:
+        if after:
+            title, book_id = decode_catalog_cursor(after)
+            rows = conn.execute('''
+                SELECT * FROM books
+                WHERE (title, id) > (?, ?)
+                ORDER BY title, id
+                LIMIT ?
+            ''', (title, book_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT * FROM books ORDER BY title, id LIMIT ?', (limit + 1,)
+            ).fetchall()
+    finally:
+        conn.close()
+    
+    books = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_catalog_cursor(books[-1]) if len(rows) > limit else None
+    return books, next_cursor
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
     conn = get_db_connection()
@@ -105,6 +990,42 @@ def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     conn.close()
     return dict(book) if book else None
 
+def search_books(search_term: str, search_type: str = 'title') -> List[Dict]:
+    """
+    Search books by title/author substring (case-insensitive) or exact ISBN.
+
+    ISBN lookups use the UNIQUE index on books.isbn. Title/author terms of
+    three or more characters are answered from the trigram FTS5 index;
+    shorter terms (or builds without FTS5) fall back to a LIKE scan.
+    """
+    term = (search_term or '').strip()
+    if not term:
+        return []
+    
+    conn = get_db_connection()
+    try:
+        if search_type == 'isbn':
+            rows = conn.execute('SELECT * FROM books WHERE isbn = ?', (term,)).fetchall()
+        else:
+            column = 'author' if search_type == 'author' else 'title'
+            if len(term) >= 3 and _has_search_index(conn):
+                query = '%s : "%s"' % (column, term.replace('"', '""'))
+                rows = conn.execute('''
+                    SELECT b.* FROM books_fts f
+                    JOIN books b ON b.id = f.rowid
+                    WHERE books_fts MATCH ?
+                    ORDER BY b.title, b.id
+                ''', (query,)).fetchall()
+            else:
+                pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                rows = conn.execute(
+                    f"SELECT * FROM books WHERE {column} LIKE ? ESCAPE '\\' ORDER BY title, id",
+                    (pattern,)
+                ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
@@ -123,22 +1044,390 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
             'book_id': record['book_id'],
             'title': record['title'],
             'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
+            'borrow_date': _from_db_time(record['borrow_date']),
+            'due_date': _from_db_time(record['due_date']),
+            'is_overdue': datetime.now() > _from_db_time(record['due_date'])
         })
     
     return borrowed_books
 
+def _count_active_loans(conn, patron_id: str) -> int:
+    """
+    The patron's active_loans counter; before migration 8 creates the
+    patrons table, the open loans are counted in borrow_records instead.
+    """
+    try:
+        row = conn.execute('SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+    except sqlite3.OperationalError:
+        row = conn.execute(
+            'SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL', (patron_id,)
+        ).fetchone()
+    return row[0] if row else 0
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
     conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    try:
+        return _count_active_loans(conn, patron_id)
+    finally:
+        conn.close()
+
+def get_patron(patron_id: str) -> Optional[Dict]:
+    """
+    Get a patron's loan counters, or None for a patron who never borrowed.
+
+    active_loans is exact (kept by triggers on borrow_records); overdue_loans
+    counts open loans that were overdue at overdue_as_of, the patron's last
+    overdue scan or reconcile.
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT * FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    as_of = row['overdue_as_of']
+    return dict(row, overdue_as_of=_from_db_time(as_of).isoformat() if as_of is not None else None)
+
+def reconcile_patron_counters(as_of: Optional[datetime] = None, dry_run: bool = False) -> Dict:
+    """
+    Recompute every patron's active/overdue counters from borrow_records
+    (overdue as of `as_of`, default now) in one transaction. Returns the
+    patrons whose active_loans had drifted; `dry_run` only reports them.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            drift = _rebuild_patron_counters(conn, as_of or datetime.now())
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        patrons = conn.execute('SELECT COUNT(*) FROM patrons').fetchone()[0]
+    finally:
+        conn.close()
+    return {'patrons': patrons, 'drifted': len(drift), 'corrected': 0 if dry_run else len(drift),
+            'drift': drift[:MAX_REPORTED_DRIFT]}
+
+def get_patron_activity(patron_id: str, as_of: datetime, fee_per_day: float,
+                        history_limit: int, history_offset: int = 0) -> Dict:
+    """
+    Get a patron's open loans and one page of borrowing history.
+
+    Overdue flags, days overdue and fees are computed in SQL; open loans come
+    from the open-loans index and history from the patron history index, so
+    the report costs two indexed queries. Dates are returned as stored (ISO).
+    """
+    conn = get_db_connection()
+    try:
+        compact = is_compact_storage(conn)
+        now = _to_db_time(as_of, compact)
+        active = conn.execute(f'''
+            SELECT loans.*, ROUND(loans.days_overdue * ?, 2) AS fee_amount
+            FROM (
+                SELECT br.id AS loan_id, br.book_id, b.title, b.author,
+                       {_iso_sql('br.borrow_date', compact)} AS borrow_date,
+                       {_iso_sql('br.due_date', compact)} AS due_date,
+                       br.due_date < ? AS is_overdue,
+                       MAX(CAST(julianday(?) - julianday({_day_sql('br.due_date', compact)}) AS INTEGER), 0)
+                           AS days_overdue
+                FROM borrow_records br
+                JOIN books b ON b.id = br.book_id
+                WHERE br.patron_id = ? AND br.return_date IS NULL
+            ) AS loans
+            ORDER BY loans.borrow_date, loans.loan_id
+        ''', (fee_per_day, now, as_of.date().isoformat(), patron_id)).fetchall()
+        
+        # Fetch one extra row to tell whether another page exists
+        history = conn.execute(f'''
+            SELECT br.id AS loan_id, br.book_id, b.title, b.author,
+                   {_iso_sql('br.borrow_date', compact)} AS borrow_date,
+                   {_iso_sql('br.due_date', compact)} AS due_date,
+                   {_iso_sql('br.return_date', compact)} AS return_date,
+                   COALESCE(br.return_date, ?) > br.due_date AS late
+            FROM borrow_records br
+            JOIN books b ON b.id = br.book_id
+            WHERE br.patron_id = ?
+            ORDER BY br.borrow_date DESC, br.id DESC
+            LIMIT ? OFFSET ?
+        ''', (now, patron_id, history_limit + 1, history_offset)).fetchall()
+    finally:
+        conn.close()
+    
+    active = [dict(row, is_overdue=bool(row['is_overdue'])) for row in active]
+    history = [dict(row, late=bool(row['late'])) for row in history]
+    return {
+        'active': active,
+        'history': history[:history_limit],
+        'history_has_more': len(history) > history_limit,
+    }
+
+def _overdue_loan_fees_query(conn, as_of: date, fee_per_day: float,
+                             patron_id: Optional[str] = None) -> Tuple[str, List]:
+    """The SQL and parameters get_overdue_loan_fees() runs on `conn`."""
+    compact = is_compact_storage(conn)
+    query = f'''
+        SELECT br.id AS loan_id, br.patron_id, br.book_id, b.title,
+               {_iso_sql('br.due_date', compact)} AS due_date,
+               CAST(julianday(?) - julianday({_day_sql('br.due_date', compact)}) AS INTEGER) AS days_overdue
+        FROM borrow_records br
+        JOIN books b ON b.id = br.book_id
+        WHERE br.return_date IS NULL AND br.due_date < ?
+    '''
+    params = [as_of.isoformat(), _to_db_time(datetime(as_of.year, as_of.month, as_of.day), compact)]
+    if patron_id is not None:
+        query += ' AND br.patron_id = ?'
+        params.append(patron_id)
+    query = f'''
+        SELECT loans.*, ROUND(loans.days_overdue * ?, 2) AS fee_amount
+        FROM ({query}) AS loans
+        ORDER BY loans.patron_id, loans.due_date, loans.loan_id
+    '''
+    return query, [fee_per_day] + params
+
+def get_overdue_loan_fees(as_of: date, fee_per_day: float, patron_id: Optional[str] = None) -> List[Dict]:
+    """
+    Get every open loan that is overdue on `as_of`, with days overdue and fee.
+
+    Days overdue (calendar days past the due date) and the fee are computed
+    in SQL in a single pass over one of the partial open-loans indexes.
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(*_overdue_loan_fees_query(conn, as_of, fee_per_day, patron_id)).fetchall()
+    finally:
+        conn.close()
+    return [dict(row, patron_id=_from_db_patron(row['patron_id'])) for row in rows]
+
+def _overdue_cutoff(as_of: datetime) -> datetime:
+    """Start of the day of `as_of`: loans due before it are overdue."""
+    return datetime.combine(as_of.date(), datetime.min.time())
+
+def iter_overdue_loans(as_of: datetime, fee_per_day: float, after_patron_id: Optional[str] = None,
+                       batch_size: int = OVERDUE_SCAN_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """
+    Yield open loans due before the day of `as_of` in batches, ordered by
+    patron, due date and id, so each patron's loans arrive together. Fees
+    are charged per whole day, so a loan due earlier that day is not
+    overdue yet.
+
+    Starts after patron `after_patron_id` when given (to resume a scan).
+    Batches are keyset queries on the (patron_id, due_date) open-loans index,
+    each on a short connection checkout, so any number of loans streams
+    through in bounded memory.
+    """
+    conn = get_db_connection()
+    try:
+        compact = is_compact_storage(conn)
+    finally:
+        conn.close()
+    cutoff = _to_db_time(_overdue_cutoff(as_of), compact)
+    query = f'''
+        SELECT br.id AS loan_id, br.patron_id, br.book_id, b.title,
+               br.patron_id AS patron_key, br.due_date AS due_key,
+               {_iso_sql('br.due_date', compact)} AS due_date,
+               CAST(julianday(?) - julianday({_day_sql('br.due_date', compact)}) AS INTEGER) AS days_overdue
+        FROM borrow_records br
+        JOIN books b ON b.id = br.book_id
+        WHERE br.return_date IS NULL AND br.due_date < ? AND {{after}}
+        ORDER BY br.patron_id, br.due_date, br.id
+        LIMIT ?
+    '''
+    if after_patron_id is not None:
+        after, after_params = 'br.patron_id > ?', (int(after_patron_id) if compact else after_patron_id,)
+    else:
+        after, after_params = '1', ()
+    while True:
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(query.format(after=after),
+                                (as_of.date().isoformat(), cutoff) + after_params + (batch_size,)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield [{
+            'loan_id': row['loan_id'],
+            'patron_id': _from_db_patron(row['patron_id']),
+            'book_id': row['book_id'],
+            'title': row['title'],
+            'due_date': row['due_date'],
+            'days_overdue': row['days_overdue'],
+            'fee_amount': round(row['days_overdue'] * fee_per_day, 2),
+        } for row in rows]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+        after = '(br.patron_id, br.due_date, br.id) > (?, ?, ?)'
+        after_params = (last['patron_key'], last['due_key'], last['loan_id'])
+
+def get_overdue_scan(run_date: str) -> Optional[Dict]:
+    """Get the overdue scan for a run date (YYYY-MM-DD), if one was started."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT * FROM overdue_scans WHERE run_date = ?', (run_date,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def start_overdue_scan(run_date: str, as_of: datetime) -> Dict:
+    """Record a new overdue scan (no-op if one exists for the date) and return it."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO overdue_scans (run_date, as_of, started_at) VALUES (?, ?, ?)
+            ''', (run_date, as_of.isoformat(), datetime.now().isoformat()))
+    finally:
+        conn.close()
+    return get_overdue_scan(run_date)
+
+def get_settled_loan_ids(loan_ids: List[int]) -> set:
+    """Get which of `loan_ids` already have a late-fee settlement."""
+    if not loan_ids:
+        return set()
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            f'SELECT loan_id FROM fee_settlements WHERE loan_id IN ({", ".join("?" * len(loan_ids))})',
+            list(loan_ids)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row['loan_id'] for row in rows}
+
+def record_fee_settlement(loan_id: int, patron_id: str, amount: float, transaction_id: Optional[str]) -> bool:
+    """Record a paid late fee; returns False if the loan was already settled."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            cur = conn.execute('''
+                INSERT INTO fee_settlements (loan_id, patron_id, amount, transaction_id, settled_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (loan_id) DO NOTHING
+            ''', (loan_id, patron_id, amount, transaction_id, datetime.now().isoformat()))
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+def save_overdue_notices(run_date: str, notices: List[Dict], as_of: datetime):
+    """
+    Store one notice per patron, refresh those patrons' overdue counters with
+    the cutoff iter_overdue_loans() used for `as_of` and move the scan
+    checkpoint past the last patron, in one transaction. Notices are
+    replaced, not duplicated, if a patron is written again.
+    """
+    now = datetime.now().isoformat()
+    conn = get_db_connection()
+    try:
+        compact = is_compact_storage(conn)
+        cutoff = _to_db_time(_overdue_cutoff(as_of), compact)
+        with conn:
+            # Counted now rather than taken from the notice: a loan may have been returned since it was read
+            conn.executemany('''
+                UPDATE patrons
+                SET overdue_as_of = ?, overdue_loans = (
+                    SELECT COUNT(*) FROM borrow_records
+                    WHERE patron_id = ? AND return_date IS NULL AND due_date < ?
+                )
+                WHERE patron_id = ?
+            ''', [(cutoff, int(n['patron_id']) if compact else n['patron_id'], cutoff, n['patron_id'])
+                  for n in notices])
+            conn.executemany('''
+                INSERT OR REPLACE INTO overdue_notices
+                    (run_date, patron_id, loan_count, total_fee, loans, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(run_date, n['patron_id'], n['loan_count'], n['total_fee'], json.dumps(n['loans']), now)
+                  for n in notices])
+            conn.execute('''
+                UPDATE overdue_scans
+                SET last_patron_id = ?, patrons = patrons + ?, loans = loans + ?,
+                    total_fees = ROUND(total_fees + ?, 2)
+                WHERE run_date = ?
+            ''', (notices[-1]['patron_id'], len(notices), sum(n['loan_count'] for n in notices),
+                  sum(n['total_fee'] for n in notices), run_date))
+    finally:
+        conn.close()
+
+def finish_overdue_scan(run_date: str):
+    """Mark an overdue scan complete."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute("UPDATE overdue_scans SET status = 'complete', finished_at = ? WHERE run_date = ?",
+                         (datetime.now().isoformat(), run_date))
+    finally:
+        conn.close()
+
+def delete_overdue_scan(run_date: str):
+    """Forget an overdue scan and its notices (to rerun it from scratch)."""
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute('DELETE FROM overdue_notices WHERE run_date = ?', (run_date,))
+            conn.execute('DELETE FROM overdue_scans WHERE run_date = ?', (run_date,))
+    finally:
+        conn.close()
+
+def iter_overdue_notices(run_date: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Yield a scan's notices in batches, in the order they were written."""
+    for rows in _iter_batches('''
+        SELECT id, patron_id, loan_count, total_fee, loans FROM overdue_notices
+        WHERE run_date = ? AND id > ? ORDER BY id LIMIT ?
+    ''', (run_date,), batch_size):
+        yield [dict(row, loans=json.loads(row['loans'])) for row in rows]
+
+def get_circulation_violations(max_active_loans: int = 5) -> Dict[str, List[Dict]]:
+    """
+    Find rows that break the circulation invariants: availability outside
+    0..total_copies, availability that disagrees with the open loans,
+    patrons holding more than `max_active_loans` books, and patron
+    active_loans counters that disagree with the open loans. Empty lists
+    mean the data is consistent.
+    """
+    conn = get_db_connection()
+    try:
+        out_of_range = conn.execute('''
+            SELECT id, available_copies, total_copies FROM books
+            WHERE available_copies < 0 OR available_copies > total_copies
+        ''').fetchall()
+        miscounted = conn.execute('''
+            SELECT b.id, b.available_copies, b.total_copies, COUNT(br.id) AS active_loans
+            FROM books b
+            LEFT JOIN borrow_records br ON br.book_id = b.id AND br.return_date IS NULL
+            GROUP BY b.id
+            HAVING b.available_copies != b.total_copies - COUNT(br.id)
+        ''').fetchall()
+        over_limit = conn.execute('''
+            SELECT patron_id, COUNT(*) AS active_loans FROM borrow_records
+            WHERE return_date IS NULL
+            GROUP BY patron_id
+            HAVING COUNT(*) > ?
+        ''', (max_active_loans,)).fetchall()
+        miscounted_patrons = conn.execute('''
+            SELECT p.patron_id, p.active_loans, COALESCE(open.loans, 0) AS open_loans
+            FROM patrons p
+            LEFT JOIN (
+                SELECT printf('%06d', patron_id) AS patron_id, COUNT(*) AS loans FROM borrow_records
+                WHERE return_date IS NULL
+                GROUP BY patron_id
+            ) open ON open.patron_id = p.patron_id
+            WHERE p.active_loans != COALESCE(open.loans, 0)
+        ''').fetchall()
+    finally:
+        conn.close()
+
+    return {
+        'availability_out_of_range': [dict(row) for row in out_of_range],
+        'availability_mismatch': [dict(row) for row in miscounted],
+        'patrons_over_limit': [dict(row, patron_id=_from_db_patron(row['patron_id'])) for row in over_limit],
+        'patron_counter_mismatch': [dict(row) for row in miscounted_patrons],
+    }
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
@@ -155,14 +1444,41 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
         conn.close()
         return False
 
+def insert_books_bulk(books: List[Tuple[str, str, str, int, int]]) -> int:
+    """
+    Insert many books in one transaction, skipping ISBNs that already exist.
+
+    Each item is (title, author, isbn, total_copies, available_copies).
+    Returns the number of rows actually inserted.
+    """
+    conn = get_db_connection()
+    try:
+        with conn:
+            before, _ = get_catalog_version(conn)
+            cur = conn.executemany('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (isbn) DO NOTHING
+            ''', books)
+            if cur.rowcount and before:
+                # Collapse the per-row change log entries into one "anything changed"
+                conn.execute('DELETE FROM catalog_changes WHERE version > ?', (before,))
+                conn.execute(
+                    "INSERT INTO catalog_changes (book_id, changed_at) VALUES (NULL, strftime('%s', 'now'))"
+                )
+    finally:
+        conn.close()
+    return cur.rowcount
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
     conn = get_db_connection()
     try:
+        compact = is_compact_storage(conn)
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+        ''', (patron_id, book_id, _to_db_time(borrow_date, compact), _to_db_time(due_date, compact)))
         conn.commit()
         conn.close()
         return True
@@ -170,6 +1486,30 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
         conn.close()
         return False
 
+def insert_borrow_records_bulk(records: List[Tuple[str, int, datetime, datetime, Optional[datetime]]]) -> int:
+    """
+    Insert many borrow records in one transaction.
+
+    Each item is (patron_id, book_id, borrow_date, due_date, return_date);
+    return_date is None for loans that are still open. Book availability is
+    not touched - callers loading historical data must keep it consistent.
+    """
+    conn = get_db_connection()
+    try:
+        compact = is_compact_storage(conn)
+        with conn:
+            cur = conn.executemany('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                (patron_id, book_id, _to_db_time(borrow_date, compact), _to_db_time(due_date, compact),
+                 _to_db_time(return_date, compact))
+                for patron_id, book_id, borrow_date, due_date, return_date in records
+            ))
+            return cur.rowcount
+    finally:
+        conn.close()
+
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
     conn = get_db_connection()
@@ -186,21 +1526,134 @@ def update_book_availability(book_id: int, change: int) -> bool:
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
+        compact = is_compact_storage(conn)
         with conn:
             cur = conn.execute(
                 '''
                 UPDATE borrow_records
                 SET return_date = ?
-                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                WHERE id = (
+                    SELECT id FROM borrow_records
+                    WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                    ORDER BY borrow_date, id
+                    LIMIT 1
+                )
                 ''',
-                (return_date.isoformat(), patron_id, book_id)
+                (_to_db_time(return_date, compact), patron_id, book_id)
             )
             return cur.rowcount > 0
     except Exception:
-        try:
-            conn.close()
-        except Exception:
-            pass
         return False
+    finally:
+        conn.close()
+
+# Transactional Unit of Work
+
+class UnitOfWork:
+    """
+    Loan and availability operations inside one BEGIN IMMEDIATE transaction.
+
+    Obtain one with `with unit_of_work() as uow:`. The write lock is held from
+    the start, so reads made through the unit of work cannot be invalidated
+    by a concurrent borrow/return before the transaction commits.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.compact = is_compact_storage(conn)
+        self.rolled_back = False
+
+    def get_book(self, book_id: int) -> Optional[Dict]:
+        """Get a specific book by ID."""
+        book = self.conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        return dict(book) if book else None
+
+    def count_active_loans(self, patron_id: str) -> int:
+        """Get the number of books currently borrowed by a patron (the patrons counter)."""
+        return _count_active_loans(self.conn, patron_id)
+
+    def reserve_copy(self, book_id: int) -> bool:
+        """Take one available copy; False if none are left."""
+        cur = self.conn.execute('''
+            UPDATE books SET available_copies = available_copies - 1
+            WHERE id = ? AND available_copies > 0
+        ''', (book_id,))
+        return cur.rowcount > 0
+
+    def release_copy(self, book_id: int) -> bool:
+        """Put one copy back; False if that would exceed total_copies."""
+        cur = self.conn.execute('''
+            UPDATE books SET available_copies = available_copies + 1
+            WHERE id = ? AND available_copies < total_copies
+        ''', (book_id,))
+        return cur.rowcount > 0
+
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> int:
+        """Insert a new borrow record and return its id."""
+        cur = self.conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+        ''', (patron_id, book_id, _to_db_time(borrow_date, self.compact), _to_db_time(due_date, self.compact)))
+        return cur.lastrowid
+
+    def close_borrow_record(self, patron_id: str, book_id: int, return_date: datetime) -> bool:
+        """
+        Set the return date on the patron's oldest open loan of this book.
+
+        A patron may hold several copies of one book; closing all of them
+        here while the caller releases a single copy would lose copies.
+        """
+        cur = self.conn.execute('''
+            UPDATE borrow_records
+            SET return_date = ?
+            WHERE id = (
+                SELECT id FROM borrow_records
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                ORDER BY borrow_date, id
+                LIMIT 1
+            )
+        ''', (_to_db_time(return_date, self.compact), patron_id, book_id))
+        return cur.rowcount > 0
+
+    def savepoint(self, name: str):
+        """Mark a point that rollback_to_savepoint(name) can return to."""
+        self.conn.execute(f'SAVEPOINT {name}')
+
+    def release_savepoint(self, name: str):
+        """Keep the work done since savepoint(name)."""
+        self.conn.execute(f'RELEASE {name}')
+
+    def rollback_to_savepoint(self, name: str):
+        """Undo only the work done since savepoint(name); the transaction goes on."""
+        self.conn.execute(f'ROLLBACK TO {name}')
+        self.conn.execute(f'RELEASE {name}')
+
+    def rollback(self):
+        """Discard everything done so far; nothing is committed on exit."""
+        self.conn.rollback()
+        self.rolled_back = True
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Run a block of loan operations as a single transaction.
+
+    Commits once when the block exits normally (unless uow.rollback() was
+    called) and rolls back if an exception escapes.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        uow = UnitOfWork(conn)
+        try:
+            yield uow
+        except BaseException:
+            conn.rollback()
+            raise
+        if not uow.rolled_back:
+            conn.commit()
+    finally:
+        conn.close()
@@ -9,18 +9,24 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import sqlite3
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     get_patron_borrowed_books,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books
+    update_borrow_record_return_date, get_all_books, search_books,
+    unit_of_work, get_patron_activity
 )
+from services.catalog_snapshot import get_catalog_snapshot
+from services.library_service import validate_book_fields
 
 def _as_date(d):
     if d is None:
         return None
+    if isinstance(d, datetime):
+        return d.date()
     if isinstance(d, date):
         return d
     if isinstance(d, str):
@@ -40,18 +46,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     """
     Add a new book to the catalog. (R1)
     """
-    if not title or not title.strip():
-        return False, "Title is required."
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    if not author or not author.strip():
-        return False, "Author is required."
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
 
     existing = get_book_by_isbn(isbn)
     if existing:
@@ -66,27 +63,33 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Borrow a book. (R2)
+
+    All checks and writes run in one transaction, so concurrent borrows
+    cannot oversell the last copy or push a patron past the limit.
     """
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-
-    current_borrowed = get_patron_borrow_count(patron_id)
-    if current_borrowed >= 5:  # <=— changed from > 5
-        return False, "You have reached the maximum borrowing limit of 5 books."
-
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
 
-    if not insert_borrow_record(patron_id, book_id, borrow_date, due_date):
+    try:
+        with unit_of_work() as uow:
+            book = uow.get_book(book_id)
+            if not book:
+                return False, "Book not found."
+            if book['available_copies'] <= 0:
+                return False, "This book is currently not available."
+
+            current_borrowed = uow.count_active_loans(patron_id)
+            if current_borrowed >= 5:
+                return False, "You have reached the maximum borrowing limit of 5 books."
+
+            if not uow.reserve_copy(book_id):
+                return False, "This book is currently not available."
+            uow.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+    except sqlite3.Error:
         return False, "Database error occurred while creating borrow record."
-    if not update_book_availability(book_id, -1):
-        return False, "Database error occurred while updating book availability."
 
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -98,11 +101,14 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
     now = datetime.now()
-    updated = update_borrow_record_return_date(patron_id, book_id, now)
-    if not updated:
-        return False, "No active borrow record found for this patron/book."
-
-    if not update_book_availability(book_id, +1):
+    try:
+        with unit_of_work() as uow:
+            if not uow.close_borrow_record(patron_id, book_id, now):
+                return False, "No active borrow record found for this patron/book."
+            if not uow.release_copy(book_id):
+                uow.rollback()
+                return False, "Database error updating availability."
+    except sqlite3.Error:
         return False, "Database error updating availability."
 
     return True, "Book returned successfully."
@@ -139,53 +145,46 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     """
-    Search catalog by title/author/isbn. (R5)
+    Search catalog by title/author (partial) or isbn (exact). (R5)
     """
-    term = (search_term or "").strip().lower()
+    term = (search_term or "").strip()
     if not term:
         return []
 
-    books = get_all_books() or []
     if search_type not in {"title", "author", "isbn"}:
         search_type = "title"
 
-    out = []
-    for b in books:
-        val = str(b.get(search_type, "")).lower()
-        if term in val:
-            out.append(b)
-    return out
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return [book.as_dict() for book in snapshot.search(term, search_type)]
+    return search_books(term, search_type)
 
-def get_patron_status_report(patron_id: str) -> Dict:
+def get_patron_status_report(patron_id: str, history_page: int = 1,
+                             history_page_size: int = REPORT_HISTORY_PAGE_SIZE) -> Dict:
     """
-    Patron status report placeholder. (R7)
+    Patron status report: active loans, overdue count, fees owed and a page
+    of borrowing history. (R7)
     """
-    # Validate patron id
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return {}
 
-    borrowed = get_patron_borrowed_books(patron_id)
-    currently_borrowed = []
-    overdue_count = 0
-    for r in borrowed:
-        is_overdue = bool(r.get('is_overdue'))
-        if is_overdue:
-            overdue_count += 1
-        currently_borrowed.append({
-            'book_id': r.get('book_id'),
-            'title': r.get('title'),
-            'author': r.get('author'),
-            'borrow_date': r.get('borrow_date').isoformat() if r.get('borrow_date') else None,
-            'due_date': r.get('due_date').isoformat() if r.get('due_date') else None,
-            'is_overdue': is_overdue
-        })
+    history_page = max(int(history_page), 1)
+    history_page_size = min(max(int(history_page_size), 1), MAX_REPORT_HISTORY_PAGE_SIZE)
+    activity = get_patron_activity(patron_id, datetime.now(), LATE_FEE_PER_DAY,
+                                   history_page_size, (history_page - 1) * history_page_size)
 
+    currently_borrowed = activity['active']
     total_active = len(currently_borrowed)
     status = 'OK' if total_active > 0 else 'No active borrows'
     return {
         'patron_id': patron_id,
         'currently_borrowed': currently_borrowed,
         'total_active': total_active,
-        'overdue_count': overdue_count,
+        'overdue_count': sum(1 for r in currently_borrowed if r['is_overdue']),
+        'total_late_fees': round(sum(r['fee_amount'] for r in currently_borrowed), 2),
+        'history': activity['history'],
+        'history_page': history_page,
+        'history_page_size': history_page_size,
+        'history_has_more': activity['history_has_more'],
         'status': status
     }
@@ -3,7 +3,13 @@ API Routes - JSON API endpoints
 """
 
 from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+from database import CATALOG_PAGE_SIZE, decode_catalog_cursor
+from library_service import (
+    REPORT_HISTORY_PAGE_SIZE, calculate_late_fee_for_book, calculate_outstanding_late_fees, get_patron_status_report,
+    process_circulation_batch, search_books_in_catalog
+)
+from services.catalog_snapshot import get_catalog_page
+from services.http_cache import catalog_cached
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,7 +22,52 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fees')
+def get_late_fees():
+    """
+    Late fees for every overdue open loan, optionally filtered by ?patron_id=.
+    Batch API for R4: Late Fee Calculation
+    """
+    patron_id = request.args.get('patron_id') or None
+    result = calculate_outstanding_late_fees(patron_id)
+    return jsonify(result), 400 if result['status'] == 'Invalid patron ID' else 200
+
+@api_bp.route('/patron/<patron_id>/status')
+def patron_status_api(patron_id):
+    """
+    Patron status report via API endpoint (?page=, ?page_size= page the history).
+    JSON interface for R7: Patron Status Report
+    """
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', REPORT_HISTORY_PAGE_SIZE, type=int)
+    report = get_patron_status_report(patron_id, history_page=page, history_page_size=page_size)
+    if not report:
+        return jsonify({'error': 'Invalid patron ID. Must be exactly 6 digits.'}), 400
+    return jsonify(report)
+
+@api_bp.route('/circulation/batch', methods=['POST'])
+def circulation_batch_api():
+    """
+    Apply a batch of scanned borrows/returns in one transaction.
+    Body: {"operations": [{"op": "borrow"|"return", "patron_id": "123456", "book_id": 1}, ...]}
+    Batch API for R2/R3: Book Borrowing and Return Processing
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object with an "operations" list'}), 400
+    
+    result = process_circulation_batch(payload.get('operations'))
+    if result['status'] != 'OK':
+        return jsonify({'error': result['status']}), 400
+    return jsonify(result)
+
+def _search_args_error():
+    if not request.args.get('q', '').strip():
+        return jsonify({'error': 'Search term is required'}), 400
+    return None
+
 @api_bp.route('/search')
+@catalog_cached(validate=_search_args_error)
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -37,3 +88,40 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+def _catalog_args_error():
+    try:
+        int(request.args.get('limit', CATALOG_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    after = request.args.get('after')
+    if after:
+        try:
+            decode_catalog_cursor(after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return None
+
+@api_bp.route('/catalog')
+@catalog_cached(validate=_catalog_args_error)
+def catalog_api():
+    """
+    Page through the catalog via API endpoint.
+    JSON interface for R2: Book Catalog Display (keyset pagination)
+    """
+    after = request.args.get('after') or None
+    try:
+        limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    try:
+        books, next_cursor = get_catalog_page(limit=limit, after=after)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'books': [dict(book) for book in books],
+        'count': len(books),
+        'next_cursor': next_cursor
+    })
@@ -3,7 +3,9 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from database import decode_catalog_cursor
+from services.catalog_snapshot import get_catalog_page
+from services.http_cache import catalog_cached
 from library_service import add_book_to_catalog
 
 catalog_bp = Blueprint('catalog', __name__)
@@ -13,14 +15,32 @@ def index():
     """Home page redirects to catalog."""
     return redirect(url_for('catalog.catalog'))
 
+def _invalid_catalog_page():
+    flash('Invalid catalog page.', 'error')
+    return redirect(url_for('catalog.catalog'))
+
+def _catalog_args_error():
+    after = request.args.get('after')
+    if after:
+        try:
+            decode_catalog_cursor(after)
+        except ValueError:
+            return _invalid_catalog_page()
+    return None
+
 @catalog_bp.route('/catalog')
+@catalog_cached(renders_flashes=True, validate=_catalog_args_error)
 def catalog():
     """
-    Display all books in the catalog.
+    Display the book catalog one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    after = request.args.get('after') or None
+    try:
+        books, next_cursor = get_catalog_page(after=after)
+    except ValueError:
+        return _invalid_catalog_page()
+    return render_template('catalog.html', books=books, next_cursor=next_cursor, is_first_page=after is None)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
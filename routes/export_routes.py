@@ -0,0 +1,37 @@
+"""
+Export Routes - streaming NDJSON/CSV downloads of the catalog and loans
+"""
+
+from datetime import date
+
+from flask import Blueprint, Response, jsonify, request
+from services.export import EXPORTS, FORMATS, gzip_chunks, iter_export
+
+export_bp = Blueprint('export', __name__, url_prefix='/api/export')
+
+@export_bp.route('/<kind>')
+def export(kind):
+    """
+    Stream every book (/api/export/books) or loan (/api/export/loans).
+    ?format=ndjson (default) or csv; ?patron_id= narrows the loan export.
+    Gzipped on the fly when the client sends Accept-Encoding: gzip.
+    """
+    if kind not in EXPORTS:
+        return jsonify({'error': f'Unknown export: {kind}'}), 404
+    fmt = request.args.get('format', 'ndjson')
+    patron_id = request.args.get('patron_id') or None
+    if patron_id is not None and (not patron_id.isdigit() or len(patron_id) != 6):
+        return jsonify({'error': 'Invalid patron ID. Must be exactly 6 digits.'}), 400
+    try:
+        chunks = iter_export(kind, fmt, patron_id=patron_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    gzipped = request.accept_encodings['gzip'] > 0
+    response = Response(gzip_chunks(chunks) if gzipped else chunks, mimetype=FORMATS[fmt])
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    filename = f'{kind}-{date.today().isoformat()}.{fmt}'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
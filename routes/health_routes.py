@@ -0,0 +1,19 @@
+"""
+Health Routes - liveness and readiness probes
+"""
+
+from flask import Blueprint, jsonify
+from services.health import check_readiness
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: the database is reachable and migrated, and we are not shutting down."""
+    ready, details = check_readiness()
+    return jsonify(details), 200 if ready else 503
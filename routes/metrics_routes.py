@@ -0,0 +1,18 @@
+"""
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response, abort, current_app
+from services.metrics import registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Expose request latency histograms, status counts, in-flight requests and
+    DB query counts in Prometheus text format.
+    """
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
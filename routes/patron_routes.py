@@ -0,0 +1,25 @@
+"""
+Patron Routes - Patron status report
+"""
+
+from flask import Blueprint, render_template, request
+from library_service import get_patron_status_report
+
+patron_bp = Blueprint('patron', __name__)
+
+@patron_bp.route('/patron', methods=['GET'])
+def patron_status():
+    """
+    Show a patron's status report (R7)
+    - Currently borrowed books with due dates and overdue flags
+    - Total late fees owed
+    - Borrowing history, paged
+    """
+    patron_id = request.args.get('patron_id', '').strip()
+    page = request.args.get('page', 1, type=int)
+    report = None
+
+    if patron_id:
+        report = get_patron_status_report(patron_id, history_page=page)
+
+    return render_template('patron.html', patron_id=patron_id, report=report)
@@ -4,10 +4,12 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request
 from library_service import search_books_in_catalog
+from services.http_cache import catalog_cached
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search', methods=['GET'])
+@catalog_cached(renders_flashes=True)
 def search_books():
     """
     Search for books in the catalog (R5)
@@ -0,0 +1,125 @@
+"""
+Production entry point: runs create_app() under gunicorn with several
+worker processes (and threads per worker).
+
+The database (--database, else LIBRARY_DATABASE) is prepared once in the
+master before workers are forked, and the master's pooled connections are
+closed so no SQLite handle crosses a fork. Workers are told the same
+database explicitly. An in-memory database is private to one process, so
+it is only allowed with a single worker, which prepares it itself. On SIGTERM each worker fails /readyz and finishes in-flight requests
+within the graceful timeout before exiting.
+
+Usage:
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+
+import database
+
+
+def default_workers() -> int:
+    return int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def build_options(args, prepare_in_master: bool = True) -> dict:
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'accesslog': args.access_log,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+    if prepare_in_master:
+        options['on_starting'] = on_starting
+    return options
+
+
+def on_starting(server):
+    """Master, before forking: create/migrate/seed the database exactly once."""
+    from app import prepare_database
+    if not database.is_read_only_database():
+        prepare_database()
+    database.close_pool()
+
+
+def post_worker_init(worker):
+    """Worker: fail readiness as soon as SIGTERM arrives, then shut down gracefully."""
+    from services.health import start_draining
+    handle_exit = worker.handle_exit
+
+    def drain_and_exit(sig, frame):
+        start_draining()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain_and_exit)
+
+
+def worker_exit(server, worker):
+    database.close_pool()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the library app with gunicorn.")
+    parser.add_argument('--bind', default=os.environ.get('LIBRARY_BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('LIBRARY_THREADS', '4')))
+    parser.add_argument('--timeout', type=int, default=30, help="seconds before a stuck worker is restarted")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="seconds workers get to finish requests on shutdown")
+    parser.add_argument('--access-log', default=None, help="access log path ('-' for stdout)")
+    parser.add_argument('--database', help="SQLite database file (default: %s)" % database.DATABASE)
+    parser.add_argument('--read-only', action='store_true', help="open the database read-only")
+    args = parser.parse_args(argv)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is required for serve.py (pip install -r requirements.txt)", file=sys.stderr)
+        return 1
+
+    from app import storage_settings
+    overrides = {}
+    if args.database:
+        overrides['DATABASE'] = args.database
+    if args.read_only:
+        overrides['DATABASE_READ_ONLY'] = True
+    storage, read_only = storage_settings(overrides)
+    memory = storage == ':memory:'
+    if memory and args.workers > 1:
+        print("an in-memory database cannot be shared by %d workers; use --workers 1 or a file" % args.workers,
+              file=sys.stderr)
+        return 2
+    if not memory and (storage or read_only):
+        database.configure_storage(path=storage, read_only=read_only)
+    worker_config = {'INIT_DATABASE': memory, 'DATABASE': storage, 'DATABASE_READ_ONLY': read_only}
+
+    class LibraryServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Runs in each worker after fork; a file database is already prepared
+            from app import create_app
+            return create_app(worker_config)
+
+    LibraryServer(build_options(args, prepare_in_master=not memory)).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Bulk catalog import - stream a CSV or JSONL vendor feed into the books table.
+
+Rows are validated with the same rules as add_book_to_catalog (R1) and
+inserted in chunked executemany transactions. ISBNs that already exist (in
+the database or earlier in the feed) are counted as duplicates, not errors.
+
+Usage:
+    python -m services.catalog_import FEED [--format csv|jsonl] [--chunk-size N] [--database PATH]
+
+CSV feeds need a header row with title, author, isbn and total_copies; JSONL
+feeds need one object per line with the same keys.
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import database
+from services.library_service import validate_book_fields
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_feed_rows(stream: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Yield (line_number, row, parse_error) for each record in a text stream.
+
+    Exactly one of row / parse_error is set.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "Expected a JSON object."
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f"Unsupported feed format: {fmt}")
+
+
+def parse_book_row(row: Dict) -> Tuple[Optional[Tuple[str, str, str, int, int]], Optional[str]]:
+    """Turn a feed row into an insertable book tuple, or return a validation error."""
+    title = row.get('title') or ''
+    author = row.get('author') or ''
+    isbn = str(row.get('isbn') or '').strip()
+    try:
+        total_copies = int(row.get('total_copies'))
+    except (TypeError, ValueError):
+        return None, "Total copies must be a positive integer."
+
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return None, error
+    return (title.strip(), author.strip(), isbn, total_copies, total_copies), None
+
+
+def import_catalog(stream: Iterable[str], fmt: str = 'csv', chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    Import books from a CSV/JSONL text stream and return an import report.
+
+    Memory use is bounded by chunk_size; each chunk is committed on its own,
+    so an interrupted import keeps the chunks already written.
+    """
+    report = {
+        'rows': 0,
+        'accepted': 0,
+        'duplicates': 0,
+        'rejected': 0,
+        'errors': [],
+        'seconds': 0.0,
+        'rows_per_second': 0.0,
+    }
+    start = time.perf_counter()
+    chunk: List[Tuple[str, str, str, int, int]] = []
+
+    def flush():
+        inserted = database.insert_books_bulk(chunk)
+        report['accepted'] += inserted
+        report['duplicates'] += len(chunk) - inserted
+        chunk.clear()
+
+    for line_number, row, error in iter_feed_rows(stream, fmt):
+        report['rows'] += 1
+        book = None
+        if row is not None:
+            book, error = parse_book_row(row)
+        if error:
+            report['rejected'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': line_number, 'error': error})
+            continue
+        chunk.append(book)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+    return report
+
+
+def import_catalog_file(path: str, fmt: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Import a feed file; the format defaults to its extension (.jsonl/.ndjson or csv)."""
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    with open(path, newline='', encoding='utf-8') as f:
+        return import_catalog(f, fmt, chunk_size)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV or JSONL feed.")
+    parser.add_argument('feed', help="path to the feed file, or - for stdin")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="feed format (default: from extension)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--database', help="SQLite file to import into (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.configure_storage(path=args.database)
+    database.init_database()
+    database.migrate_database()
+
+    if args.feed == '-':
+        stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        report = import_catalog(stdin, args.format or 'csv', args.chunk_size)
+    else:
+        report = import_catalog_file(args.feed, args.format, args.chunk_size)
+    print(json.dumps(report, indent=2))
+    return 0 if report['rejected'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""
+In-memory catalog snapshot - every book as a slotted record.
+
+The snapshot is loaded from the books table on first use and then patched
+incrementally: every read checks the catalog version, and rows written since
+the last check (by any process, per the catalog_changes log) are re-read.
+Catalog pages and searches are served from it without building a dict per
+row; title/author substring search goes through trigram indexes that are
+patched the same way. Database reads run outside the snapshot lock and their
+results are swapped in under it, so readers never wait on a query.
+"""
+
+import os
+import threading
+from bisect import bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+CATALOG_SNAPSHOT_ENABLED = os.environ.get('LIBRARY_CATALOG_SNAPSHOT', '1') != '0'
+
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+_LOAD_BATCH = 5000
+_REFRESH_BATCH = 500
+
+
+class Book:
+    """One catalog row. Supports book.title, book['title'] and dict(book)."""
+
+    __slots__ = BOOK_FIELDS
+
+    def __init__(self, id: int, title: str, author: str, isbn: str, total_copies: int, available_copies: int):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.total_copies = total_copies
+        self.available_copies = available_copies
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def keys(self):
+        return BOOK_FIELDS
+
+    def as_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in BOOK_FIELDS}
+
+    def __repr__(self):
+        return f'Book(id={self.id!r}, title={self.title!r})'
+
+
+class TrigramIndex:
+    """
+    Inverted index from lower-cased 3-character substrings to book ids.
+
+    Any book containing a term also contains every trigram of the term, so
+    intersecting their posting lists gives a candidate superset that the
+    caller verifies with a plain substring test.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, set] = {}
+
+    @staticmethod
+    def trigrams(text: str) -> set:
+        text = text.lower()
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, book_id: int, text: str):
+        for gram in self.trigrams(text):
+            self._postings.setdefault(gram, set()).add(book_id)
+
+    def remove(self, book_id: int, text: str):
+        for gram in self.trigrams(text):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def candidates(self, term: str) -> set:
+        """Ids that may contain `term` (exact for 3-character terms)."""
+        grams = self.trigrams(term)
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        if not postings[0]:
+            return set()
+        return set(postings[0]).intersection(*postings[1:])
+
+    def clear(self):
+        self._postings.clear()
+
+    def __len__(self):
+        return len(self._postings)
+
+
+class CatalogSnapshot:
+    """
+    All books keyed by id and ISBN, with a (title, id) ordering for paging.
+
+    Book objects are never mutated - a changed row gets a new Book - so
+    callers can keep the records they were handed. Author strings are
+    interned so books by the same author share one string.
+    """
+
+    SEARCH_FIELDS = ('title', 'author')
+
+    def __init__(self, enabled: bool = CATALOG_SNAPSHOT_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._books: Dict[int, Book] = {}
+        self._by_isbn: Dict[str, Book] = {}
+        self._order: List[Tuple[str, int]] = []
+        self._authors: Dict[str, str] = {}
+        self._indexes = {field: TrigramIndex() for field in self.SEARCH_FIELDS}
+        self._indexed = False  # trigram indexes are built on the first search
+        self._database: Optional[str] = None
+        self._version = 0
+        self._stale = True
+        self.loads = 0
+        self.refreshed_rows = 0
+
+    # -- maintenance -------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        """Catalog version the loaded rows reflect."""
+        return self._version
+
+    def clear(self):
+        with self._lock:
+            self._stale = True
+            self._books, self._by_isbn, self._order, self._authors = {}, {}, [], {}
+            for index in self._indexes.values():
+                index.clear()
+            self._indexed = False
+
+    def _sync(self):
+        while True:
+            with self._lock:
+                reload = self._stale or self._database != database.DATABASE
+                since = self._version
+            if reload:
+                self._load()
+                return
+            version, book_ids = database.get_catalog_changes(since)
+            if book_ids is None:
+                self._load()
+                return
+            if not book_ids:
+                return
+            rows = self._fetch(book_ids)
+            with self._lock:
+                if not self._stale and self._version == since:
+                    self._refresh(book_ids, rows)
+                    self._version = version
+                    return
+            # Another reader moved the snapshot meanwhile; catch up from there
+
+    def _load(self):
+        path = database.DATABASE
+        books, by_isbn, order, authors = {}, {}, [], {}
+        conn = database.get_db_connection()
+        try:
+            # Read the version first: rows written meanwhile are re-read later
+            version, _ = database.get_catalog_version(conn)
+            cur = conn.execute(f'SELECT {", ".join(BOOK_FIELDS)} FROM books')
+            while True:
+                rows = cur.fetchmany(_LOAD_BATCH)
+                if not rows:
+                    break
+                for row in rows:
+                    book = self._make_book(row, authors)
+                    books[book.id] = book
+                    by_isbn[book.isbn] = book
+                    order.append((book.title, book.id))
+        finally:
+            conn.close()
+        order.sort()
+        with self._lock:
+            if not self._stale and self._database == path and self._version > version:
+                return  # a concurrent load already installed a newer catalog
+            self.clear()
+            self._books, self._by_isbn, self._order, self._authors = books, by_isbn, order, authors
+            self._database = path
+            self._version = version
+            self._stale = False
+            self.loads += 1
+
+    @staticmethod
+    def _fetch(book_ids: List[int]) -> Dict:
+        rows = {}
+        conn = database.get_db_connection()
+        try:
+            for start in range(0, len(book_ids), _REFRESH_BATCH):
+                chunk = book_ids[start:start + _REFRESH_BATCH]
+                placeholders = ', '.join('?' * len(chunk))
+                for row in conn.execute(
+                    f'SELECT {", ".join(BOOK_FIELDS)} FROM books WHERE id IN ({placeholders})', chunk
+                ):
+                    rows[row['id']] = row
+        finally:
+            conn.close()
+        return rows
+
+    def _refresh(self, book_ids: List[int], rows: Dict):
+        for book_id in book_ids:
+            old = self._books.pop(book_id, None)
+            book = self._make_book(rows[book_id], self._authors) if book_id in rows else None
+            # Availability changes are the common case; skip reindexing them
+            retitled = old is None or book is None or (old.title, old.author) != (book.title, book.author)
+            if old is not None:
+                if self._by_isbn.get(old.isbn) is old:
+                    del self._by_isbn[old.isbn]
+                if retitled:
+                    self._order.pop(bisect_right(self._order, (old.title, old.id)) - 1)
+                    self._unindex(old)
+            if book is not None:
+                self._books[book_id] = book
+                self._by_isbn[book.isbn] = book
+                if retitled:
+                    insort(self._order, (book.title, book.id))
+                    self._index(book)
+        self.refreshed_rows += len(book_ids)
+
+    def _index(self, book: Book):
+        if self._indexed:
+            for field, index in self._indexes.items():
+                index.add(book.id, getattr(book, field))
+
+    def _unindex(self, book: Book):
+        if self._indexed:
+            for field, index in self._indexes.items():
+                index.remove(book.id, getattr(book, field))
+
+    def _build_indexes(self):
+        self._indexed = True
+        for book in self._books.values():
+            self._index(book)
+
+    @staticmethod
+    def _make_book(row, authors: Dict[str, str]) -> Book:
+        author = authors.setdefault(row['author'], row['author'])
+        return Book(row['id'], row['title'], author, row['isbn'], row['total_copies'], row['available_copies'])
+
+    # -- reads -------------------------------------------------------------
+
+    def get(self, book_id: int) -> Optional[Book]:
+        self._sync()
+        with self._lock:
+            return self._books.get(book_id)
+
+    def get_by_isbn(self, isbn: str) -> Optional[Book]:
+        self._sync()
+        with self._lock:
+            return self._by_isbn.get(isbn)
+
+    def all(self) -> List[Book]:
+        """Every book ordered by (title, id)."""
+        self._sync()
+        with self._lock:
+            return [self._books[book_id] for _, book_id in self._order]
+
+    def page(self, limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[List[Book], Optional[str]]:
+        """Same contract as database.get_books_page(), but returns Book records."""
+        if limit is None:
+            limit = database.CATALOG_PAGE_SIZE
+        limit = max(1, min(limit, database.MAX_CATALOG_PAGE_SIZE))
+        position = database.decode_catalog_cursor(after) if after else None
+        self._sync()
+        with self._lock:
+            start = bisect_right(self._order, position) if position else 0
+            keys = self._order[start:start + limit + 1]
+            books = [self._books[book_id] for _, book_id in keys[:limit]]
+        next_cursor = database.encode_catalog_cursor(books[-1]) if len(keys) > limit else None
+        return books, next_cursor
+
+    def search(self, term: str, search_type: str = 'title') -> List[Book]:
+        """
+        Case-insensitive title/author substring or exact ISBN, ordered by (title, id).
+
+        Terms of three or more characters are answered from the trigram index
+        and verified; shorter terms scan the snapshot.
+        """
+        term = (term or '').strip()
+        if not term:
+            return []
+        self._sync()
+        with self._lock:
+            if search_type == 'isbn':
+                book = self._by_isbn.get(term)
+                return [book] if book else []
+            field = 'author' if search_type == 'author' else 'title'
+            needle = term.lower()
+            if len(needle) < 3:
+                books = (self._books[book_id] for _, book_id in self._order)
+                return [book for book in books if needle in getattr(book, field).lower()]
+            if not self._indexed:
+                self._build_indexes()
+            candidates = self._indexes[field].candidates(needle)
+            if len(candidates) > len(self._order) // 8:
+                # Broad terms: walking the ordering is cheaper than sorting
+                books = [self._books[book_id] for _, book_id in self._order if book_id in candidates]
+                presorted = True
+            else:
+                books = [self._books[book_id] for book_id in candidates]
+                presorted = False
+        if len(needle) > 3:
+            books = [book for book in books if needle in getattr(book, field).lower()]
+        if not presorted:
+            books.sort(key=lambda book: (book.title, book.id))
+        return books
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'books': len(self._books),
+                'distinct_authors': len(self._authors),
+                'title_trigrams': len(self._indexes['title']),
+                'author_trigrams': len(self._indexes['author']),
+                'loads': self.loads,
+                'refreshed_rows': self.refreshed_rows,
+                'version': self._version,
+            }
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """The shared snapshot, or None when it is disabled."""
+    return catalog_snapshot if catalog_snapshot.enabled else None
+
+
+def set_catalog_snapshot_enabled(enabled: bool):
+    """Turn the snapshot on or off (e.g. in tests); drops loaded rows and counters."""
+    catalog_snapshot.clear()
+    catalog_snapshot.loads = catalog_snapshot.refreshed_rows = 0
+    catalog_snapshot.enabled = enabled
+
+
+def get_catalog_page(limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[List, Optional[str]]:
+    """One catalog page from the snapshot, or from the database when it is disabled."""
+    snapshot = get_catalog_snapshot()
+    if snapshot is None:
+        return database.get_books_page(limit=limit, after=after)
+    return snapshot.page(limit=limit, after=after)
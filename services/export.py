@@ -0,0 +1,103 @@
+"""
+Streaming catalog and loan export as NDJSON or CSV, optionally gzipped.
+
+Rows are read from the database in keyset batches and encoded one batch at
+a time, so memory stays flat however large the tables are. The same
+generators back the /api/export endpoints and the command line.
+
+Usage:
+    python -m services.export books [--format ndjson|csv] [--gzip] [--output PATH] [--database PATH]
+    python -m services.export loans --patron-id 123456 --format csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from typing import Iterable, Iterator, Optional
+
+import database
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORTS = ('books', 'loans')
+
+
+def _encode_ndjson(rows, fields) -> str:
+    return ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _encode_csv(rows, fields) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(tuple(row) for row in rows)
+    return buffer.getvalue()
+
+
+def iter_export(kind: str, fmt: str = 'ndjson', batch_size: int = database.EXPORT_BATCH_SIZE,
+                patron_id: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Stream the `kind` export ('books' or 'loans') as UTF-8 chunks, one per
+    database batch; bad arguments raise ValueError before anything is read. CSV output starts with a header row; `patron_id`
+    narrows the loan export to one patron.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if kind == 'books':
+        batches, fields = database.iter_books(batch_size), database.BOOK_EXPORT_FIELDS
+    else:
+        batches, fields = database.iter_borrow_records(batch_size, patron_id), database.LOAN_EXPORT_FIELDS
+    return _iter_chunks(batches, fields, fmt)
+
+
+def _iter_chunks(batches, fields, fmt: str) -> Iterator[bytes]:
+    encode = _encode_csv if fmt == 'csv' else _encode_ndjson
+    if fmt == 'csv':
+        yield _encode_csv([fields], fields).encode('utf-8')
+    for rows in batches:
+        yield encode(rows, fields).encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stream the catalog or loan history as NDJSON or CSV.")
+    parser.add_argument('kind', choices=EXPORTS)
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('--output', help="file to write (default: stdout)")
+    parser.add_argument('--patron-id', help="loans export: only this patron's loans")
+    parser.add_argument('--batch-size', type=int, default=database.EXPORT_BATCH_SIZE)
+    parser.add_argument('--database', help="SQLite file to export from (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.configure_storage(path=args.database, read_only=True)
+
+    chunks = iter_export(args.kind, args.format, args.batch_size, args.patron_id)
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
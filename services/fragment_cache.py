@@ -0,0 +1,61 @@
+"""
+Rendered catalog rows, reused across page renders.
+
+A catalog row depends only on its book's fields, so its HTML is cached under
+a key made of them - (id, available_copies, ...). When a book's availability
+changes its row gets a new key and is rendered again; every other row on the
+page is served from the cache, and outdated keys age out of the LRU. This
+complements the whole-page cache in services.http_cache, which any catalog
+write invalidates.
+"""
+
+import os
+from typing import Callable
+
+from flask import current_app
+from markupsafe import Markup
+
+from services.lru import LRUCache, lru_metrics
+from services.metrics import register_collector
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get('LIBRARY_FRAGMENT_CACHE_SIZE', '4096'))
+CATALOG_ROW_TEMPLATE = '_catalog_row.html'
+
+
+class FragmentCache(LRUCache):
+    """LRU of rendered HTML fragments."""
+
+    def __init__(self, size: int = FRAGMENT_CACHE_SIZE):
+        super().__init__(size)
+
+    def get_or_render(self, key, render: Callable[[], str]) -> Markup:
+        html = self.get(key)
+        if html is None:
+            html = Markup(render())
+            self.put(key, html)
+        return html
+
+
+fragment_cache = FragmentCache()
+
+
+def render_catalog_row(book) -> Markup:
+    """The <tr> for one catalog book (a Book or a book dict)."""
+    key = (book['id'], book['available_copies'], book['total_copies'],
+           book['title'], book['author'], book['isbn'])
+    return fragment_cache.get_or_render(
+        key, lambda: current_app.jinja_env.get_template(CATALOG_ROW_TEMPLATE).render(book=book))
+
+
+def init_fragment_cache(app):
+    """Size the row cache from FRAGMENT_CACHE_SIZE (0 = off) and expose render_catalog_row to templates."""
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', FRAGMENT_CACHE_SIZE)
+    fragment_cache.configure(app.config['FRAGMENT_CACHE_SIZE'])
+    app.add_template_global(render_catalog_row)
+
+
+def _fragment_cache_metrics():
+    return lru_metrics('library_fragment_cache', 'Catalog row fragment', fragment_cache)
+
+
+register_collector(_fragment_cache_metrics)
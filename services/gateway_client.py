@@ -0,0 +1,229 @@
+"""
+Resilient payment gateway client - circuit breaker and per-call deadline.
+
+ResilientGateway wraps a PaymentGateway and exposes the same
+process_payment / refund_payment interface, so it can be passed anywhere a
+gateway is expected. pay_late_fees and refund_late_fee_payment use the
+shared client from get_gateway_client() unless given a gateway. Calls run on
+a small worker pool and give up at the deadline, so a slow gateway cannot
+hold a request worker. After repeated failures the circuit opens and calls
+fail fast until a trial call succeeds.
+
+/metrics reports every live client, summed by name.
+"""
+
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional
+
+from services.metrics import LATENCY_BUCKETS, Histogram, histogram_samples, register_collector
+from services.payment_service import PaymentGateway
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_DEADLINE = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+ERROR_RATE_WINDOW = 100
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the gateway while the circuit is open."""
+
+
+class GatewayTimeoutError(RuntimeError):
+    """Raised when a gateway call misses its deadline."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout` seconds; half-open lets one trial call
+    through and closes on success or re-opens on failure.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the gateway now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened_count += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class ResilientGateway:
+    """PaymentGateway wrapper with a circuit breaker, deadline and call metrics."""
+
+    def __init__(self, gateway=None, breaker: Optional[CircuitBreaker] = None,
+                 deadline: float = DEFAULT_DEADLINE, max_workers: int = 8, name: str = 'payment'):
+        self.gateway = gateway if gateway is not None else PaymentGateway()
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-gateway')
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=ERROR_RATE_WINDOW)  # True = failure
+        self.calls = {'success': 0, 'failure': 0, 'timeout': 0, 'rejected': 0}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.latency_max = 0.0
+        # Dropped clients release their threads; /metrics only sees live ones
+        self._finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
+        _clients.add(self)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool and drop the client from /metrics."""
+        _clients.discard(self)
+        self._finalizer.detach()
+        self._executor.shutdown(wait=wait)
+
+    def process_payment(self, amount: float, idempotency_key: Optional[str] = None) -> dict:
+        if idempotency_key is None:
+            return self._call('process_payment', amount)
+        return self._call('process_payment', amount, idempotency_key)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> dict:
+        return self._call('refund_payment', transaction_id, amount)
+
+    def _call(self, method: str, *args):
+        if not self.breaker.allow():
+            with self._lock:
+                self.calls['rejected'] += 1
+            raise CircuitOpenError(f'{self.name} gateway unavailable (circuit open)')
+
+        start = time.perf_counter()
+        future = self._executor.submit(getattr(self.gateway, method), *args)
+        try:
+            result = future.result(timeout=self.deadline)
+        except FutureTimeout:
+            future.cancel()
+            self._record('timeout', start)
+            raise GatewayTimeoutError(f'{self.name} gateway did not answer within {self.deadline}s')
+        except Exception:
+            self._record('failure', start)
+            raise
+        # A decline is a healthy gateway answering "no"
+        self._record('success', start)
+        return result
+
+    def _record(self, outcome: str, start: float):
+        elapsed = time.perf_counter() - start
+        if outcome == 'success':
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        with self._lock:
+            self.calls[outcome] += 1
+            self.latency.observe(elapsed)
+            self.latency_max = max(self.latency_max, elapsed)
+            self._outcomes.append(outcome != 'success')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            completed = self.latency.count
+            return {
+                'name': self.name,
+                'state': self.breaker.state,
+                'opened_count': self.breaker.opened_count,
+                'calls': dict(self.calls),
+                'error_rate': round(sum(self._outcomes) / len(self._outcomes), 4) if self._outcomes else 0.0,
+                'latency_avg_ms': round(self.latency.total / completed * 1000, 3) if completed else 0.0,
+                'latency_max_ms': round(self.latency_max * 1000, 3),
+            }
+
+
+_clients = weakref.WeakSet()
+_shared: Dict[str, ResilientGateway] = {}
+_shared_lock = threading.Lock()
+
+
+def get_gateway_client(name: str = 'payment') -> ResilientGateway:
+    """The process-wide client for `name`, wrapping a default PaymentGateway."""
+    with _shared_lock:
+        client = _shared.get(name)
+        if client is None:
+            client = _shared[name] = ResilientGateway(PaymentGateway(), name=name)
+        return client
+
+
+def _by_name():
+    """Per gateway name: summed calls, merged latency histogram, outcome window and breaker states."""
+    merged = {}
+    for client in list(_clients):
+        with client._lock:
+            entry = merged.setdefault(client.name, {
+                'calls': dict.fromkeys(client.calls, 0), 'latency': Histogram(LATENCY_BUCKETS),
+                'outcomes': [], 'states': dict.fromkeys((CLOSED, OPEN, HALF_OPEN), 0),
+            })
+            for outcome, count in client.calls.items():
+                entry['calls'][outcome] += count
+            latency = entry['latency']
+            latency.counts = [a + b for a, b in zip(latency.counts, client.latency.counts)]
+            latency.total += client.latency.total
+            latency.count += client.latency.count
+            entry['outcomes'] += client._outcomes
+        entry['states'][client.breaker.state] += 1
+    return sorted(merged.items())
+
+
+def _gateway_metrics():
+    gateways = _by_name()
+    yield ('library_gateway_calls_total', 'counter', 'Payment gateway calls by outcome.',
+           [({'gateway': name, 'outcome': outcome}, count)
+            for name, g in gateways for outcome, count in g['calls'].items()])
+    yield ('library_gateway_error_rate', 'gauge', f'Failure ratio over each client\'s last {ERROR_RATE_WINDOW} calls.',
+           [({'gateway': name}, round(sum(g['outcomes']) / len(g['outcomes']), 4) if g['outcomes'] else 0.0)
+            for name, g in gateways])
+    yield ('library_gateway_call_duration_seconds', 'histogram', 'Gateway call latency (answered or timed out).',
+           [sample for name, g in gateways for sample in histogram_samples(g['latency'], gateway=name)])
+    yield ('library_gateway_circuit_state', 'gauge', 'Clients in each circuit state.',
+           [({'gateway': name, 'state': state}, count)
+            for name, g in gateways for state, count in g['states'].items()])
+
+
+register_collector(_gateway_metrics)
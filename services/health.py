@@ -0,0 +1,42 @@
+"""
+Liveness/readiness state for the web process.
+
+A worker is ready when the database answers and its schema is at the latest
+migration. start_draining() (called on SIGTERM by serve.py) makes readiness
+fail immediately, so a load balancer stops routing new requests while the
+in-flight ones finish.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import database
+
+_draining = threading.Event()
+
+
+def start_draining():
+    _draining.set()
+
+
+def is_draining() -> bool:
+    return _draining.is_set()
+
+
+def check_readiness() -> Tuple[bool, Dict]:
+    """Return (ready, details) for the readiness endpoint."""
+    if is_draining():
+        return False, {'status': 'draining'}
+    latest = database.MIGRATIONS[-1][0]
+    try:
+        conn = database.get_db_connection()
+        try:
+            conn.execute('SELECT 1').fetchone()
+            version = database.get_schema_version(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        return False, {'status': 'database unavailable', 'error': str(e)}
+    if version < latest:
+        return False, {'status': 'schema out of date', 'schema_version': version, 'expected': latest}
+    return True, {'status': 'ready', 'schema_version': version}
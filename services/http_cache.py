@@ -0,0 +1,100 @@
+"""
+Conditional GET and rendered-response caching for catalog-derived pages.
+
+Catalog and search responses depend only on the books table, so they are
+tagged with the catalog version (database.get_catalog_version): the ETag is
+the database identity plus the version, Last-Modified is the time of the
+latest book write. A matching If-None-Match / If-Modified-Since gets a 304
+without running the view (after the view's argument check, if any), and
+full responses can be served from an LRU keyed by version + URL, so a write
+to the catalog invalidates every cached page at once.
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, session
+
+import database
+from services.lru import LRUCache, lru_metrics
+from services.metrics import register_collector
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('LIBRARY_RESPONSE_CACHE_SIZE', '256'))
+
+
+# Rendered response bodies: key -> (body, mimetype)
+response_cache = LRUCache(RESPONSE_CACHE_SIZE)
+
+
+def init_http_cache(app):
+    """Size the rendered-response cache from RESPONSE_CACHE_SIZE (0 = off)."""
+    app.config.setdefault('RESPONSE_CACHE_SIZE', RESPONSE_CACHE_SIZE)
+    response_cache.configure(app.config['RESPONSE_CACHE_SIZE'])
+
+
+def _not_modified(etag: str, last_modified: datetime) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and since >= last_modified
+
+
+def _database_tag() -> str:
+    # Version numbers restart per database; keep their ETags apart
+    return hashlib.sha1(database.DATABASE.encode()).hexdigest()[:8]
+
+
+def catalog_cached(view=None, *, renders_flashes: bool = False, validate=None):
+    """
+    Make a GET view conditional on the catalog version.
+
+    Use @catalog_cached(renders_flashes=True) on HTML views whose template
+    shows flashed messages; requests with pending flashes then bypass the
+    cache. `validate()` checks the request arguments before any 304 is
+    answered and returns an error response (or None if they are fine). Only
+    200 responses are stored or tagged.
+    """
+    if view is None:
+        return lambda view: catalog_cached(view, renders_flashes=renders_flashes, validate=validate)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or (renders_flashes and session.get('_flashes')):
+            return view(*args, **kwargs)
+        if validate is not None:
+            error = validate()
+            if error is not None:
+                return error
+
+        version, changed_at = database.get_catalog_version()
+        etag = f'catalog-{_database_tag()}-{version}'
+        last_modified = datetime.fromtimestamp(changed_at, timezone.utc)
+
+        if _not_modified(etag, last_modified):
+            response = current_app.response_class(status=304)
+        else:
+            key = (database.DATABASE, request.endpoint, request.query_string, version)
+            cached = response_cache.get(key) if response_cache.size > 0 else None
+            if cached is not None:
+                body, mimetype = cached
+                response = current_app.response_class(body, mimetype=mimetype)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response_cache.put(key, (response.get_data(), response.mimetype))
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def _http_cache_metrics():
+    return lru_metrics('library_response_cache', 'Rendered-response', response_cache)
+
+
+register_collector(_http_cache_metrics)
@@ -3,24 +3,39 @@ Services-layer Library Service - copy of business logic adapted for services pac
 Includes payment-related functions to be tested with mocks/stubs.
 """
 
+import random
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     get_patron_borrowed_books,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books
+    update_borrow_record_return_date, get_all_books, search_books,
+    unit_of_work, get_overdue_loan_fees, get_patron_activity,
+    get_settled_loan_ids, record_fee_settlement
 )
+from services.catalog_snapshot import get_catalog_snapshot
+from services.gateway_client import get_gateway_client
+
+# Fee policy: $0.50 per day overdue
+LATE_FEE_PER_DAY = 0.5
+
+# Borrowing history rows per page in the patron status report
+REPORT_HISTORY_PAGE_SIZE = 20
+MAX_REPORT_HISTORY_PAGE_SIZE = 200
 
 
 def _as_date(d):
     if d is None:
         return None
-    # Accept date or datetime objects directly
-    if isinstance(d, date):
-        return d
+    # Accept date or datetime objects directly (datetime is a date subclass)
     if isinstance(d, datetime):
         return d.date()
+    if isinstance(d, date):
+        return d
     if isinstance(d, str):
         try:
             return datetime.fromisoformat(d).date()
@@ -29,19 +44,27 @@ def _as_date(d):
     return None
 
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """Return the R1 validation error for a new book, or None if it is valid."""
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    return None
+
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
 
     existing = get_book_by_isbn(isbn)
     if existing:
@@ -58,24 +81,29 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    book = get_book_by_id(book_id)
+    try:
+        with unit_of_work() as uow:
+            return _borrow_in(uow, patron_id, book_id, datetime.now())
+    except sqlite3.Error:
+        return False, "Database error occurred while creating borrow record."
+
+
+def _borrow_in(uow, patron_id: str, book_id: int, borrow_date: datetime) -> Tuple[bool, str]:
+    # On failure nothing has been written, so the caller need not roll back
+    due_date = borrow_date + timedelta(days=14)
+    book = uow.get_book(book_id)
     if not book:
         return False, "Book not found."
     if book['available_copies'] <= 0:
         return False, "This book is currently not available."
 
-    current_borrowed = get_patron_borrow_count(patron_id)
+    current_borrowed = uow.count_active_loans(patron_id)
     if current_borrowed >= 5:
         return False, "You have reached the maximum borrowing limit of 5 books."
 
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-
-    if not insert_borrow_record(patron_id, book_id, borrow_date, due_date):
-        return False, "Database error occurred while creating borrow record."
-    if not update_book_availability(book_id, -1):
-        return False, "Database error occurred while updating book availability."
-
+    if not uow.reserve_copy(book_id):
+        return False, "This book is currently not available."
+    uow.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}. '
 
 
@@ -83,14 +111,22 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    now = datetime.now()
-    updated = update_borrow_record_return_date(patron_id, book_id, now)
-    if not updated:
-        return False, "No active borrow record found for this patron/book."
-
-    if not update_book_availability(book_id, +1):
+    try:
+        with unit_of_work() as uow:
+            ok, message = _return_in(uow, patron_id, book_id, datetime.now())
+            if not ok:
+                uow.rollback()
+            return ok, message
+    except sqlite3.Error:
         return False, "Database error updating availability."
 
+
+def _return_in(uow, patron_id: str, book_id: int, return_date: datetime) -> Tuple[bool, str]:
+    # On failure the loan may already be closed; the caller must roll back
+    if not uow.close_borrow_record(patron_id, book_id, return_date):
+        return False, "No active borrow record found for this patron/book."
+    if not uow.release_copy(book_id):
+        return False, "Database error updating availability."
     return True, "Book returned successfully."
 
 
@@ -117,59 +153,141 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     return {"fee_amount": fee_amount, "days_overdue": days_overdue, "status": "OVERDUE"}
 
 
+def calculate_outstanding_late_fees(patron_id: Optional[str] = None, as_of: Optional[date] = None) -> Dict:
+    """Compute late fees for every overdue open loan (optionally for one patron) in one query."""
+    if patron_id is not None and (not patron_id.isdigit() or len(patron_id) != 6):
+        return {'status': 'Invalid patron ID', 'loans': [], 'loan_count': 0, 'patron_count': 0, 'total_fees': 0.0}
+
+    as_of = as_of or datetime.now().date()
+    loans = get_overdue_loan_fees(as_of, LATE_FEE_PER_DAY, patron_id)
+    return {
+        'status': 'OK',
+        'as_of': as_of.isoformat(),
+        'loans': loans,
+        'loan_count': len(loans),
+        'patron_count': len({loan['patron_id'] for loan in loans}),
+        'total_fees': round(sum(loan['fee_amount'] for loan in loans), 2),
+    }
+
+
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
-    term = (search_term or "").strip().lower()
+    term = (search_term or "").strip()
     if not term:
         return []
-    books = get_all_books() or []
     if search_type not in {"title", "author", "isbn"}:
         search_type = "title"
-    out = []
-    for b in books:
-        val = str(b.get(search_type, "")).lower()
-        if term in val:
-            out.append(b)
-    return out
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return [book.as_dict() for book in snapshot.search(term, search_type)]
+    return search_books(term, search_type)
 
 
-def get_patron_status_report(patron_id: str) -> Dict:
+def get_patron_status_report(patron_id: str, history_page: int = 1,
+                             history_page_size: int = REPORT_HISTORY_PAGE_SIZE) -> Dict:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return {}
 
-    borrowed = get_patron_borrowed_books(patron_id)
-    currently_borrowed = []
-    overdue_count = 0
-    for r in borrowed:
-        is_overdue = bool(r.get('is_overdue'))
-        if is_overdue:
-            overdue_count += 1
-        currently_borrowed.append({
-            'book_id': r.get('book_id'),
-            'title': r.get('title'),
-            'author': r.get('author'),
-            'borrow_date': r.get('borrow_date').isoformat() if r.get('borrow_date') else None,
-            'due_date': r.get('due_date').isoformat() if r.get('due_date') else None,
-            'is_overdue': is_overdue
-        })
+    history_page = max(int(history_page), 1)
+    history_page_size = min(max(int(history_page_size), 1), MAX_REPORT_HISTORY_PAGE_SIZE)
+    activity = get_patron_activity(patron_id, datetime.now(), LATE_FEE_PER_DAY,
+                                   history_page_size, (history_page - 1) * history_page_size)
 
+    currently_borrowed = activity['active']
     total_active = len(currently_borrowed)
     status = 'OK' if total_active > 0 else 'No active borrows'
     return {
         'patron_id': patron_id,
         'currently_borrowed': currently_borrowed,
         'total_active': total_active,
-        'overdue_count': overdue_count,
+        'overdue_count': sum(1 for r in currently_borrowed if r['is_overdue']),
+        'total_late_fees': round(sum(r['fee_amount'] for r in currently_borrowed), 2),
+        'history': activity['history'],
+        'history_page': history_page,
+        'history_page_size': history_page_size,
+        'history_has_more': activity['history_has_more'],
         'status': status
     }
 
 
+# Batch circulation (desk scanning)
+CIRCULATION_OPERATIONS = {'borrow': _borrow_in, 'return': _return_in}
+MAX_CIRCULATION_BATCH = 100
+
+
+def _validate_circulation_item(item) -> Tuple[Optional[Dict], Optional[str]]:
+    if not isinstance(item, dict):
+        return None, "Each operation must be an object."
+    op = item.get('op')
+    if op not in CIRCULATION_OPERATIONS:
+        return None, "Operation must be 'borrow' or 'return'."
+    patron_id = str(item.get('patron_id') or '').strip()
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return None, "Invalid patron ID. Must be exactly 6 digits."
+    book_id = item.get('book_id')
+    if isinstance(book_id, str) and book_id.strip().isdigit():
+        book_id = int(book_id)
+    if not isinstance(book_id, int) or isinstance(book_id, bool):
+        return None, "Invalid book ID."
+    return {'op': op, 'patron_id': patron_id, 'book_id': book_id}, None
+
+
+def process_circulation_batch(operations) -> Dict:
+    """Apply scanned borrow/return operations in order, in one transaction.
+
+    Every item is validated up front; malformed items fail without touching
+    the database. The rest run inside a single unit of work, each behind its
+    own savepoint, so a failed item is undone on its own and the successful
+    ones commit together. Returns one result per item, in input order.
+    """
+    if not isinstance(operations, list) or not operations:
+        return {'status': 'Operations must be a non-empty list', 'results': [], 'succeeded': 0, 'failed': 0}
+    if len(operations) > MAX_CIRCULATION_BATCH:
+        return {'status': f'At most {MAX_CIRCULATION_BATCH} operations per batch',
+                'results': [], 'succeeded': 0, 'failed': 0}
+
+    results = []
+    for index, item in enumerate(operations):
+        parsed, error = _validate_circulation_item(item)
+        result = {'index': index, 'success': False, 'message': error}
+        if parsed:
+            result.update(parsed)
+        elif isinstance(item, dict):
+            result.update(op=item.get('op'), patron_id=item.get('patron_id'), book_id=item.get('book_id'))
+        results.append(result)
+
+    now = datetime.now()
+    try:
+        with unit_of_work() as uow:
+            for result in results:
+                if result['message'] is not None:
+                    continue
+                uow.savepoint('circulation_item')
+                try:
+                    ok, message = CIRCULATION_OPERATIONS[result['op']](uow, result['patron_id'], result['book_id'], now)
+                except sqlite3.Error:
+                    ok, message = False, "Database error processing this item."
+                if ok:
+                    uow.release_savepoint('circulation_item')
+                else:
+                    uow.rollback_to_savepoint('circulation_item')
+                result.update(success=ok, message=message)
+    except sqlite3.Error:
+        for result in results:
+            if result['success'] or result['message'] is None:
+                result.update(success=False, message="Database error; batch was not applied.")
+
+    succeeded = sum(1 for result in results if result['success'])
+    return {'status': 'OK', 'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded}
+
+
 # --------------------------
 # Payment-related functions
 # --------------------------
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Dict:
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway=None) -> Dict:
     """Process payment for late fees for a single book.
 
-    payment_gateway must implement process_payment(amount) -> dict with keys: success (bool), transaction_id (str)
+    payment_gateway must implement process_payment(amount) -> dict with keys: success (bool), transaction_id (str);
+    by default the shared circuit-breaking client (services.gateway_client) is used.
     """
     # Validate patron / fee
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
@@ -179,6 +297,8 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Dict:
     if amount <= 0:
         return {'success': False, 'message': 'No fees due'}
 
+    if payment_gateway is None:
+        payment_gateway = get_gateway_client()
     try:
         res = payment_gateway.process_payment(amount)
     except Exception as e:
@@ -191,8 +311,8 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Dict:
     return {'success': True, 'transaction_id': res.get('transaction_id')}
 
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway) -> Dict:
-    """Request refund via payment gateway.
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway=None) -> Dict:
+    """Request refund via payment gateway (default: the shared circuit-breaking client).
 
     Validations: transaction_id non-empty, amount > 0 and <= 15
     """
@@ -205,6 +325,8 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway)
     if amount <= 0 or amount > 15:
         return {'success': False, 'message': 'Invalid refund amount'}
 
+    if payment_gateway is None:
+        payment_gateway = get_gateway_client()
     try:
         res = payment_gateway.refund_payment(transaction_id, amount)
     except Exception as e:
@@ -214,3 +336,131 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway)
         return {'success': False, 'message': 'Refund rejected'}
 
     return {'success': True, 'refund_id': res.get('refund_id')}
+
+
+# Batch settlement defaults
+SETTLEMENT_MAX_WORKERS = 4
+SETTLEMENT_CALL_TIMEOUT = 5.0
+SETTLEMENT_RETRIES = 2
+SETTLEMENT_BACKOFF = 0.2
+
+
+def _started_call(started: List[float], func, *args):
+    # Records when a pool thread actually begins the call
+    started.append(time.monotonic())
+    return func(*args)
+
+
+def settle_patron_late_fees(patron_id: str, payment_gateway=None,
+                            max_workers: int = SETTLEMENT_MAX_WORKERS,
+                            call_timeout: float = SETTLEMENT_CALL_TIMEOUT,
+                            retries: int = SETTLEMENT_RETRIES,
+                            backoff: float = SETTLEMENT_BACKOFF) -> Dict:
+    """Pay every outstanding late fee for a patron with concurrent gateway calls.
+
+    One process_payment call is made per overdue loan, at most max_workers at
+    a time. Calls that raise (e.g. network errors) are retried up to `retries`
+    times with jittered exponential backoff. A call still running call_timeout
+    after it started is reported as 'timeout' and NOT retried, because the
+    gateway may still have charged it. A call still queued call_timeout after
+    it was submitted (behind a hung one) is cancelled and reported as
+    'not_attempted'; nothing was charged for it.
+
+    Every call for a loan carries the idempotency key late-fee-<loan_id>, so
+    a retry or a later run cannot charge a loan twice even if an earlier
+    call succeeded but timed out. Paid loans are recorded in fee_settlements
+    and skipped by later runs. The gateway defaults to the shared
+    circuit-breaking client (services.gateway_client).
+
+    Returns an aggregate with per-loan results; success is True only if every
+    fee was paid.
+    """
+    max_workers = max(1, max_workers)
+    fees = calculate_outstanding_late_fees(patron_id)
+    if fees['status'] == 'Invalid patron ID':
+        return {'success': False, 'message': 'Invalid patron ID'}
+    loans = [loan for loan in fees['loans'] if loan['fee_amount'] > 0]
+    settled = get_settled_loan_ids([loan['loan_id'] for loan in loans])
+    loans = [loan for loan in loans if loan['loan_id'] not in settled]
+    if not loans:
+        return {'success': False, 'message': 'No fees due'}
+    if payment_gateway is None:
+        payment_gateway = get_gateway_client()
+
+    results = {loan['loan_id']: {
+        'loan_id': loan['loan_id'], 'book_id': loan['book_id'],
+        'amount': loan['fee_amount'], 'status': 'pending', 'attempts': 0,
+    } for loan in loans}
+    ready = [(0.0, loan['loan_id']) for loan in loans]  # (not_before, loan_id)
+    in_flight = {}  # future -> (loan_id, submitted_at, [started_at])
+
+    def deadline(submitted_at, started):
+        # Queued calls get call_timeout to start; started ones call_timeout to finish
+        return (started[0] if started else submitted_at) + call_timeout
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='settle')
+    try:
+        while ready or in_flight:
+            now = time.monotonic()
+            for not_before, loan_id in list(ready):
+                if not_before <= now and len(in_flight) < max_workers:
+                    ready.remove((not_before, loan_id))
+                    result = results[loan_id]
+                    result['attempts'] += 1
+                    started = []
+                    future = executor.submit(_started_call, started, payment_gateway.process_payment,
+                                             result['amount'], f'late-fee-{loan_id}')
+                    in_flight[future] = (loan_id, now, started)
+
+            waits = [deadline(submitted_at, started) - now for _, submitted_at, started in in_flight.values()]
+            if len(in_flight) < max_workers:
+                waits += [not_before - now for not_before, _ in ready]
+            done, _ = wait(list(in_flight), timeout=max(0.0, min(waits)) if waits else None,
+                           return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in list(in_flight):
+                loan_id, submitted_at, started = in_flight[future]
+                result = results[loan_id]
+                if future in done:
+                    del in_flight[future]
+                    try:
+                        res = future.result()
+                    except Exception as e:
+                        if result['attempts'] <= retries:
+                            delay = backoff * (2 ** (result['attempts'] - 1))
+                            ready.append((now + random.uniform(0.5 * delay, 1.5 * delay), loan_id))
+                        else:
+                            result.update(status='error', message=f'Payment gateway error: {e}')
+                        continue
+                    if res and res.get('success'):
+                        result.update(status='paid', transaction_id=res.get('transaction_id'))
+                        record_fee_settlement(loan_id, patron_id, result['amount'], result['transaction_id'])
+                    else:
+                        result.update(status='declined', message='Payment declined')
+                elif now >= deadline(submitted_at, started):
+                    if future.cancel():
+                        del in_flight[future]
+                        result['attempts'] -= 1
+                        result.update(status='not_attempted', message='Payment gateway busy; not attempted')
+                    elif not started:
+                        # Began between the wait and the cancel; its clock starts now
+                        started.append(now)
+                    elif now >= deadline(submitted_at, started):
+                        del in_flight[future]
+                        result.update(status='timeout', message='Payment gateway timed out; outcome unknown')
+    finally:
+        # Abandoned (timed-out) calls finish in the background; queued ones were cancelled
+        executor.shutdown(wait=False)
+
+    items = [results[loan['loan_id']] for loan in loans]
+    paid = [r for r in items if r['status'] == 'paid']
+    return {
+        'success': len(paid) == len(items),
+        'patron_id': patron_id,
+        'total_due': round(sum(r['amount'] for r in items), 2),
+        'total_paid': round(sum(r['amount'] for r in paid), 2),
+        'paid_count': len(paid),
+        'failed_count': len(items) - len(paid),
+        'results': items,
+    }
@@ -0,0 +1,67 @@
+"""
+Bounded, thread-safe LRU with hit/miss counters, shared by the in-process
+caches (rendered responses, catalog row fragments) and their /metrics
+families.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+
+class LRUCache:
+    """Bounded LRU; size 0 disables it (nothing is stored)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """The cached value (most recently used from now on), or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def configure(self, size: int):
+        """Resize and empty the cache (size 0 disables it)."""
+        with self._lock:
+            self.size = size
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def lru_metrics(prefix: str, what: str, cache: LRUCache):
+    """Collector families for `cache`: <prefix>_hits_total, _misses_total, _hit_ratio and _entries."""
+    stats = cache.stats()
+    yield (f'{prefix}_hits_total', 'counter', f'{what} cache hits.', [({}, stats['hits'])])
+    yield (f'{prefix}_misses_total', 'counter', f'{what} cache misses.', [({}, stats['misses'])])
+    yield (f'{prefix}_hit_ratio', 'gauge', f'{what} cache hit rate.', [({}, stats['hit_rate'])])
+    yield (f'{prefix}_entries', 'gauge', f'{what} entries held.', [({}, stats['size'])])
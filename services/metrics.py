@@ -0,0 +1,197 @@
+"""
+Request metrics - per-endpoint latency histograms, status counts, in-flight
+requests and DB queries per request, rendered in Prometheus text format.
+
+init_metrics(app) installs the request hooks; the /metrics route renders
+the registry. Other subsystems can add gauges with register_collector().
+
+The registry lives in process memory. Under serve.py each gunicorn worker
+keeps its own, so a scrape of /metrics reports only the worker that
+answered it, and counters restart when a worker is replaced. Scrape with
+--workers 1 for complete numbers; with more workers, treat the series as
+per-worker samples.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from flask import g, request
+
+import database
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# A collector returns (name, type, help, [(labels, value), ...]) tuples; a
+# sample may also be (suffix, labels, value), e.g. for histogram _bucket rows
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (not thread-safe; guarded by the registry lock)."""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-process store for request metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collectors: List[Collector] = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests: Dict[Tuple[str, str, int], int] = {}
+            self.latency: Dict[str, Histogram] = {}
+            self.queries: Dict[str, Histogram] = {}
+            self.in_flight = 0
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, endpoint: str, method: str, status: int, seconds: float, queries: int):
+        with self._lock:
+            self.in_flight -= 1
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.queries[endpoint] = Histogram(QUERY_BUCKETS)
+            self.latency[endpoint].observe(seconds)
+            self.queries[endpoint].observe(queries)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            lines += [
+                '# HELP library_http_requests_total HTTP requests by endpoint, method and status.',
+                '# TYPE library_http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'library_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+            lines += [
+                '# HELP library_http_requests_in_flight Requests currently being served.',
+                '# TYPE library_http_requests_in_flight gauge',
+                f'library_http_requests_in_flight {self.in_flight}',
+            ]
+            _render_histograms(lines, 'library_http_request_duration_seconds',
+                               'Request latency by endpoint.', self.latency)
+            _render_histograms(lines, 'library_db_queries_per_request',
+                               'SQL statements executed per request by endpoint.', self.queries)
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for sample in samples:
+                    suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+                    lines.append(f'{name}{suffix}{_labels(**labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _render_histograms(lines: List[str], name: str, help_text: str, histograms: Dict[str, Histogram]):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for endpoint, hist in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=_number(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le="+Inf")} {hist.count}')
+        lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {_number(round(hist.total, 6))}')
+        lines.append(f'{name}_count{_labels(endpoint=endpoint)} {hist.count}')
+
+
+def histogram_samples(hist: Histogram, **labels) -> List[Tuple[str, Dict[str, str], float]]:
+    """A histogram as collector samples: cumulative _bucket rows, _sum and _count."""
+    samples, cumulative = [], 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        cumulative += count
+        samples.append(('_bucket', dict(labels, le=_number(bound)), cumulative))
+    samples.append(('_bucket', dict(labels, le='+Inf'), hist.count))
+    samples.append(('_sum', labels, round(hist.total, 6)))
+    samples.append(('_count', labels, hist.count))
+    return samples
+
+
+registry = MetricsRegistry()
+
+
+def register_collector(collector: Collector):
+    """Add a callable that contributes extra metric families to /metrics."""
+    registry.register_collector(collector)
+
+
+def _database_metrics():
+    pool = database.get_pool_stats()
+    yield ('library_db_pool_connections', 'gauge', 'Pooled SQLite connections by state.',
+           [({'state': 'open'}, pool['open']), ({'state': 'idle'}, pool['idle']),
+            ({'state': 'in_use'}, pool['in_use'])])
+    yield ('library_db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection.',
+           [({}, pool['waits'])])
+    yield ('library_db_pool_wait_seconds_total', 'counter', 'Total time spent waiting for a connection.',
+           [({}, pool['wait_time_total_ms'] / 1000)])
+
+
+register_collector(_database_metrics)
+
+
+def init_metrics(app):
+    """Install request hooks that feed the registry (no-op if METRICS_ENABLED is false)."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_status = None
+        database.reset_query_count()
+        registry.request_started()
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        status = g.pop('_metrics_status', None) or 500
+        endpoint = request.endpoint or 'unmatched'
+        registry.request_finished(endpoint, request.method, status,
+                                  time.perf_counter() - start, database.get_query_count())
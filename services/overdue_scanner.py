@@ -0,0 +1,117 @@
+"""
+Nightly overdue scan - one notice per patron with overdue loans.
+
+Open loans due before the scan time are streamed from the database in
+batches ordered by patron (database.iter_overdue_loans), grouped, and
+written as overdue_notices rows, refreshing those patrons' overdue_loans
+counters. Each batch's notices are committed together with the scan
+checkpoint (the last patron written), so only the current patron's loans
+are held in memory, and an interrupted scan resumes after the last
+committed patron - with the original cutoff - when run again for the same
+date.
+
+Usage:
+    python -m services.overdue_scanner [--date YYYY-MM-DD] [--restart] [--output notices.ndjson] [--database PATH]
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import database
+from services.library_service import LATE_FEE_PER_DAY
+
+
+def _notice(patron_id: str, loans: List[Dict]) -> Dict:
+    return {
+        'patron_id': patron_id,
+        'loan_count': len(loans),
+        'total_fee': round(sum(loan['fee_amount'] for loan in loans), 2),
+        'loans': [{key: loan[key] for key in ('loan_id', 'book_id', 'title', 'due_date', 'days_overdue', 'fee_amount')}
+                  for loan in loans],
+    }
+
+
+def scan_overdue_loans(as_of: Optional[datetime] = None, restart: bool = False,
+                       batch_size: int = database.OVERDUE_SCAN_BATCH_SIZE,
+                       max_batches: Optional[int] = None) -> Dict:
+    """
+    Write overdue notices for the run date of `as_of` (default: now) and
+    return the scan record.
+
+    A scan already started for that date is resumed (a complete one is just
+    returned); `restart` discards it first. `max_batches` stops early,
+    leaving the scan resumable.
+    """
+    as_of = as_of or datetime.now()
+    run_date = as_of.date().isoformat()
+    if restart:
+        database.delete_overdue_scan(run_date)
+    scan = database.get_overdue_scan(run_date) or database.start_overdue_scan(run_date, as_of)
+    if scan['status'] == 'complete':
+        return scan
+
+    # Resume with the cutoff the scan started with, not the current time
+    cutoff = datetime.fromisoformat(scan['as_of'])
+    start = time.perf_counter()
+    patron_id, loans = None, []
+    batches = 0
+    for batch in database.iter_overdue_loans(cutoff, LATE_FEE_PER_DAY, scan['last_patron_id'], batch_size):
+        notices = []
+        for loan in batch:
+            if loan['patron_id'] != patron_id:
+                if loans:
+                    notices.append(_notice(patron_id, loans))
+                patron_id, loans = loan['patron_id'], []
+            loans.append(loan)
+        # The last patron in the batch may continue in the next one
+        if notices:
+            database.save_overdue_notices(run_date, notices, cutoff)
+        batches += 1
+        if max_batches is not None and batches >= max_batches:
+            return dict(database.get_overdue_scan(run_date), seconds=round(time.perf_counter() - start, 3))
+    if loans:
+        database.save_overdue_notices(run_date, [_notice(patron_id, loans)], cutoff)
+    database.finish_overdue_scan(run_date)
+    return dict(database.get_overdue_scan(run_date), seconds=round(time.perf_counter() - start, 3))
+
+
+def write_notices(run_date: str, stream) -> int:
+    """Write a scan's notices to a text stream as NDJSON; returns the count."""
+    count = 0
+    for notices in database.iter_overdue_notices(run_date):
+        stream.write(''.join(json.dumps(notice) + '\n' for notice in notices))
+        count += len(notices)
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Scan for overdue loans and write one notice per patron.")
+    parser.add_argument('--date', help="run date YYYY-MM-DD (default: now); loans due before its start are overdue")
+    parser.add_argument('--restart', action='store_true', help="discard an earlier scan for the date")
+    parser.add_argument('--batch-size', type=int, default=database.OVERDUE_SCAN_BATCH_SIZE)
+    parser.add_argument('--output', help="also write the notices to this NDJSON file ('-' for stdout)")
+    parser.add_argument('--database', help="SQLite file to scan (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.configure_storage(path=args.database)
+    database.init_database()
+    database.migrate_database()
+
+    as_of = datetime.fromisoformat(args.date) if args.date else None
+    scan = scan_overdue_loans(as_of, restart=args.restart, batch_size=args.batch_size)
+    if args.output == '-':
+        write_notices(scan['run_date'], sys.stdout)
+    elif args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            write_notices(scan['run_date'], f)
+    print(json.dumps(scan, indent=2), file=sys.stderr if args.output == '-' else sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Patron loan counters - check or repair patrons.active_loans/overdue_loans.
+
+The counters are kept by triggers on borrow_records, so every write path
+updates them in the loan's own transaction. This tool recomputes them from
+borrow_records anyway (overdue as of now), for use after restoring data or
+editing the patrons table by hand.
+
+Usage:
+    python -m services.patron_counters [--check] [--database PATH]
+
+--check only reports drift and exits 1 if any counter was wrong.
+"""
+
+import argparse
+import json
+import sys
+
+import database
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute patron loan counters from borrow_records.")
+    parser.add_argument('--check', action='store_true', help="report drift without correcting it")
+    parser.add_argument('--database', help="SQLite file to reconcile (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.configure_storage(path=args.database)
+    database.init_database()
+    database.migrate_database()
+
+    report = database.reconcile_patron_counters(dry_run=args.check)
+    print(json.dumps(report, indent=2))
+    return 1 if args.check and report['drifted'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,8 @@ Simulated Payment Gateway service (treated as external).
 Do not modify this file in tests — tests should mock it.
 """
 import random
+import time
+from typing import Optional
 
 
 class PaymentGateway:
@@ -10,20 +12,42 @@ class PaymentGateway:
 
     Methods return dicts like {'success': True, 'transaction_id': 'tx123'} or
     {'success': False, 'error': 'declined'}.
+
+    `latency` adds an artificial delay (seconds) to every call and
+    `failure_rate` sets the chance of a simulated network error, so
+    throughput can be benchmarked offline.
+
+    A successful charge made with an `idempotency_key` is remembered: a
+    repeated call with the same key returns the original result instead of
+    charging again, as real gateways do.
     """
 
-    def process_payment(self, amount: float) -> dict:
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.02):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._charges = {}
+
+    def process_payment(self, amount: float, idempotency_key: Optional[str] = None) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        if idempotency_key is not None and idempotency_key in self._charges:
+            return self._charges[idempotency_key]
         # Simulate simple rules: decline amounts > 100, network error chance
         if amount <= 0:
             return {'success': False, 'error': 'invalid_amount'}
         if amount > 100:
             return {'success': False, 'error': 'exceeds_limit'}
         # simulate occasional network hiccup
-        if random.random() < 0.02:
+        if random.random() < self.failure_rate:
             raise RuntimeError('network error')
-        return {'success': True, 'transaction_id': f'tx{random.randint(1000,9999)}'}
+        result = {'success': True, 'transaction_id': f'tx{random.randint(1000,9999)}'}
+        if idempotency_key is not None:
+            self._charges[idempotency_key] = result
+        return result
 
     def refund_payment(self, transaction_id: str, amount: float) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
         if not transaction_id:
             return {'success': False, 'error': 'invalid_tx'}
         if amount <= 0:
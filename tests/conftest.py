@@ -0,0 +1,25 @@
+import pytest
+
+import database
+from services import catalog_snapshot
+
+
+@pytest.fixture(autouse=True)
+def temp_db(monkeypatch):
+    """Point the database layer at a fresh, seeded in-memory database for each test."""
+    monkeypatch.setattr(database, "DATABASE", database.memory_database())
+    catalog_snapshot.set_catalog_snapshot_enabled(False)
+    database.init_database()
+    database.migrate_database()
+    database.add_sample_data()
+    yield database.DATABASE
+    database.close_pool()
+
+
+@pytest.fixture
+def client(temp_db):
+    """Flask test client bound to the per-test database."""
+    from app import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app.test_client()
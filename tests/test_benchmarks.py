@@ -0,0 +1,133 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import database
+from benchmarks import datagen, loadgen, run_benchmarks
+
+ANCHOR = datetime(2025, 3, 1, 12, 0)
+
+
+def _dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return (conn.execute("SELECT * FROM books ORDER BY id").fetchall(),
+                conn.execute("SELECT * FROM borrow_records ORDER BY id").fetchall())
+    finally:
+        conn.close()
+
+
+def test_generator_is_deterministic(tmp_path):
+    a, b = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    datagen.generate_library(a, books=200, patrons=30, loans=1000, anchor=ANCHOR)
+    datagen.generate_library(b, books=200, patrons=30, loans=1000, anchor=ANCHOR)
+    assert _dump(a) == _dump(b)
+
+
+def test_generator_keeps_the_current_memory_database(tmp_path):
+    current = database.DATABASE
+    datagen.generate_library(str(tmp_path / "gen.db"), books=20, patrons=5, loans=50, anchor=ANCHOR)
+    assert database.DATABASE == current
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+
+
+def test_generated_data_respects_circulation_invariants(tmp_path):
+    path = str(tmp_path / "lib.db")
+    summary = datagen.generate_library(path, books=100, patrons=10, loans=2000,
+                                       active_ratio=0.5, anchor=ANCHOR)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 100
+        assert conn.execute("SELECT COUNT(*) FROM borrow_records "
+                            "WHERE return_date IS NULL").fetchone()[0] == summary["active_loans"]
+        assert conn.execute("""
+            SELECT COUNT(*) FROM books b WHERE available_copies < 0
+               OR available_copies != total_copies - (SELECT COUNT(*) FROM borrow_records r
+                                                      WHERE r.book_id = b.id AND r.return_date IS NULL)
+        """).fetchone()[0] == 0
+        assert conn.execute("""
+            SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM borrow_records
+                                WHERE return_date IS NULL GROUP BY patron_id)
+        """).fetchone()[0] <= 5
+    finally:
+        conn.close()
+
+
+def test_harness_writes_results_for_each_scenario(tmp_path):
+    out = tmp_path / "bench.json"
+    code = run_benchmarks.main(["--books", "50", "--patrons", "10", "--loans", "100",
+                                "--iterations", "3", "--database", str(tmp_path / "bench.db"),
+                                "--output", str(out)])
+    assert code == 0
+    results = json.loads(out.read_text())
+    assert results["meta"]["books"] == 50
+    assert {"service.search_title", "service.borrow_and_return",
+            "route.api_search"} <= set(results["results"])
+    assert all(r["iterations"] == 3 for r in results["results"].values())
+
+
+def test_harness_reads_patrons_from_a_reused_dataset(tmp_path, monkeypatch):
+    path = str(tmp_path / "reuse.db")
+    datagen.generate_library(path, books=20, patrons=7, loans=200, anchor=ANCHOR)
+    results = run_benchmarks.run(books=20, patrons=5000, loans=0, iterations=1, db_path=path, only=["db."])
+    assert results["meta"]["patrons"] == 7
+
+
+def test_temporary_dataset_is_removed(monkeypatch):
+    created = []
+    real = run_benchmarks.tempfile.TemporaryDirectory
+
+    def tracking(**kwargs):
+        created.append(real(**kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(run_benchmarks.tempfile, "TemporaryDirectory", tracking)
+    results = run_benchmarks.run(books=20, patrons=5, loans=50, iterations=1, only=["db."])
+    assert results["meta"]["database"] is None
+    assert len(created) == 1 and not os.path.exists(created[0].name)
+
+
+def test_harness_keeps_the_current_memory_database(tmp_path):
+    current = database.DATABASE
+    run_benchmarks.run(books=20, patrons=5, loans=50, iterations=1, db_path=str(tmp_path / "bench.db"),
+                       only=["db."], in_memory=True)
+    assert database.DATABASE == current
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+
+
+def test_compare_flags_regressions():
+    current = {"results": {"x": {"mean_ms": 3.0}, "y": {"mean_ms": 1.0}}}
+    baseline = {"results": {"x": {"mean_ms": 1.0}, "y": {"mean_ms": 1.0}}}
+    regressions = run_benchmarks.compare(current, baseline, max_regression=1.25)
+    assert len(regressions) == 1 and regressions[0].startswith("x:")
+    assert current["results"]["x"]["vs_baseline"] == 3.0
+
+
+def test_loadgen_circulation_keeps_invariants():
+    summary = loadgen.run_load(threads=6, duration=0.5, mix=loadgen.CIRCULATION_MIX,
+                               patrons=3, books=3, check_interval=0.1)
+    assert summary["errors"] == 0
+    assert summary["operations"]["borrow"]["requests"] > 0
+    assert summary["operations"]["return"]["requests"] > 0
+    assert summary["invariants"]["ok"], summary["invariants"]
+    assert summary["invariants"]["checks"] >= 2
+
+
+def test_circulation_violations_are_reported():
+    assert not any(database.get_circulation_violations().values())
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET available_copies = 5 WHERE id = 1")
+    conn.executemany("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                     "VALUES ('777777', 2, '2025-01-01', '2025-01-15')", [()] * 6)
+    conn.commit()
+    conn.close()
+    found = database.get_circulation_violations()
+    assert [row["id"] for row in found["availability_out_of_range"]] == [1]
+    assert {row["id"] for row in found["availability_mismatch"]} == {1, 2}
+    assert found["patrons_over_limit"] == [{"patron_id": "777777", "active_loans": 6}]
+
+
+def test_parse_mix():
+    assert loadgen.parse_mix("circulation") == loadgen.CIRCULATION_MIX
+    assert loadgen.parse_mix("borrow=2,return") == [("borrow", 2), ("return", 1)]
@@ -0,0 +1,50 @@
+import io
+import json
+
+import database
+from services import catalog_import
+
+
+def test_import_csv_counts_accepted_duplicates_and_rejected():
+    feed = io.StringIO(
+        "title,author,isbn,total_copies\n"
+        "Dune,Frank Herbert,9780441172719,2\n"
+        "Dune Again,Frank Herbert,9780441172719,1\n"      # duplicate within feed
+        "Gatsby Copy,Someone,9780743273565,1\n"           # duplicate of sample data
+        ",No Title,9780000000001,1\n"                     # rejected: title
+        "Bad Copies,Someone,9780000000002,zero\n"         # rejected: copies
+        "Neuromancer,William Gibson,9780441569595,3\n"
+    )
+    report = catalog_import.import_catalog(feed, "csv", chunk_size=2)
+    assert report["rows"] == 6
+    assert report["accepted"] == 2
+    assert report["duplicates"] == 2
+    assert report["rejected"] == 2
+    assert [e["line"] for e in report["errors"]] == [5, 6]
+    assert "Title is required" in report["errors"][0]["error"]
+    assert report["rows_per_second"] >= 0
+
+    dune = database.get_book_by_isbn("9780441172719")
+    assert dune["title"] == "Dune" and dune["available_copies"] == 2
+
+
+def test_import_jsonl_and_search_index_stays_in_sync():
+    lines = [
+        json.dumps({"title": "Snow Crash", "author": "Neal Stephenson",
+                    "isbn": "9780553380958", "total_copies": 1}),
+        "{not json",
+        "",
+        json.dumps(["not", "an", "object"]),
+    ]
+    report = catalog_import.import_catalog(io.StringIO("\n".join(lines)), "jsonl")
+    assert (report["accepted"], report["rejected"]) == (1, 2)
+    assert database.search_books("stephen", "author")[0]["title"] == "Snow Crash"
+
+
+def test_cli_imports_file(tmp_path, capsys):
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text(json.dumps({"title": "Hyperion", "author": "Dan Simmons",
+                                "isbn": "9780553283686", "total_copies": 4}) + "\n")
+    assert catalog_import.main([str(feed), "--database", database.DATABASE]) == 0
+    assert json.loads(capsys.readouterr().out)["accepted"] == 1
+    assert database.get_book_by_isbn("9780553283686")["total_copies"] == 4
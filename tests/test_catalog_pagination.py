@@ -0,0 +1,52 @@
+import database
+
+
+def _add_books(n):
+    database.insert_books_bulk([
+        (f"Title {i:03d}", "Author", f"97800000{i:05d}", 1, 1) for i in range(n)
+    ])
+
+
+def test_pages_cover_catalog_in_title_order_without_overlap():
+    _add_books(25)
+    seen, cursor = [], None
+    while True:
+        books, cursor = database.get_books_page(limit=10, after=cursor)
+        seen.extend(b["id"] for b in books)
+        if cursor is None:
+            break
+    all_books = database.get_all_books()
+    assert seen == [b["id"] for b in sorted(all_books, key=lambda b: (b["title"], b["id"]))]
+    assert len(seen) == 28  # 25 + 3 sample books
+
+
+def test_duplicate_titles_are_not_skipped():
+    database.insert_books_bulk([("Same", "A", f"978111111111{i}", 1, 1) for i in range(3)])
+    first, cursor = database.get_books_page(limit=2, after=None)
+    rest, _ = database.get_books_page(limit=10, after=cursor)
+    ids = [b["id"] for b in first + rest if b["title"] == "Same"]
+    assert len(ids) == len(set(ids)) == 3
+
+
+def test_api_catalog_paginates(client):
+    _add_books(5)
+    resp = client.get("/api/catalog?limit=4")
+    data = resp.get_json()
+    assert resp.status_code == 200 and data["count"] == 4 and data["next_cursor"]
+    resp = client.get(f"/api/catalog?limit=4&after={data['next_cursor']}")
+    assert resp.get_json()["count"] == 4
+    assert resp.get_json()["next_cursor"] is None
+
+
+def test_api_catalog_rejects_bad_cursor(client):
+    assert client.get("/api/catalog?after=not-a-cursor").status_code == 400
+    assert client.get("/api/catalog?limit=abc").status_code == 400
+
+
+def test_catalog_page_links_to_next_page(client, monkeypatch):
+    monkeypatch.setattr(database, "CATALOG_PAGE_SIZE", 2)
+    html = client.get("/catalog").get_data(as_text=True)
+    assert "Next Page" in html and "First Page" not in html
+    _, cursor = database.get_books_page(limit=2)
+    html = client.get(f"/catalog?after={cursor}").get_data(as_text=True)
+    assert "To Kill a Mockingbird" in html and "First Page" in html and "Next Page" not in html
@@ -0,0 +1,115 @@
+import sys
+import threading
+
+import pytest
+
+import database
+import library_service
+from services import catalog_snapshot
+
+
+@pytest.fixture
+def snapshot():
+    catalog_snapshot.set_catalog_snapshot_enabled(True)
+    database.insert_books_bulk([
+        (f"Book {i:03d}", f"Author {i % 7}", f"978{i:010d}", 2, 2) for i in range(120)
+    ])
+    yield catalog_snapshot.catalog_snapshot
+    catalog_snapshot.set_catalog_snapshot_enabled(False)
+
+
+def test_pages_match_database(snapshot):
+    after = None
+    while True:
+        books, cursor = snapshot.page(limit=25, after=after)
+        expected, expected_cursor = database.get_books_page(limit=25, after=after)
+        assert [dict(b) for b in books] == expected and cursor == expected_cursor
+        if cursor is None:
+            break
+        after = cursor
+
+
+@pytest.mark.parametrize("term,search_type", [
+    ("book 01", "title"), ("GATSBY", "title"), ("author 3", "author"), ("o", "title"),
+    ("9780451524935", "isbn"), ("missing", "title"),
+])
+def test_search_matches_database(snapshot, term, search_type):
+    assert library_service.search_books_in_catalog(term, search_type) == database.search_books(term, search_type)
+
+
+def test_writes_patch_the_snapshot_incrementally(snapshot):
+    snapshot.all()
+    assert snapshot.loads == 1
+
+    ok, _ = library_service.add_book_to_catalog("Aardvarks", "New Author", "9999999999999", 1)
+    assert ok
+    ok, _ = library_service.borrow_book_by_patron("654321", 1)
+    assert ok
+
+    titles = [b.title for b in snapshot.all()]
+    assert titles[:2] == ["1984", "Aardvarks"]
+    assert snapshot.get(1).available_copies == database.get_book_by_id(1)["available_copies"]
+    assert snapshot.get_by_isbn("9999999999999").author == "New Author"
+    assert snapshot.loads == 1 and snapshot.refreshed_rows == 2
+
+
+def test_queries_run_outside_the_lock(snapshot, monkeypatch):
+    snapshot.all()
+    database.update_book_availability(1, -1)
+    real = database.get_catalog_changes
+    waited = []
+
+    def changes(since):
+        # Another reader must get the lock while this one is querying
+        reader = threading.Thread(target=lambda: waited.append(snapshot.stats()))
+        reader.start()
+        reader.join(timeout=2)
+        return real(since)
+
+    monkeypatch.setattr(database, "get_catalog_changes", changes)
+    assert snapshot.get(1).available_copies == 2
+    assert len(waited) == 1
+
+
+def test_records_are_compact(snapshot):
+    books = snapshot.all()
+    by_author = [b for b in books if b.author == "Author 3"]
+    assert all(b.author is by_author[0].author for b in by_author)
+    assert sys.getsizeof(books[0]) * 3 < sys.getsizeof(books[0].as_dict())
+    assert not hasattr(books[0], "__dict__")
+
+
+def test_catalog_routes_use_snapshot(snapshot, client):
+    assert b"Book 000" in client.get("/catalog").data
+    data = client.get("/api/catalog?limit=5").get_json()
+    assert data["count"] == 5 and data["books"][0]["title"] == "1984"
+
+
+def test_trigram_search_matches_scan(snapshot):
+    books = snapshot.all()
+    for term in ["ook 1", "BOOK 11", "hor 6", "e g", "ok", "zzz", "1984", "Gatsby"]:
+        for field in ("title", "author"):
+            expected = [b for b in books if term.lower() in getattr(b, field).lower()]
+            assert snapshot.search(term, field) == expected, (term, field)
+
+
+def test_trigram_index_follows_retitles(snapshot):
+    assert [b.id for b in snapshot.search("gatsby")] == [1]
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = 'The Renamed Novel' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    assert snapshot.search("gatsby") == []
+    assert [b.id for b in snapshot.search("renamed")] == [1]
+    assert snapshot.loads == 1
+
+
+def test_trigram_candidates():
+    index = catalog_snapshot.TrigramIndex()
+    index.add(1, "Dune")
+    index.add(2, "Dune Messiah")
+    assert index.candidates("une") == {1, 2}
+    assert index.candidates("mes") == {2}
+    index.remove(2, "Dune Messiah")
+    assert index.candidates("mes") == set() and len(index) == 2
@@ -0,0 +1,74 @@
+import database
+import library_service
+
+
+def _open_loans(patron_id):
+    return database.get_patron_borrow_count(patron_id)
+
+
+def test_batch_applies_items_in_order():
+    result = library_service.process_circulation_batch([
+        {"op": "borrow", "patron_id": "500001", "book_id": 3},   # 1984 is out
+        {"op": "return", "patron_id": "123456", "book_id": 3},
+        {"op": "borrow", "patron_id": "500001", "book_id": 3},   # now on the shelf
+        {"op": "borrow", "patron_id": "500001", "book_id": 1},
+    ])
+    assert [r["success"] for r in result["results"]] == [False, True, True, True]
+    assert "not available" in result["results"][0]["message"]
+    assert result["succeeded"] == 3 and result["failed"] == 1
+    assert _open_loans("500001") == 2 and _open_loans("123456") == 0
+    assert database.get_book_by_id(3)["available_copies"] == 0
+    assert not any(database.get_circulation_violations().values())
+
+
+def test_invalid_items_fail_without_blocking_the_rest():
+    result = library_service.process_circulation_batch([
+        {"op": "renew", "patron_id": "500002", "book_id": 1},
+        {"op": "borrow", "patron_id": "12ab", "book_id": 1},
+        {"op": "borrow", "patron_id": "500002", "book_id": "x"},
+        "not an object",
+        {"op": "borrow", "patron_id": "500002", "book_id": "2"},
+    ])
+    assert [r["success"] for r in result["results"]] == [False, False, False, False, True]
+    assert result["results"][1]["message"].startswith("Invalid patron ID")
+    assert result["results"][4]["book_id"] == 2
+    assert _open_loans("500002") == 1
+
+
+def test_failed_item_is_rolled_back_alone():
+    # Availability already at total_copies: closing the loan works, releasing the copy does not
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET available_copies = total_copies WHERE id = 3")
+    conn.commit()
+    conn.close()
+    result = library_service.process_circulation_batch([
+        {"op": "borrow", "patron_id": "500003", "book_id": 1},
+        {"op": "return", "patron_id": "123456", "book_id": 3},
+        {"op": "borrow", "patron_id": "500003", "book_id": 2},
+    ])
+    assert [r["success"] for r in result["results"]] == [True, False, True]
+    assert _open_loans("123456") == 1  # the return's loan update was undone
+    assert _open_loans("500003") == 2
+
+
+def test_borrow_limit_counts_earlier_items():
+    ops = [{"op": "borrow", "patron_id": "500004", "book_id": book_id} for book_id in (1, 1, 1, 2, 2, 2)]
+    result = library_service.process_circulation_batch(ops)
+    assert [r["success"] for r in result["results"]] == [True, True, True, True, True, False]
+    assert _open_loans("500004") == 5
+
+
+def test_batch_api(client):
+    resp = client.post("/api/circulation/batch", json={"operations": [
+        {"op": "borrow", "patron_id": "500005", "book_id": 1},
+        {"op": "return", "patron_id": "500005", "book_id": 2},
+    ]})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["succeeded"] == 1 and body["failed"] == 1
+    assert body["results"][1]["message"].startswith("No active borrow record")
+
+    assert client.post("/api/circulation/batch", data="nope").status_code == 400
+    assert client.post("/api/circulation/batch", json={"operations": []}).status_code == 400
+    too_many = [{"op": "borrow", "patron_id": "500005", "book_id": 1}] * (library_service.MAX_CIRCULATION_BATCH + 1)
+    assert client.post("/api/circulation/batch", json={"operations": too_many}).status_code == 400
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+
+
+def _snapshot():
+    return (
+        library_service.get_patron_status_report("123456"),
+        library_service.calculate_outstanding_late_fees(),
+        database.get_patron_borrowed_books("123456"),
+    )
+
+
+def _add_overdue_loans():
+    now = datetime.now().replace(microsecond=0)
+    database.insert_borrow_records_bulk([
+        ("123456", 1, now - timedelta(days=30), now - timedelta(days=16), None),
+        ("012345", 2, now - timedelta(days=20), now - timedelta(days=6), None),
+        ("123456", 2, now - timedelta(days=60), now - timedelta(days=46), now - timedelta(days=40)),
+    ])
+
+
+def _column_types():
+    conn = database.get_db_connection()
+    try:
+        return {row[1]: row[2] for row in conn.execute("PRAGMA table_info(borrow_records)")}
+    finally:
+        conn.close()
+
+
+@pytest.mark.skipif(database.COMPACT_STORAGE, reason="test databases already start compact")
+def test_conversion_keeps_api_results():
+    _add_overdue_loans()
+    before = _snapshot()
+    index_names = {"idx_borrow_records_open", "idx_borrow_records_open_due"}
+
+    assert database.convert_to_compact_storage() is True
+    assert database.is_compact_storage()
+    assert _column_types()["patron_id"] == "INTEGER" and _column_types()["due_date"] == "INTEGER"
+    conn = database.get_db_connection()
+    try:
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+    assert index_names <= names
+
+    # ISO values in the text format carry microseconds the compact format drops
+    after = _snapshot()
+    assert after[1] == before[1]
+    assert [r["title"] for r in after[0]["history"]] == [r["title"] for r in before[0]["history"]]
+    assert after[0]["total_late_fees"] == before[0]["total_late_fees"] == 8.0
+    assert [(r["book_id"], r["is_overdue"]) for r in after[2]] == [(r["book_id"], r["is_overdue"]) for r in before[2]]
+    assert database.convert_to_compact_storage() is False
+
+
+def test_leading_zero_patron_ids_survive():
+    _add_overdue_loans()
+    database.convert_to_compact_storage()
+    fees = library_service.calculate_outstanding_late_fees("012345")
+    assert [loan["patron_id"] for loan in fees["loans"]] == ["012345"]
+
+
+def test_circulation_on_compact_storage():
+    database.convert_to_compact_storage()
+    ok, msg = library_service.borrow_book_by_patron("654321", 1)
+    assert ok, msg
+    loan = database.get_patron_borrowed_books("654321")[0]
+    assert loan["due_date"] - loan["borrow_date"] == timedelta(days=14)
+    ok, msg = library_service.return_book_by_patron("654321", 1)
+    assert ok, msg
+    assert library_service.get_patron_status_report("654321")["history"][0]["return_date"]
+
+
+def test_new_database_can_start_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "COMPACT_STORAGE", True)
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "compact.db"))
+    database.init_database()
+    database.migrate_database()
+    database.add_sample_data()
+    assert _column_types()["borrow_date"] == "INTEGER"
+    assert library_service.get_patron_status_report("123456")["total_active"] == 1
@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+
+
+def test_connections_are_reused():
+    first = database.get_db_connection()
+    first.close()
+    second = database.get_db_connection()
+    second.close()
+    assert first is second
+    stats = database.get_pool_stats()
+    assert stats["open"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_pragmas_applied_once_per_connection(tmp_path, monkeypatch):
+    # WAL applies to database files; the suite otherwise runs in memory
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    conn = database.get_db_connection()
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.BUSY_TIMEOUT_MS
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    finally:
+        conn.close()
+
+
+def test_helpers_return_connections():
+    for _ in range(3 * database.POOL_SIZE):
+        database.get_book_by_id(1)
+        database.update_borrow_record_return_date("999999", 1, database.datetime.now())
+    stats = database.get_pool_stats()
+    assert stats["in_use"] == 0
+    assert stats["open"] <= stats["size"]
+
+
+def test_release_rolls_back_open_transaction():
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET available_copies = 99 WHERE id = 1")
+    conn.close()
+    assert database.get_book_by_id(1)["available_copies"] == 3
+
+
+def test_exhausted_pool_waits_then_times_out(temp_db):
+    pool = database.ConnectionPool(temp_db, size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    threading.Timer(0.01, held.close).start()
+    pool.timeout = 2
+    again = pool.acquire()
+    assert again is held
+    assert pool.stats()["waits"] == 1
+    again.close()
+    pool.close()
+
+
+def test_pool_follows_database_setting(tmp_path, monkeypatch):
+    old_pool = database.get_pool()
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "other.db"))
+    assert database.get_pool() is not old_pool
+    assert database.get_pool_stats()["database"].endswith("other.db")
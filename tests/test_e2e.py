@@ -20,16 +20,11 @@ def random_isbn():
 def server():
     """Start the Flask app in a subprocess for the duration of the tests."""
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    db_path = os.path.join(repo_root, 'library.db')
-    # Ensure a fresh DB for the test session
-    try:
-        if os.path.exists(db_path):
-            os.remove(db_path)
-    except Exception:
-        pass
 
+    # A fresh in-memory DB for the test session; library.db is left alone
     env = os.environ.copy()
     env['PYTHONUNBUFFERED'] = '1'
+    env['LIBRARY_DATABASE'] = ':memory:'
 
     proc = subprocess.Popen(
         ['python', 'app.py'], cwd=repo_root, env=env,
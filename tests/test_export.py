@@ -0,0 +1,64 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import database
+from services import export
+
+
+def _add_books(n):
+    database.insert_books_bulk([(f"Export {i}", "Author", f"978{i:010d}", 2, 2) for i in range(n)])
+
+
+def test_books_stream_in_batches():
+    _add_books(25)
+    chunks = list(export.iter_export("books", "ndjson", batch_size=10))
+    assert len(chunks) == 3  # 28 books
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 29))
+    assert rows[0] == {"id": 1, "title": "The Great Gatsby", "author": "F. Scott Fitzgerald",
+                       "isbn": "9780743273565", "total_copies": 3, "available_copies": 3}
+
+
+def test_loans_csv_for_one_patron():
+    import library_service
+    library_service.borrow_book_by_patron("600001", 1)
+    library_service.return_book_by_patron("600001", 1)
+    library_service.borrow_book_by_patron("600001", 2)
+
+    text = b"".join(export.iter_export("loans", "csv", patron_id="600001")).decode()
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [(r["patron_id"], r["book_id"]) for r in rows] == [("600001", "1"), ("600001", "2")]
+    assert rows[0]["return_date"] and rows[1]["return_date"] == ""
+    assert datetime.fromisoformat(rows[0]["borrow_date"]) <= datetime.fromisoformat(rows[1]["borrow_date"])
+
+
+def test_gzip_round_trip():
+    _add_books(5)
+    raw = b"".join(export.iter_export("books", "csv", batch_size=2))
+    assert gzip.decompress(b"".join(export.gzip_chunks(export.iter_export("books", "csv", batch_size=2)))) == raw
+
+
+def test_export_endpoint(client):
+    resp = client.get("/api/export/loans", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200 and resp.headers["Content-Encoding"] == "gzip"
+    assert resp.mimetype == "application/x-ndjson"
+    loans = [json.loads(line) for line in gzip.decompress(resp.data).decode().splitlines()]
+    assert [(loan["patron_id"], loan["book_id"]) for loan in loans] == [("123456", 3)]
+
+    resp = client.get("/api/export/books?format=csv")
+    assert "Content-Encoding" not in resp.headers
+    assert resp.data.decode().splitlines()[0] == "id,title,author,isbn,total_copies,available_copies"
+    assert 'filename="books-' in resp.headers["Content-Disposition"]
+
+    assert client.get("/api/export/patrons").status_code == 404
+    assert client.get("/api/export/books?format=xml").status_code == 400
+    assert client.get("/api/export/loans?patron_id=12").status_code == 400
+
+
+def test_cli_writes_file(tmp_path):
+    out = tmp_path / "books.ndjson.gz"
+    assert export.main(["books", "--gzip", "--output", str(out)]) == 0
+    assert len(gzip.decompress(out.read_bytes()).decode().splitlines()) == 3
@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import database
+import library_service
+from services import payment_service
+
+
+def _overdue_loans(patron_id, days_list):
+    for i, days in enumerate(days_list):
+        database.insert_book(f"Overdue {i}", "Auth", f"97855500000{i:02d}", 1, 0)
+        book_id = database.get_book_by_isbn(f"97855500000{i:02d}")["id"]
+        due = datetime.now() - timedelta(days=days)
+        database.insert_borrow_records_bulk([(patron_id, book_id, due - timedelta(days=14), due, None)])
+
+
+class FlakyGateway(payment_service.PaymentGateway):
+    """Fails the first `failures` calls with a network error."""
+
+    def __init__(self, failures=0, latency=0.0):
+        super().__init__(latency=latency, failure_rate=0.0)
+        self.failures = failures
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def process_payment(self, amount, idempotency_key=None):
+        with self.lock:
+            self.calls += 1
+            fail = self.calls <= self.failures
+        if fail:
+            raise RuntimeError("network error")
+        return super().process_payment(amount, idempotency_key)
+
+
+def test_settles_all_loans_concurrently():
+    _overdue_loans("444444", [2, 4, 6, 8])
+    gateway = payment_service.PaymentGateway(latency=0.1, failure_rate=0.0)
+    start = time.perf_counter()
+    res = library_service.settle_patron_late_fees("444444", gateway, max_workers=4)
+    elapsed = time.perf_counter() - start
+    assert res["success"] is True
+    assert res["paid_count"] == 4 and res["failed_count"] == 0
+    assert res["total_paid"] == res["total_due"] == 10.0
+    assert all(r["transaction_id"].startswith("tx") for r in res["results"])
+    assert elapsed < 0.3  # four 100ms calls overlapped
+
+
+def test_network_errors_are_retried_with_backoff():
+    _overdue_loans("444444", [3])
+    gateway = FlakyGateway(failures=2)
+    res = library_service.settle_patron_late_fees("444444", gateway, retries=2, backoff=0.01)
+    assert res["success"] is True
+    assert res["results"][0]["attempts"] == 3
+
+
+def test_gives_up_after_retries():
+    _overdue_loans("444444", [3])
+    gateway = FlakyGateway(failures=10)
+    res = library_service.settle_patron_late_fees("444444", gateway, retries=1, backoff=0.01)
+    assert res["success"] is False
+    assert res["results"][0]["status"] == "error" and res["results"][0]["attempts"] == 2
+
+
+def test_slow_calls_time_out_without_retry():
+    _overdue_loans("444444", [3, 5])
+    gateway = payment_service.PaymentGateway(latency=0.5, failure_rate=0.0)
+    res = library_service.settle_patron_late_fees("444444", gateway, call_timeout=0.05)
+    assert res["failed_count"] == 2
+    assert {r["status"] for r in res["results"]} == {"timeout"}
+    assert all(r["attempts"] == 1 for r in res["results"])
+
+
+def test_calls_queued_behind_a_hung_one_are_cancelled():
+    _overdue_loans("444444", [3, 5])
+    gateway = payment_service.PaymentGateway(latency=1.0, failure_rate=0.0)
+    calls = []
+    gateway.process_payment = Mock(side_effect=lambda amount, key: calls.append(time.monotonic()) or (
+        time.sleep(1.0 if len(calls) == 1 else 0) or {"success": True, "transaction_id": "tx"}))
+    start = time.monotonic()
+    res = library_service.settle_patron_late_fees("444444", gateway, max_workers=1, call_timeout=0.3)
+    assert [r["status"] for r in res["results"]] == ["timeout", "not_attempted"]
+    assert [r["attempts"] for r in res["results"]] == [1, 0]
+    time.sleep(1.0)  # the hung call finishes; the cancelled one must never run
+    assert len(calls) == 1 and calls[0] - start < 0.1
+
+
+def test_zero_workers_still_settles():
+    _overdue_loans("444444", [3])
+    gateway = payment_service.PaymentGateway(latency=0.0, failure_rate=0.0)
+    assert library_service.settle_patron_late_fees("444444", gateway, max_workers=0)["success"] is True
+
+
+def test_declines_are_reported_per_loan():
+    _overdue_loans("444444", [2, 4])
+    gateway = Mock(spec=payment_service.PaymentGateway)
+    gateway.process_payment.side_effect = lambda amount, key: (
+        {"success": True, "transaction_id": "tx1"} if amount == 1.0 else {"success": False, "error": "declined"})
+    res = library_service.settle_patron_late_fees("444444", gateway)
+    statuses = {r["amount"]: r["status"] for r in res["results"]}
+    assert statuses == {1.0: "paid", 2.0: "declined"}
+    assert res["total_paid"] == 1.0 and res["success"] is False
+
+
+def test_no_fees_or_invalid_patron_skip_gateway():
+    gateway = Mock(spec=payment_service.PaymentGateway)
+    assert library_service.settle_patron_late_fees("12", gateway)["message"] == "Invalid patron ID"
+    assert library_service.settle_patron_late_fees("555555", gateway)["message"] == "No fees due"
+    gateway.process_payment.assert_not_called()
+
+
+def test_settled_loans_are_not_charged_again():
+    _overdue_loans("444444", [2, 4])
+    gateway = payment_service.PaymentGateway(latency=0.0, failure_rate=0.0)
+    gateway.process_payment = Mock(wraps=gateway.process_payment)
+    first = library_service.settle_patron_late_fees("444444", gateway)
+    assert first["paid_count"] == 2
+    assert library_service.settle_patron_late_fees("444444", gateway)["message"] == "No fees due"
+    assert gateway.process_payment.call_count == 2
+    keys = sorted(call.args[1] for call in gateway.process_payment.call_args_list)
+    assert keys == sorted(f"late-fee-{r['loan_id']}" for r in first["results"])
+
+
+def test_retry_after_a_timed_out_charge_is_not_charged_twice():
+    _overdue_loans("444444", [3])
+    gateway = payment_service.PaymentGateway(latency=0.2, failure_rate=0.0)
+    timed_out = library_service.settle_patron_late_fees("444444", gateway, call_timeout=0.05)
+    assert timed_out["results"][0]["status"] == "timeout"
+    time.sleep(0.3)  # the abandoned call completes the charge
+
+    gateway.latency = 0.0
+    again = library_service.settle_patron_late_fees("444444", gateway)
+    assert again["results"][0]["status"] == "paid"
+    assert len(gateway._charges) == 1
+    assert again["results"][0]["transaction_id"] == next(iter(gateway._charges.values()))["transaction_id"]
+
+
+def test_defaults_to_the_shared_gateway_client(mocker):
+    _overdue_loans("444444", [3])
+    shared = mocker.patch("services.library_service.get_gateway_client").return_value
+    shared.process_payment.return_value = {"success": True, "transaction_id": "tx7"}
+    assert library_service.settle_patron_late_fees("444444")["success"] is True
+    shared.process_payment.assert_called_once()
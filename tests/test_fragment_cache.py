@@ -0,0 +1,32 @@
+from services.fragment_cache import FragmentCache, fragment_cache
+
+
+def test_only_changed_rows_are_rendered_again(client):
+    first = client.get("/catalog").data
+    assert fragment_cache.stats()["misses"] == 3
+    assert b"3/3 Available" in first and b"Not Available" in first
+
+    client.post("/borrow", data={"patron_id": "654321", "book_id": "1"})
+    page = client.get("/catalog").data
+    stats = fragment_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 4)
+    assert b"2/3 Available" in page and b"3/3 Available" not in page
+
+
+def test_hit_rate_is_exported(client):
+    client.get("/catalog")
+    client.get("/catalog?after=")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "library_fragment_cache_hit_ratio 0.5" in text
+    assert "library_fragment_cache_entries 3" in text
+
+
+def test_lru_eviction_and_disabled_cache():
+    cache = FragmentCache(size=2)
+    for key in ("a", "b", "a", "c", "b"):
+        cache.get_or_render(key, lambda: f"<td>{key}</td>")
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 1, "misses": 4, "hit_rate": 0.2}
+
+    cache.configure(0)
+    assert str(cache.get_or_render("a", lambda: "<td>x</td>")) == "<td>x</td>"
+    assert cache.stats()["size"] == 0
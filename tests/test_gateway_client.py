@@ -0,0 +1,125 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+import library_service
+from services import gateway_client, payment_service
+from services.gateway_client import CircuitBreaker, ResilientGateway
+
+
+@pytest.fixture
+def gateway():
+    return Mock(spec=payment_service.PaymentGateway)
+
+
+def test_passes_results_through(gateway):
+    gateway.process_payment.return_value = {"success": True, "transaction_id": "tx1"}
+    client = ResilientGateway(gateway)
+    assert client.process_payment(5.0)["transaction_id"] == "tx1"
+    assert client.stats()["calls"]["success"] == 1
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(gateway):
+    gateway.process_payment.side_effect = RuntimeError("network error")
+    client = ResilientGateway(gateway, CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            client.process_payment(1.0)
+    assert client.breaker.state == gateway_client.OPEN
+
+    with pytest.raises(gateway_client.CircuitOpenError):
+        client.process_payment(1.0)
+    assert gateway.process_payment.call_count == 3
+    assert client.stats()["calls"]["rejected"] == 1
+    assert client.stats()["error_rate"] == 1.0
+
+
+def test_half_open_trial_closes_or_reopens(gateway):
+    client = ResilientGateway(gateway, CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    gateway.process_payment.side_effect = RuntimeError("down")
+    with pytest.raises(RuntimeError):
+        client.process_payment(1.0)
+    time.sleep(0.06)
+    assert client.breaker.state == gateway_client.HALF_OPEN
+    with pytest.raises(RuntimeError):
+        client.process_payment(1.0)  # trial fails -> open again
+    assert client.breaker.state == gateway_client.OPEN
+
+    time.sleep(0.06)
+    gateway.process_payment.side_effect = None
+    gateway.process_payment.return_value = {"success": True, "transaction_id": "tx2"}
+    client.process_payment(1.0)
+    assert client.breaker.state == gateway_client.CLOSED
+    assert client.breaker.opened_count == 2
+
+
+def test_deadline_frees_caller():
+    slow = payment_service.PaymentGateway(latency=0.5, failure_rate=0.0)
+    client = ResilientGateway(slow, deadline=0.05)
+    start = time.perf_counter()
+    with pytest.raises(gateway_client.GatewayTimeoutError):
+        client.process_payment(1.0)
+    assert time.perf_counter() - start < 0.3
+    assert client.stats()["calls"]["timeout"] == 1
+
+
+def test_declines_do_not_trip_the_breaker(gateway):
+    gateway.process_payment.return_value = {"success": False, "error": "declined"}
+    client = ResilientGateway(gateway, CircuitBreaker(failure_threshold=1))
+    client.process_payment(1.0)
+    client.process_payment(1.0)
+    assert client.breaker.state == gateway_client.CLOSED
+
+
+def test_pay_late_fees_fails_fast_when_open(mocker, gateway):
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={"fee_amount": 2.0, "days_overdue": 4, "status": "OVERDUE"})
+    client = ResilientGateway(gateway, CircuitBreaker(failure_threshold=1))
+    client.breaker.record_failure()
+    res = library_service.pay_late_fees("123456", 1, client)
+    assert res["success"] is False and "circuit open" in res["message"]
+    gateway.process_payment.assert_not_called()
+
+
+def test_gateway_metrics_exported(client, gateway):
+    gw = ResilientGateway(gateway, name="test-gw")
+    gw.process_payment(1.0)
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'library_gateway_calls_total{gateway="test-gw",outcome="success"} 1' in text
+    assert 'library_gateway_circuit_state{gateway="test-gw",state="closed"} 1' in text
+
+
+def test_clients_sharing_a_name_are_summed(client, gateway):
+    gateway.process_payment.return_value = {"success": True, "transaction_id": "tx1"}
+    first, second = ResilientGateway(gateway, name="dup-gw"), ResilientGateway(gateway, name="dup-gw")
+    first.process_payment(1.0)
+    second.process_payment(1.0)
+    lines = client.get("/metrics").get_data(as_text=True).splitlines()
+    calls = [line for line in lines if line.startswith('library_gateway_calls_total{gateway="dup-gw",outcome="success"}')]
+    assert calls == ['library_gateway_calls_total{gateway="dup-gw",outcome="success"} 2']
+    assert 'library_gateway_call_duration_seconds_count{gateway="dup-gw"} 2' in lines
+    assert 'library_gateway_call_duration_seconds_bucket{gateway="dup-gw",le="+Inf"} 2' in lines
+    assert 'library_gateway_circuit_state{gateway="dup-gw",state="closed"} 2' in lines
+    assert len(lines) == len(set(lines))
+
+    first.shutdown()
+    second.shutdown()
+    with pytest.raises(RuntimeError):
+        first.process_payment(1.0)
+    assert "dup-gw" not in client.get("/metrics").get_data(as_text=True)
+
+
+def test_pay_and_refund_default_to_the_shared_client(mocker):
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={"fee_amount": 2.0, "days_overdue": 4, "status": "OVERDUE"})
+    shared = gateway_client.get_gateway_client()
+    assert gateway_client.get_gateway_client() is shared
+    mocker.patch.object(shared, "gateway", Mock(spec=payment_service.PaymentGateway))
+    shared.gateway.process_payment.return_value = {"success": True, "transaction_id": "tx9"}
+    shared.gateway.refund_payment.return_value = {"success": True, "refund_id": "rf9"}
+    before = shared.stats()["calls"]["success"]
+
+    assert library_service.pay_late_fees("123456", 1)["transaction_id"] == "tx9"
+    assert library_service.refund_late_fee_payment("tx9", 2.0)["refund_id"] == "rf9"
+    assert shared.stats()["calls"]["success"] == before + 2
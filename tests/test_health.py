@@ -0,0 +1,76 @@
+import argparse
+
+import database
+import serve
+from services import health
+
+
+def test_liveness_and_readiness(client):
+    assert client.get("/healthz").get_json() == {"status": "ok"}
+    ready = client.get("/readyz")
+    assert ready.status_code == 200
+    assert ready.get_json()["schema_version"] == database.MIGRATIONS[-1][0]
+
+
+def test_not_ready_while_draining(client, monkeypatch):
+    monkeypatch.setattr(health, "_draining", health.threading.Event())
+    health.start_draining()
+    resp = client.get("/readyz")
+    assert resp.status_code == 503 and resp.get_json()["status"] == "draining"
+    assert client.get("/healthz").status_code == 200
+
+
+def test_workers_skip_database_setup(tmp_path, monkeypatch):
+    from app import create_app
+    database.close_pool()
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "unprepared.db"))
+    client = create_app({"INIT_DATABASE": False}).test_client()
+    assert client.get("/readyz").status_code == 503
+
+    serve.on_starting(server=None)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_server_options():
+    args = argparse.Namespace(
+        bind="127.0.0.1:0", workers=3, threads=8, timeout=30, graceful_timeout=20, access_log=None)
+    options = serve.build_options(args)
+    assert options["workers"] == 3 and options["threads"] == 8
+    assert options["worker_class"] == "gthread"
+    assert options["on_starting"] is serve.on_starting
+
+
+def _serve(monkeypatch, argv):
+    """Run serve.main without a server: the master hook, then one worker's load()."""
+    from gunicorn.app.base import BaseApplication
+    apps = []
+
+    def run(self):
+        if "on_starting" in self.options:
+            self.options["on_starting"](None)
+        apps.append(self.load())
+
+    monkeypatch.setattr(BaseApplication, "run", run)
+    return serve.main(argv), apps
+
+
+def test_master_and_workers_use_library_database(tmp_path, monkeypatch):
+    database.close_pool()
+    path = str(tmp_path / "served.db")
+    monkeypatch.setenv("LIBRARY_DATABASE", path)
+    code, apps = _serve(monkeypatch, ["--workers", "2"])
+    assert code == 0 and database.DATABASE == path
+    client = apps[0].test_client()
+    assert client.get("/readyz").status_code == 200
+    assert client.get("/catalog").status_code == 200
+
+
+def test_memory_database_needs_one_worker(monkeypatch, capsys):
+    database.close_pool()
+    monkeypatch.setenv("LIBRARY_DATABASE", ":memory:")
+    assert _serve(monkeypatch, ["--workers", "2"]) == (2, [])
+    assert "in-memory" in capsys.readouterr().err
+
+    code, apps = _serve(monkeypatch, ["--workers", "1"])
+    assert code == 0
+    assert apps[0].test_client().get("/readyz").status_code == 200
@@ -0,0 +1,106 @@
+import database
+from services.http_cache import response_cache
+
+
+def test_catalog_carries_validators_and_answers_304(client):
+    first = client.get("/catalog")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/catalog", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+
+    since = client.get("/api/catalog", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+
+def test_any_book_write_changes_the_etag(client):
+    etag = client.get("/api/search?q=gatsby").headers["ETag"]
+    ok = client.post("/borrow", data={"patron_id": "654321", "book_id": "1"}).status_code == 302
+    assert ok
+    resp = client.get("/api/search?q=gatsby", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    assert resp.get_json()["results"][0]["available_copies"] == 2
+
+    # Writes from outside this process are seen too (the log is trigger-maintained)
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET available_copies = 0 WHERE id = 2")
+    conn.commit()
+    conn.close()
+    assert client.get("/api/search?q=gatsby", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 200
+
+
+def test_invalid_arguments_are_rejected_before_304(client):
+    etag = client.get("/api/catalog").headers["ETag"]
+    assert client.get("/api/catalog?after=%%%", headers={"If-None-Match": etag}).status_code == 400
+    assert client.get("/api/catalog?limit=x", headers={"If-None-Match": etag}).status_code == 400
+    assert client.get("/api/search?q=", headers={"If-None-Match": etag}).status_code == 400
+    resp = client.get("/catalog?after=%%%", headers={"If-None-Match": etag})
+    assert resp.status_code == 302
+
+
+def test_etag_is_tied_to_the_database(client, monkeypatch):
+    etag = client.get("/api/search?q=gatsby").headers["ETag"]
+    database.close_pool()
+    monkeypatch.setattr(database, "DATABASE", database.memory_database())
+    database.init_database()
+    database.migrate_database()
+    database.add_sample_data()
+    resp = client.get("/api/search?q=gatsby", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+
+def test_rendered_responses_are_reused_per_version(client):
+    client.get("/search?q=mockingbird&type=title")
+    body = client.get("/search?q=mockingbird&type=title").data
+    assert b"To Kill a Mockingbird" in body
+    assert response_cache.stats()["hits"] == 1
+
+    client.get("/search?q=gatsby&type=title")
+    assert response_cache.stats()["misses"] == 2
+
+
+def test_errors_and_flashes_are_not_cached(client):
+    assert client.get("/api/catalog?after=bogus").status_code == 400
+    assert "ETag" not in client.get("/api/catalog?after=bogus").headers
+
+    client.post("/borrow", data={"patron_id": "12", "book_id": "1"})
+    page = client.get("/catalog")
+    assert b"Invalid patron ID" in page.data and "ETag" not in page.headers
+
+
+def test_cache_can_be_disabled(temp_db):
+    from app import create_app
+    client = create_app({"RESPONSE_CACHE_SIZE": 0}).test_client()
+    client.get("/catalog")
+    client.get("/catalog")
+    assert response_cache.stats()["hits"] == 0
+    assert client.get("/catalog").headers["ETag"]
+
+
+def test_change_log_is_pruned_as_books_change():
+    conn = database.get_db_connection()
+    try:
+        with conn:
+            for _ in range(12000):
+                conn.execute("UPDATE books SET available_copies = available_copies WHERE id = 1")
+        count, oldest, newest = conn.execute(
+            "SELECT COUNT(*), MIN(version), MAX(version) FROM catalog_changes").fetchone()
+    finally:
+        conn.close()
+    assert count <= database.CATALOG_CHANGES_KEPT + 1000
+    assert newest - oldest < database.CATALOG_CHANGES_KEPT + 1000
+    # A reader from before the pruned range reloads everything
+    assert database.get_catalog_changes(1) == (newest, None)
+    assert database.get_catalog_changes(newest - 2) == (newest, [1])
+
+
+def test_change_log_missing_before_migration(monkeypatch):
+    database.close_pool()
+    monkeypatch.setattr(database, "DATABASE", database.memory_database())
+    database.init_database()
+    assert database.get_catalog_version() == (0, 0)
+    assert database.get_catalog_changes(0) == (0, None)
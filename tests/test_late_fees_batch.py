@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+
+
+def _open_loan(patron_id, book_id, days_overdue):
+    due = datetime.now() - timedelta(days=days_overdue)
+    database.insert_borrow_records_bulk([(patron_id, book_id, due - timedelta(days=14), due, None)])
+
+
+def test_batch_fees_cover_all_overdue_open_loans():
+    _open_loan("111111", 1, 3)
+    _open_loan("111111", 2, 10)
+    _open_loan("222222", 1, 1)
+    _open_loan("333333", 2, -2)  # not yet due
+    result = library_service.calculate_outstanding_late_fees()
+    assert result["status"] == "OK"
+    assert [(l["patron_id"], l["days_overdue"], l["fee_amount"]) for l in result["loans"]] == [
+        ("111111", 10, 5.0), ("111111", 3, 1.5), ("222222", 1, 0.5),
+    ]
+    assert result["loan_count"] == 3 and result["patron_count"] == 2
+    assert result["total_fees"] == 7.0
+
+
+def test_batch_fees_match_single_book_calculation():
+    _open_loan("111111", 1, 4)
+    _open_loan("111111", 2, 7)
+    batch = library_service.calculate_outstanding_late_fees("111111")
+    for loan in batch["loans"]:
+        single = library_service.calculate_late_fee_for_book("111111", loan["book_id"])
+        assert (single["days_overdue"], single["fee_amount"]) == (loan["days_overdue"], loan["fee_amount"])
+
+
+def test_batch_fees_reject_invalid_patron():
+    result = library_service.calculate_outstanding_late_fees("12")
+    assert result["status"] == "Invalid patron ID" and result["loans"] == []
+
+
+@pytest.mark.parametrize("patron_id", [None, "111111"])
+def test_overdue_query_reads_open_loans_from_an_index(patron_id):
+    conn = database.get_db_connection()
+    try:
+        sql, params = database._overdue_loan_fees_query(conn, date(2025, 1, 1), 0.5, patron_id)
+        plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    finally:
+        conn.close()
+    loans = [d for d in plan if d.startswith(("SCAN br", "SEARCH br"))]
+    assert loans and all("USING INDEX idx_borrow_records_open_" in d for d in loans), plan
+
+
+def test_late_fees_endpoint(client):
+    _open_loan("111111", 1, 2)
+    data = client.get("/api/late_fees").get_json()
+    assert data["loan_count"] == 1 and data["total_fees"] == 1.0
+    assert client.get("/api/late_fees?patron_id=999999").get_json()["loan_count"] == 0
+    assert client.get("/api/late_fees?patron_id=abc").status_code == 400
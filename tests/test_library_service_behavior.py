@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 import library_service
 
@@ -50,38 +52,58 @@ def test_r1_add_book_invalid_copies():
 # R2: borrow_book_by_patron
 # ===============================
 
-def test_r2_borrow_success(monkeypatch):
-    monkeypatch.setattr(library_service, "get_book_by_id",
-                        lambda bid: Dummy.book(id_=bid, title="1984", available=2))
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 1)
-    monkeypatch.setattr(library_service, "insert_borrow_record", lambda *a, **k: True)
-    monkeypatch.setattr(library_service, "update_book_availability", lambda *a, **k: True)
+def _borrow_n(patron_id, n):
+    for i in range(n):
+        library_service.insert_book(f"Book {i}", "Auth", f"99900000000{i:02d}", 1, 1)
+        book = library_service.get_book_by_isbn(f"99900000000{i:02d}")
+        ok, _ = library_service.borrow_book_by_patron(patron_id, book["id"])
+        assert ok
 
+def test_r2_borrow_success():
     ok, msg = library_service.borrow_book_by_patron("123456", 1)
     assert ok is True and "successfully borrowed" in msg.lower()
+    assert library_service.get_book_by_id(1)["available_copies"] == 2
 
 def test_r2_borrow_invalid_patron():
     ok, msg = library_service.borrow_book_by_patron("12", 1)
     assert ok is False and "invalid patron id" in msg.lower()
 
-def test_r2_borrow_book_not_found(monkeypatch):
-    monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: None)
+def test_r2_borrow_book_not_found():
     ok, msg = library_service.borrow_book_by_patron("123456", 99)
     assert ok is False and "book not found" in msg.lower()
 
-def test_r2_borrow_unavailable(monkeypatch):
-    monkeypatch.setattr(library_service, "get_book_by_id",
-                        lambda bid: Dummy.book(available=0))
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 0)
-    ok, msg = library_service.borrow_book_by_patron("123456", 1)
+def test_r2_borrow_unavailable():
+    # sample data: book 3 ("1984") has no copies left
+    ok, msg = library_service.borrow_book_by_patron("654321", 3)
     assert ok is False and "not available" in msg.lower()
 
-def test_r2_borrow_over_limit(monkeypatch):
-    monkeypatch.setattr(library_service, "get_book_by_id",
-                        lambda bid: Dummy.book(available=3))
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 6)
-    ok, msg = library_service.borrow_book_by_patron("123456", 1)
+def test_r2_borrow_over_limit():
+    _borrow_n("222222", 5)
+    ok, msg = library_service.borrow_book_by_patron("222222", 1)
     assert ok is False and "maximum borrowing limit" in msg.lower()
+    assert library_service.get_book_by_id(1)["available_copies"] == 3
+
+def test_r2_borrow_last_copy_not_oversold():
+    library_service.insert_book("Last Copy", "Auth", "9990000000100", 1, 1)
+    book_id = library_service.get_book_by_isbn("9990000000100")["id"]
+    results = []
+    patrons = [f"3000{i:02d}" for i in range(8)]
+    threads = [threading.Thread(target=lambda p=p: results.append(
+        library_service.borrow_book_by_patron(p, book_id)[0])) for p in patrons]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert library_service.get_book_by_id(book_id)["available_copies"] == 0
+
+def test_r3_return_closes_one_of_two_copies():
+    library_service.borrow_book_by_patron("444444", 1)
+    library_service.borrow_book_by_patron("444444", 1)
+    ok, _ = library_service.return_book_by_patron("444444", 1)
+    assert ok
+    assert library_service.get_patron_borrow_count("444444") == 1
+    assert library_service.get_book_by_id(1)["available_copies"] == 2
 
 # ===============================
 # R3–R7: define contracts, mark xfail until implemented
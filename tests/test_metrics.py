@@ -0,0 +1,51 @@
+import re
+
+import pytest
+
+from app import create_app
+from services.metrics import registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+def _value(text, pattern):
+    match = re.search(r"^" + re.escape(pattern) + r" (\S+)$", text, re.M)
+    assert match, pattern
+    return float(match.group(1))
+
+
+def test_metrics_record_latency_status_and_queries(client):
+    client.get("/catalog")
+    client.get("/catalog")
+    client.get("/api/search?q=")
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert _value(text, 'library_http_requests_total{endpoint="catalog.catalog",method="GET",status="200"}') == 2
+    assert _value(text, 'library_http_requests_total{endpoint="api.search_books_api",method="GET",status="400"}') == 1
+    assert _value(text, 'library_http_request_duration_seconds_count{endpoint="catalog.catalog"}') == 2
+    assert _value(text, 'library_http_request_duration_seconds_bucket{endpoint="catalog.catalog",le="+Inf"}') == 2
+    assert _value(text, 'library_db_queries_per_request_sum{endpoint="catalog.catalog"}') >= 2
+    # Rejected by the argument check before the catalog version lookup
+    assert _value(text, 'library_db_queries_per_request_sum{endpoint="api.search_books_api"}') == 0
+    # the scrape itself is in flight while rendering
+    assert _value(text, "library_http_requests_in_flight") == 1
+    assert "library_db_pool_connections{state=\"open\"}" in text
+
+
+def test_unmatched_routes_are_grouped(client):
+    client.get("/no/such/page")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert _value(text, 'library_http_requests_total{endpoint="unmatched",method="GET",status="404"}') == 1
+
+
+def test_metrics_can_be_disabled(temp_db):
+    app = create_app({"METRICS_ENABLED": False})
+    client = app.test_client()
+    client.get("/catalog")
+    assert client.get("/metrics").status_code == 404
+    assert registry.requests == {}
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+import database
+
+
+def _index_names():
+    conn = database.get_db_connection()
+    try:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        return {r["name"] for r in rows}
+    finally:
+        conn.close()
+
+
+def test_migrations_reach_latest_version():
+    assert database.get_schema_version() == database.MIGRATIONS[-1][0]
+    assert {"idx_borrow_records_open", "idx_borrow_records_patron_history",
+            "idx_borrow_records_book"} <= _index_names()
+
+
+def test_migrations_are_idempotent():
+    version = database.get_schema_version()
+    assert database.migrate_database() == version
+    conn = database.get_db_connection()
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+    finally:
+        conn.close()
+    assert count == len(database.MIGRATIONS)
+
+
+def test_versions_are_strictly_increasing():
+    versions = [m[0] for m in database.MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+@pytest.mark.parametrize("sql, params", [
+    ("SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL",
+     ("123456",)),
+    ("UPDATE borrow_records SET return_date = ? "
+     "WHERE patron_id = ? AND book_id = ? AND return_date IS NULL",
+     ("2025-01-01", "123456", 3)),
+])
+def test_loan_lookups_do_not_scan_table(sql, params):
+    conn = database.get_db_connection()
+    try:
+        plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    finally:
+        conn.close()
+    assert any("USING INDEX idx_borrow_records_" in d for d in plan), plan
+    assert not any(d.startswith("SCAN borrow_records") for d in plan), plan
+
+
+def test_failed_migration_rolls_back(monkeypatch):
+    version = database.get_schema_version()
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [
+        (version + 1, "broken", [
+            "CREATE INDEX idx_should_not_exist ON books (author)",
+            "CREATE INDEX broken ON no_such_table (x)",
+        ]),
+    ])
+    with pytest.raises(sqlite3.OperationalError):
+        database.migrate_database()
+    assert database.get_schema_version() == version
+    assert "idx_should_not_exist" not in _index_names()
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+
+import database
+from services import overdue_scanner
+
+AS_OF = datetime(2025, 3, 1, 9, 0)
+
+
+def _loans(specs):
+    """specs: (patron_id, book_id, days_overdue, returned)"""
+    records = []
+    for patron_id, book_id, days, returned in specs:
+        due = AS_OF - timedelta(days=days)
+        records.append((patron_id, book_id, due - timedelta(days=14), due,
+                        AS_OF if returned else None))
+    database.insert_borrow_records_bulk(records)
+
+
+def _notices(run_date="2025-03-01"):
+    return [notice for batch in database.iter_overdue_notices(run_date) for notice in batch]
+
+
+def test_one_notice_per_patron_with_overdue_loans():
+    _loans([
+        ("700002", 1, 4, False),
+        ("700001", 2, 10, False),
+        ("700001", 1, 2, False),
+        ("700001", 3, 30, True),   # returned
+        ("700003", 2, -3, False),  # not due yet
+    ])
+    scan = overdue_scanner.scan_overdue_loans(AS_OF)
+    assert scan["status"] == "complete"
+    # The sample loan (patron 123456) is not due until after today's date
+    assert (scan["patrons"], scan["loans"], scan["total_fees"]) == (2, 3, 8.0)
+
+    notices = {n["patron_id"]: n for n in _notices()}
+    assert set(notices) == {"700001", "700002"}
+    first = notices["700001"]
+    assert first["loan_count"] == 2 and first["total_fee"] == 6.0
+    assert [loan["days_overdue"] for loan in first["loans"]] == [10, 2]
+    assert first["loans"][0]["title"] == "To Kill a Mockingbird"
+
+
+def test_loans_due_on_the_scan_day_are_not_overdue():
+    database.insert_borrow_records_bulk([
+        ("705001", 1, AS_OF - timedelta(days=15), AS_OF - timedelta(hours=2), None),
+        ("705002", 2, AS_OF - timedelta(days=15), AS_OF - timedelta(hours=10), None),
+    ])
+    scan = overdue_scanner.scan_overdue_loans(AS_OF)
+    assert (scan["patrons"], scan["loans"]) == (1, 1)
+    [notice] = _notices()
+    assert notice["patron_id"] == "705002" and notice["total_fee"] > 0
+    assert database.get_patron("705001")["overdue_loans"] == 0
+
+
+def test_interrupted_scan_resumes_without_duplicates():
+    _loans([(f"7100{p:02d}", 1 + p % 3, 1 + n, False) for p in range(30) for n in range(3)])
+    partial = overdue_scanner.scan_overdue_loans(AS_OF, batch_size=7, max_batches=4)
+    assert partial["status"] == "running"
+    assert 0 < partial["patrons"] < 30
+
+    # A later run the same day resumes with the original cutoff
+    scan = overdue_scanner.scan_overdue_loans(AS_OF + timedelta(hours=8), batch_size=7)
+    assert scan["status"] == "complete"
+    assert (scan["patrons"], scan["loans"]) == (30, 90)
+    notices = _notices()
+    assert len(notices) == 30 and all(n["loan_count"] == 3 for n in notices)
+
+
+def test_completed_scan_is_not_repeated_unless_restarted():
+    _loans([("720001", 1, 5, False)])
+    overdue_scanner.scan_overdue_loans(AS_OF)
+    _loans([("720002", 2, 5, False)])
+    assert overdue_scanner.scan_overdue_loans(AS_OF)["patrons"] == 1
+    assert overdue_scanner.scan_overdue_loans(AS_OF, restart=True)["patrons"] == 2
+
+
+def test_cli_writes_notices(tmp_path, capsys):
+    _loans([("730001", 1, 3, False)])
+    out = tmp_path / "notices.ndjson"
+    assert overdue_scanner.main(["--date", "2025-03-01", "--output", str(out)]) == 0
+    assert json.loads(capsys.readouterr().out)["patrons"] == 1
+    lines = out.read_text().splitlines()
+    assert [json.loads(line)["patron_id"] for line in lines] == ["730001"]
@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, timedelta
+
+import database
+import library_service
+from services import overdue_scanner, patron_counters
+
+
+def _counters(patron_id):
+    patron = database.get_patron(patron_id)
+    return (patron["active_loans"], patron["overdue_loans"]) if patron else None
+
+
+def _execute(sql, params=()):
+    conn = database.get_db_connection()
+    try:
+        with conn:
+            conn.execute(sql, params)
+    finally:
+        conn.close()
+
+
+def test_sample_loan_is_counted_by_migration():
+    assert _counters("123456") == (1, 0)
+    assert database.get_patron("999999") is None
+    assert database.get_patron_borrow_count("999999") == 0
+
+
+def _migrate_to(version):
+    migrations = database.MIGRATIONS
+    database.MIGRATIONS = [step for step in migrations if step[0] <= version]
+    try:
+        database.migrate_database()
+    finally:
+        database.MIGRATIONS = migrations
+
+
+def test_migration_backfills_counters(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", database.memory_database())
+    database.init_database()
+    _migrate_to(7)
+    database.add_sample_data()
+    library_service.borrow_book_by_patron("670001", 1)
+    library_service.borrow_book_by_patron("670001", 2)
+    library_service.return_book_by_patron("670001", 1)
+    assert database.get_patron_borrow_count("670001") == 1  # counted from borrow_records
+
+    database.migrate_database()
+    assert _counters("670001") == (1, 0) and _counters("123456") == (1, 0)
+    assert database.get_patron("670001")["overdue_as_of"] is None
+    assert database.reconcile_patron_counters(dry_run=True)["drifted"] == 0
+    database.close_pool()
+
+
+def test_borrow_and_return_keep_counters():
+    library_service.borrow_book_by_patron("610001", 1)
+    library_service.borrow_book_by_patron("610001", 2)
+    assert database.get_patron_borrow_count("610001") == 2
+    library_service.return_book_by_patron("610001", 1)
+    assert _counters("610001") == (1, 0)
+
+
+def test_limit_check_reads_the_counter():
+    database.insert_books_bulk([(f"Limit {i}", "Author", f"979{i:010d}", 1, 1) for i in range(6)])
+    book_ids = [book["id"] for book in database.get_all_books() if book["title"].startswith("Limit")]
+    for book_id in book_ids[:5]:
+        assert library_service.borrow_book_by_patron("620001", book_id)[0]
+    ok, msg = library_service.borrow_book_by_patron("620001", book_ids[5])
+    assert not ok and "maximum borrowing limit" in msg
+
+    # The limit is enforced from patrons.active_loans alone
+    _execute("UPDATE patrons SET active_loans = 0 WHERE patron_id = '620001'")
+    assert library_service.borrow_book_by_patron("620001", book_ids[5])[0]
+
+
+def test_raw_sql_writes_go_through_triggers():
+    now = datetime.now()
+    database.insert_borrow_records_bulk([
+        ("630001", 1, now - timedelta(days=3), now + timedelta(days=11), None),
+        ("630001", 2, now - timedelta(days=3), now + timedelta(days=11), now),  # already returned
+    ])
+    assert _counters("630001") == (1, 0)
+    _execute("UPDATE borrow_records SET return_date = NULL WHERE book_id = 2 AND patron_id = ?", ("630001",))
+    assert _counters("630001") == (2, 0)
+    _execute("DELETE FROM borrow_records WHERE book_id = 1")
+    assert _counters("630001") == (1, 0)
+    assert _counters("123456") == (1, 0)  # its loan is on book 3
+
+
+def test_overdue_counter_follows_scan_and_return():
+    as_of = datetime(2025, 3, 1, 9, 0)
+    database.insert_borrow_records_bulk([
+        ("640001", 1, as_of - timedelta(days=20), as_of - timedelta(days=6), None),
+        ("640001", 2, as_of - timedelta(days=2), as_of + timedelta(days=12), None),
+    ])
+    _execute("UPDATE books SET available_copies = available_copies - 1 WHERE id IN (1, 2)")
+    assert _counters("640001") == (2, 0)
+    overdue_scanner.scan_overdue_loans(as_of)
+    patron = database.get_patron("640001")
+    assert (patron["active_loans"], patron["overdue_loans"]) == (2, 1)
+    assert patron["overdue_as_of"] == "2025-03-01T00:00:00"  # start of the scan day
+
+    library_service.return_book_by_patron("640001", 2)  # not overdue at the scan
+    assert _counters("640001") == (1, 1)
+    library_service.return_book_by_patron("640001", 1)
+    assert _counters("640001") == (0, 0)
+
+
+def test_reconcile_repairs_drift():
+    library_service.borrow_book_by_patron("650001", 1)
+    _execute("UPDATE patrons SET active_loans = 4 WHERE patron_id = '650001'")
+    _execute("DELETE FROM patrons WHERE patron_id = '123456'")
+    assert [row["patron_id"] for row in database.get_circulation_violations()["patron_counter_mismatch"]] == ["650001"]
+
+    report = database.reconcile_patron_counters(dry_run=True)
+    assert (report["drifted"], report["corrected"]) == (2, 0)
+    assert _counters("650001") == (4, 0)
+
+    report = database.reconcile_patron_counters()
+    assert [(row["patron_id"], row["active_loans"], row["actual_active_loans"]) for row in report["drift"]] == [
+        ("123456", None, 1), ("650001", 4, 1)]
+    assert _counters("650001") == (1, 0) and _counters("123456") == (1, 0)
+    assert database.reconcile_patron_counters()["drifted"] == 0
+    assert not any(database.get_circulation_violations().values())
+
+
+def test_cli_check_exits_nonzero_on_drift(capsys):
+    assert patron_counters.main(["--check"]) == 0
+    _execute("UPDATE patrons SET active_loans = 2 WHERE patron_id = '123456'")
+    capsys.readouterr()
+    assert patron_counters.main(["--check"]) == 1
+    assert json.loads(capsys.readouterr().out)["drift"][0]["actual_active_loans"] == 1
+    assert patron_counters.main([]) == 0
+    assert json.loads(capsys.readouterr().out)["corrected"] == 1
+    assert _counters("123456") == (1, 0)
+
+
+def test_counters_survive_compact_conversion():
+    as_of = datetime(2025, 3, 1, 9, 0)
+    database.insert_borrow_records_bulk([("660001", 1, as_of - timedelta(days=20), as_of - timedelta(days=6), None)])
+    _execute("UPDATE books SET available_copies = available_copies - 1 WHERE id = 1")
+    overdue_scanner.scan_overdue_loans(as_of)
+    database.convert_to_compact_storage()
+    assert database.get_patron("660001")["overdue_as_of"] == "2025-03-01T00:00:00"
+
+    library_service.borrow_book_by_patron("660001", 2)
+    assert _counters("660001") == (2, 1)
+    library_service.return_book_by_patron("660001", 1)
+    assert _counters("660001") == (1, 0)
+    assert database.reconcile_patron_counters(as_of)["drifted"] == 0
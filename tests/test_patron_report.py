@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import database
+import library_service
+
+
+def _loan(patron_id, book_id, borrowed_days_ago, returned_days_ago=None):
+    borrowed = datetime.now() - timedelta(days=borrowed_days_ago)
+    returned = datetime.now() - timedelta(days=returned_days_ago) if returned_days_ago is not None else None
+    database.insert_borrow_records_bulk([(patron_id, book_id, borrowed, borrowed + timedelta(days=14), returned)])
+
+
+def test_report_has_fees_and_history():
+    _loan("111111", 1, 20)        # open, 6 days overdue
+    _loan("111111", 2, 3)         # open, on time
+    _loan("111111", 1, 40, 20)    # returned 6 days late
+    _loan("222222", 2, 30)        # someone else's loan
+    report = library_service.get_patron_status_report("111111")
+
+    assert report["total_active"] == 2 and report["overdue_count"] == 1
+    assert report["total_late_fees"] == 3.0
+    overdue = report["currently_borrowed"][0]
+    assert overdue["is_overdue"] and overdue["days_overdue"] == 6
+    assert [h["late"] for h in report["history"]] == [False, True, True]
+    assert report["history"][2]["return_date"] is not None
+    assert report["history_has_more"] is False
+
+
+def test_report_matches_per_book_fee():
+    _loan("111111", 1, 25)
+    report = library_service.get_patron_status_report("111111")
+    single = library_service.calculate_late_fee_for_book("111111", 1)
+    assert report["currently_borrowed"][0]["fee_amount"] == single["fee_amount"]
+
+
+def test_history_is_paged():
+    for days in range(1, 6):
+        _loan("111111", 1, days, 0)
+    first = library_service.get_patron_status_report("111111", history_page_size=2)
+    last = library_service.get_patron_status_report("111111", history_page=3, history_page_size=2)
+    assert len(first["history"]) == 2 and first["history_has_more"]
+    assert len(last["history"]) == 1 and not last["history_has_more"]
+    assert first["history"][0]["borrow_date"] > first["history"][1]["borrow_date"]
+
+
+def test_report_endpoints(client):
+    resp = client.get("/api/patron/123456/status")
+    assert resp.status_code == 200
+    assert resp.get_json()["currently_borrowed"][0]["title"] == "1984"
+    assert client.get("/api/patron/12/status").status_code == 400
+
+    page = client.get("/patron?patron_id=123456")
+    assert page.status_code == 200 and b"1984" in page.data
@@ -1,6 +1,8 @@
+import sqlite3
 import pytest
 from datetime import date, timedelta
 
+import database
 import services.library_service as svc
 
 
@@ -33,66 +35,65 @@ def test_add_book_validation_and_success(mocker):
     assert ok and 'successfully added' in msg
 
 
-def test_borrow_book_various_paths(mocker):
+def test_borrow_book_various_paths():
     # invalid patron id
     ok, msg = svc.borrow_book_by_patron('abc', 1)
     assert not ok and 'Invalid patron ID' in msg
 
     # book not found
-    mocker.patch('services.library_service.get_book_by_id', return_value=None)
-    ok, msg = svc.borrow_book_by_patron('123456', 1)
+    ok, msg = svc.borrow_book_by_patron('123456', 999)
     assert not ok and 'Book not found' in msg
 
-    # no available copies
-    mocker.patch('services.library_service.get_book_by_id', return_value={'available_copies':0, 'title':'X'})
-    ok, msg = svc.borrow_book_by_patron('123456', 1)
+    # no available copies (sample book 3)
+    ok, msg = svc.borrow_book_by_patron('123456', 3)
     assert not ok and 'not available' in msg
 
-    # patron reached limit
-    mocker.patch('services.library_service.get_book_by_id', return_value={'available_copies':1, 'title':'X'})
-    mocker.patch('services.library_service.get_patron_borrow_count', return_value=5)
+    # success decrements availability in the same transaction
     ok, msg = svc.borrow_book_by_patron('123456', 1)
-    assert not ok and 'maximum borrowing' in msg
+    assert ok and 'Successfully borrowed' in msg
+    assert svc.get_book_by_id(1)['available_copies'] == 2
 
-    # insert record failure
-    mocker.patch('services.library_service.get_patron_borrow_count', return_value=0)
-    mocker.patch('services.library_service.insert_borrow_record', return_value=False)
-    mocker.patch('services.library_service.update_book_availability', return_value=True)
-    ok, msg = svc.borrow_book_by_patron('123456', 1)
-    assert not ok and 'Database error' in msg
 
-    # update availability failure
-    mocker.patch('services.library_service.insert_borrow_record', return_value=True)
-    mocker.patch('services.library_service.update_book_availability', return_value=False)
+def test_borrow_book_rolls_back_on_database_error(mocker):
+    mocker.patch.object(database.UnitOfWork, 'insert_borrow_record',
+                        side_effect=sqlite3.OperationalError('disk I/O error'))
     ok, msg = svc.borrow_book_by_patron('123456', 1)
     assert not ok and 'Database error' in msg
+    # the reserved copy was rolled back with the failed insert
+    assert svc.get_book_by_id(1)['available_copies'] == 3
 
-    # success
-    mocker.patch('services.library_service.update_book_availability', return_value=True)
-    ok, msg = svc.borrow_book_by_patron('123456', 1)
-    assert ok and 'Successfully borrowed' in msg
 
-
-def test_return_book_paths(mocker):
+def test_return_book_paths():
     # invalid patron id
     ok, msg = svc.return_book_by_patron('12', 1)
     assert not ok and 'Invalid patron ID' in msg
 
     # no active borrow
-    mocker.patch('services.library_service.update_borrow_record_return_date', return_value=False)
     ok, msg = svc.return_book_by_patron('123456', 1)
     assert not ok and 'No active borrow' in msg
 
-    # availability update failure
-    mocker.patch('services.library_service.update_borrow_record_return_date', return_value=True)
-    mocker.patch('services.library_service.update_book_availability', return_value=False)
-    ok, msg = svc.return_book_by_patron('123456', 1)
-    assert not ok and 'Database error' in msg
-
-    # success
-    mocker.patch('services.library_service.update_book_availability', return_value=True)
-    ok, msg = svc.return_book_by_patron('123456', 1)
+    # success (sample data: 123456 has book 3 out)
+    ok, msg = svc.return_book_by_patron('123456', 3)
     assert ok and 'returned successfully' in msg.lower()
+    assert svc.get_book_by_id(3)['available_copies'] == 1
+
+    # returned loan is closed
+    ok, msg = svc.return_book_by_patron('123456', 3)
+    assert not ok and 'No active borrow' in msg
+
+
+def test_return_book_never_exceeds_total_copies():
+    # a stray open loan for a book whose copies are all on the shelf
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                 "VALUES ('111111', 1, '2025-01-01T00:00:00', '2025-01-15T00:00:00')")
+    conn.commit()
+    conn.close()
+    ok, msg = svc.return_book_by_patron('111111', 1)
+    assert not ok and 'Database error' in msg
+    assert svc.get_book_by_id(1)['available_copies'] == 3
+    # the loan close was rolled back too
+    assert svc.get_patron_borrow_count('111111') == 1
 
 
 def test_calculate_late_fee_various(mocker):
@@ -129,9 +130,10 @@ def test_search_and_status_report(mocker):
 
     # search match
     books = [{'title':'Great Book','author':'Someone','isbn':'111'}]
-    mocker.patch('services.library_service.get_all_books', return_value=books)
+    mocker.patch('services.library_service.search_books', return_value=books)
     res = svc.search_books_in_catalog('great', 'title')
     assert len(res) == 1
+    svc.search_books.assert_called_once_with('great', 'title')
 
     # status report invalid
     assert svc.get_patron_status_report('12') == {}
@@ -141,10 +143,12 @@ def test_search_and_status_report(mocker):
         'book_id': 1,
         'title': 'T',
         'author': 'A',
-        'borrow_date': date.today(),
-        'due_date': date.today(),
-        'is_overdue': False
+        'borrow_date': date.today().isoformat(),
+        'due_date': date.today().isoformat(),
+        'is_overdue': False,
+        'fee_amount': 0.0
     }]
-    mocker.patch('services.library_service.get_patron_borrowed_books', return_value=borrowed)
+    mocker.patch('services.library_service.get_patron_activity',
+                 return_value={'active': borrowed, 'history': [], 'history_has_more': False})
     rpt = svc.get_patron_status_report('123456')
     assert rpt['total_active'] == 1 and rpt['overdue_count'] == 0
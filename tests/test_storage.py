@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import database
+import library_service
+
+
+def test_suite_runs_in_memory(temp_db):
+    assert database.is_memory_database(temp_db)
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+
+
+def test_memory_databases_are_isolated():
+    first = database.configure_storage(memory=True)
+    database.init_database()
+    database.insert_book("Only Here", "A", "1111111111111", 1, 1)
+    second = database.configure_storage(memory=True)
+    database.init_database()
+    assert first != second
+    assert database.get_book_by_isbn("1111111111111") is None
+
+
+def test_memory_copy_of_file(tmp_path):
+    path = str(tmp_path / "source.db")
+    database.configure_storage(path=path)
+    database.init_database()
+    database.migrate_database()
+    database.add_sample_data()
+    database.configure_storage(memory=True, copy_from=path)
+    library_service.borrow_book_by_patron("654321", 1)
+    assert database.get_book_by_id(1)["available_copies"] == 2
+
+    database.configure_storage(path=path)
+    assert database.get_book_by_id(1)["available_copies"] == 3
+
+
+def test_read_only_storage(tmp_path):
+    path = str(tmp_path / "source.db")
+    database.configure_storage(path=path)
+    database.init_database()
+    database.migrate_database()
+    database.add_sample_data()
+
+    database.configure_storage(path=path, read_only=True)
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+    ok, msg = library_service.borrow_book_by_patron("654321", 1)
+    assert not ok and "Database error" in msg
+    assert database.insert_book("New", "A", "2222222222222", 1, 1) is False
+    with pytest.raises(sqlite3.OperationalError):
+        database.insert_books_bulk([("New", "A", "2222222222222", 1, 1)])
+
+
+def test_create_app_storage_config(tmp_path):
+    from app import create_app
+    client = create_app({"DATABASE": ":memory:"}).test_client()
+    assert database.is_memory_database()
+    assert client.get("/readyz").status_code == 200
+
+    path = str(tmp_path / "app.db")
+    create_app({"DATABASE": path})
+    client = create_app({"DATABASE": path, "DATABASE_READ_ONLY": True}).test_client()
+    assert database.is_read_only_database()
+    assert b"The Great Gatsby" in client.get("/catalog").data